@@ -0,0 +1,240 @@
+from array import array
+
+from config import BASE_DEFAULT_CONFIG
+from projection import ProjectionPlan
+
+# Fields that --summary can group by.
+SUMMARY_FIELDS = ("country", "as", "isp", "org")
+# Boolean fields whose share is reported for each group and for the whole run.
+FLAG_FIELDS = ("proxy", "hosting", "mobile")
+UNKNOWN_VALUE = "Unknown"
+OTHER_VALUE = "Other"
+
+class Aggregator:
+    """
+    Collects lookup results column by column and summarizes them by one field.
+
+    Records are not kept: each one is reduced to an integer code for its group (every distinct value
+    is stored once), its weight and one byte per flag field, held in compact arrays. summarize() then
+    totals all columns at once, with NumPy when it is installed.
+    """
+
+    def __init__(self, by):
+        """
+        Initializes the Aggregator class.
+
+        Args:
+            by (str): The field to group by, e.g. 'country'.
+        """
+        self.by = by
+        self.values = []
+        self._codes_by_value = {}
+        self.codes = array("q")
+        self.weights = array("q")
+        self.flags = {flag: array("b") for flag in FLAG_FIELDS}
+        self.failed = 0
+
+    def add(self, data):
+        """
+        Adds one lookup result.
+
+        Args:
+            data (dict): The IP information dictionary. Its 'hits' field, if any, is used as its weight.
+        """
+        weight = data.get("hits", 1)
+        if data.get("status") != "success":
+            self.failed += weight
+            return
+        value = data.get(self.by) or UNKNOWN_VALUE
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+        self.weights.append(weight)
+        for flag, column in self.flags.items():
+            column.append(1 if data.get(flag) else 0)
+
+    def add_error(self, ip_address, error):
+        """
+        Counts a failed lookup.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            error (Exception or str): The error of the lookup.
+        """
+        self.failed += 1
+
+    def _totals(self):
+        """
+        Totals the weights and flagged weights of each group.
+
+        Returns:
+            tuple: (counts, flag_counts), a list with the total weight of each group code and a
+                   dictionary with such a list for each flag field.
+        """
+        groups = len(self.values)
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is None:
+            counts = [0] * groups
+            flag_counts = {flag: [0] * groups for flag in FLAG_FIELDS}
+            for index, (code, weight) in enumerate(zip(self.codes, self.weights)):
+                counts[code] += weight
+                for flag, column in self.flags.items():
+                    if column[index]:
+                        flag_counts[flag][code] += weight
+            return counts, flag_counts
+
+        codes = numpy.frombuffer(self.codes, dtype=numpy.int64)
+        weights = numpy.frombuffer(self.weights, dtype=numpy.int64)
+        counts = numpy.bincount(codes, weights=weights, minlength=groups)
+        flag_counts = {
+            flag: numpy.bincount(codes, weights=weights * numpy.frombuffer(column, dtype=numpy.int8), minlength=groups).astype(numpy.int64).tolist()
+            for flag, column in self.flags.items()
+        }
+        return counts.astype(numpy.int64).tolist(), flag_counts
+
+    def summarize(self, top=None):
+        """
+        Summarizes the results added so far.
+
+        Args:
+            top (int, optional): Only list this many groups, the largest first; the rest are
+                                 combined into one 'Other' row. Defaults to None for all groups.
+
+        Returns:
+            dict: 'by', 'total' (the weight of all successful results), 'failed', 'groups' (the number of
+                  distinct values), the share of each flag field in percent, and 'rows', one dictionary per
+                  group with its value, 'count', 'percent' and the share of each flag field within it.
+        """
+        counts, flag_counts = self._totals()
+        total = sum(counts)
+        # Largest first; ties keep the order in which the values were first seen.
+        order = sorted(range(len(counts)), key=counts.__getitem__, reverse=True)
+
+        def row(value, count, flagged):
+            return dict(
+                {self.by: value, "count": count, "percent": _percent(count, total)},
+                **{flag: _percent(flagged[flag], count) for flag in FLAG_FIELDS}
+            )
+
+        rows = [row(self.values[code], counts[code], {flag: flag_counts[flag][code] for flag in FLAG_FIELDS}) for code in order[:top]]
+        rest = order[len(rows):]
+        if rest:
+            rows.append(row(
+                OTHER_VALUE,
+                sum(counts[code] for code in rest),
+                {flag: sum(flag_counts[flag][code] for code in rest) for flag in FLAG_FIELDS}
+            ))
+
+        summary = {"by": self.by, "total": total, "failed": self.failed, "groups": len(counts)}
+        summary.update((flag, _percent(sum(flag_counts[flag]), total)) for flag in FLAG_FIELDS)
+        summary["rows"] = rows
+        return summary
+
+def _percent(part, whole):
+    """Returns part as a percentage of whole, rounded to one decimal place."""
+    return round(100 * part / whole, 1) if whole else 0.0
+
+class ReportDisplay:
+    """Displays a summary of all results, grouped by one field, once the lookups are done."""
+
+    # Tells DisplayManager that this theme renders a whole stream of records.
+    multi_record = True
+
+    def __init__(self, console, config, fields_to_show):
+        """
+        Initializes the ReportDisplay class.
+
+        Args:
+            console (Console): The rich console object.
+            config (dict): The configuration dictionary; 'summary_by' and 'summary_top' shape the report.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+        """
+        self.console = console
+        self.config = config
+        self.style = config.get("style", BASE_DEFAULT_CONFIG["style"])
+        plan = ProjectionPlan.of(config, fields_to_show)
+        # Shares are only reported for flag fields that were requested.
+        self.flags = [flag for flag in FLAG_FIELDS if flag in plan.request_fields]
+        self.top = config.get("summary_top", BASE_DEFAULT_CONFIG["summary_top"])
+        self.aggregator = Aggregator(config.get("summary_by", BASE_DEFAULT_CONFIG["summary_by"]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, data):
+        """
+        Adds a result to the summary.
+
+        Args:
+            data (dict): The IP information dictionary.
+        """
+        self.aggregator.add(data)
+
+    def add_error(self, ip_address, error):
+        """
+        Counts a failed lookup.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            error (Exception or str): The error of the lookup.
+        """
+        self.aggregator.add_error(ip_address, error)
+
+    def update(self, ip_address, patch):
+        """Deferred fields are not part of the summary."""
+
+    def summarize(self):
+        """
+        Summarizes the results added so far.
+
+        Returns:
+            dict: The summary, as returned by Aggregator.summarize.
+        """
+        return self.aggregator.summarize(self.top)
+
+    def render(self, summary=None):
+        """
+        Builds the report as a rich table.
+
+        Args:
+            summary (dict, optional): The summary to show. Defaults to summarizing the results added so far.
+
+        Returns:
+            Table: The report.
+        """
+        from rich.box import ROUNDED
+        from rich.table import Table
+
+        summary = summary or self.summarize()
+        by = summary["by"]
+        caption = f"Total: {summary['total']}, groups: {summary['groups']}, failed: {summary['failed']}"
+        if self.flags:
+            caption += "; " + ", ".join(f"{flag} {summary[flag]}%" for flag in self.flags)
+
+        table = Table(
+            title=f"Summary by {by.capitalize()}",
+            caption=caption,
+            box=ROUNDED,
+            header_style=self.style.get("header", "bold white on blue")
+        )
+        table.add_column(by.capitalize(), style=self.style.get("field_name", "cyan"))
+        table.add_column("Count", justify="right", style=self.style.get("field_value", "white"))
+        table.add_column("%", justify="right", style=self.style.get("field_value", "white"))
+        for flag in self.flags:
+            table.add_column(f"{flag.capitalize()} %", justify="right", style=self.style.get("field_value", "white"))
+        for row in summary["rows"]:
+            table.add_row(str(row[by]), str(row["count"]), f"{row['percent']:.1f}", *(f"{row[flag]:.1f}" for flag in self.flags))
+        return table
+
+    def close(self):
+        """Prints the report."""
+        self.console.print(self.render())
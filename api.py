@@ -1,34 +1,778 @@
-import requests
+from collections import Counter, OrderedDict, deque
+from contextlib import nullcontext
+import ipaddress
+import sys
+import threading
+import time
 
-class IPInfoProvider:
-    """A class to provide IP information from an API."""
+from classify import classify, failure_record
+from failover import Endpoint
+from projection import field_mask
+from records import IPRecord
+from timings import NULL_TIMINGS
 
-    def __init__(self, base_url="http://ip-api.com/json/"):
-        self.base_url = base_url
+BATCH_SIZE = 100
+
+# How long to wait before hedging while an endpoint has too few samples for a percentile.
+DEFAULT_HEDGE_DELAY = 1.0
+
+# When addresses trickle in, e.g. from 'tail -f', the addresses read so far are looked up once nothing new
+# has arrived for this long (seconds), instead of waiting for a batch or the window of lookups to fill.
+INPUT_IDLE_TIMEOUT = 0.05
+
+# Yielded by read_ahead() while the input has nothing new.
+IDLE = object()
+_END = object()
+
+def __getattr__(name):
+    # requests is only imported once a network call is made, so cache hits and
+    # offline lookups don't pay for it. api.requests still resolves for callers.
+    if name == "requests":
+        import requests
+        return requests
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def is_request_error(error):
+    """
+    Checks whether an exception was raised by requests.
+
+    Args:
+        error (Exception): The exception to check.
+
+    Returns:
+        bool: True for requests' RequestException and its subclasses.
+    """
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(error, requests.exceptions.RequestException)
+
+def read_ahead(items, idle_timeout=INPUT_IDLE_TIMEOUT, buffer_size=BATCH_SIZE):
+    """
+    Yields the items of an iterable, and IDLE whenever none has arrived for idle_timeout seconds.
+
+    Lists and tuples are complete already and are yielded as they are. Other iterables, such as lines
+    read from a pipe, are read on a background thread, at most buffer_size items ahead.
+
+    Args:
+        items (iterable): The items, e.g. IP addresses.
+        idle_timeout (float, optional): How long to wait for an item before yielding IDLE, in seconds.
+                                        Defaults to INPUT_IDLE_TIMEOUT.
+        buffer_size (int, optional): The most items read ahead. Defaults to BATCH_SIZE.
+
+    Yields:
+        The items in order, with IDLE in between while the input stalls.
+    """
+    if isinstance(items, (list, tuple)):
+        yield from items
+        return
+
+    import queue
+
+    inbox = queue.Queue(maxsize=buffer_size)
+
+    def read():
+        try:
+            for item in items:
+                inbox.put((item, None))
+        except BaseException as e:
+            # Raised again in the thread that consumes the items.
+            inbox.put((_END, e))
+            return
+        inbox.put((_END, None))
+
+    # A daemon thread, so input that never ends (or never comes) doesn't keep the process alive.
+    threading.Thread(target=read, name="whatsip-input", daemon=True).start()
+    while True:
+        try:
+            item, error = inbox.get(timeout=idle_timeout)
+        except queue.Empty:
+            yield IDLE
+            continue
+        if item is _END:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+def iter_chunks(items, size):
+    """
+    Groups items into lists of up to size items, sending a shorter list early when the input stalls.
+
+    Args:
+        items (iterable): The items, e.g. IP addresses.
+        size (int): The most items per list.
+
+    Yields:
+        list: The next items, in order.
+    """
+    chunk = []
+    for item in read_ahead(items):
+        if item is not IDLE:
+            chunk.append(item)
+        if chunk and (item is IDLE or len(chunk) >= size):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Fields that differ between hosts of the same network and can't be reused across a prefix: a proxy,
+# a hosting provider's server or a mobile gateway can sit next to ordinary hosts in the same /24.
+PER_HOST_FIELDS = ("query", "reverse", "proxy", "hosting", "mobile")
+
+class PrefixCache:
+    """Reuses the network fields resolved for one address for other addresses in the same prefix."""
+
+    def __init__(self, ipv4_prefix=24, ipv6_prefix=48, max_entries=10000):
+        """
+        Initializes the PrefixCache class.
+
+        Args:
+            ipv4_prefix (int, optional): The prefix length that groups IPv4 addresses. Defaults to 24.
+            ipv6_prefix (int, optional): The prefix length that groups IPv6 addresses. Defaults to 48.
+            max_entries (int, optional): The maximum number of prefixes and hosts to remember. Defaults to 10000.
+        """
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        self.max_entries = max_entries
+        self._networks = OrderedDict()
+        self._hosts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefix_of(self, ip_address):
+        """
+        Returns the network prefix an address belongs to.
+
+        Args:
+            ip_address (str): The IP address.
+
+        Returns:
+            IPv4Network or IPv6Network: The prefix, or None if ip_address is not an IP address.
+        """
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+        prefix_length = self.ipv4_prefix if address.version == 4 else self.ipv6_prefix
+        return ipaddress.ip_network((address, prefix_length), strict=False)
+
+    @staticmethod
+    def _remember(entries, key, value, max_entries):
+        """Stores a value in an LRU-ordered dictionary, evicting the oldest entry when full."""
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def get(self, ip_address, fields_to_request):
+        """
+        Returns the reusable fields known for an address.
+
+        Args:
+            ip_address (str): The IP address.
+            fields_to_request (list): A list of fields requested from the API.
+
+        Returns:
+            tuple: (data, missing_host_fields). data holds the requested network fields plus any
+                   remembered host fields and is None if the prefix isn't resolved for all of them.
+                   missing_host_fields lists per-host fields that still have to be fetched.
+        """
+        if not fields_to_request:
+            return None, []
+        prefix = self.prefix_of(ip_address)
+        if prefix is None:
+            return None, []
+
+        with self._lock:
+            network = self._networks.get(prefix)
+            if network is None or any(f not in network for f in fields_to_request if f not in PER_HOST_FIELDS):
+                return None, []
+            self._networks.move_to_end(prefix)
+            host = self._hosts.get(ip_address, {})
+            data = dict(network)
+            data.update(host)
+
+        if "query" in fields_to_request:
+            data["query"] = ip_address
+        missing_host_fields = [f for f in fields_to_request if f in PER_HOST_FIELDS and f != "query" and f not in data]
+        return data, missing_host_fields
+
+    def set(self, ip_address, data):
+        """
+        Remembers the network and host fields of a successful lookup.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            data (dict): The raw API payload.
+        """
+        if data.get("status") != "success":
+            return
+        prefix = self.prefix_of(ip_address)
+        if prefix is None:
+            return
+
+        with self._lock:
+            network = dict(self._networks.get(prefix, {}))
+            network.update({k: v for k, v in data.items() if k not in PER_HOST_FIELDS})
+            self._remember(self._networks, prefix, network, self.max_entries)
+            host = {k: v for k, v in data.items() if k in PER_HOST_FIELDS and k != "query"}
+            if host:
+                # Fresh values replace remembered ones, e.g. an address that stopped being a proxy.
+                host = dict(self._hosts.get(ip_address, {}), **host)
+                self._remember(self._hosts, ip_address, host, self.max_entries)
+
+class Provider:
+    """Base class for IP information providers."""
+
+    # Replaced with an enabled Timings object to record how long each phase of a lookup takes.
+    timings = NULL_TIMINGS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Releases any resources held by the provider."""
 
     def get_ip_info(self, ip_address, fields_to_request=None):
         """
-        Gets IP information from the API.
+        Gets information for one IP address.
 
         Args:
             ip_address (str): The IP address to get information for.
-            fields_to_request (list, optional): A list of fields to request from the API. Defaults to None.
+            fields_to_request (list, optional): A list of fields to request. Defaults to None.
+
+        Returns:
+            IPRecord: The IP information, using ip-api's field names.
+        """
+        raise NotImplementedError
+
+    def get_ip_infos(self, ip_addresses, fields_to_request=None):
+        """
+        Gets information for several IP addresses.
+
+        Args:
+            ip_addresses (list): The IP addresses to get information for.
+            fields_to_request (list, optional): A list of fields to request. Defaults to None.
+
+        Returns:
+            list: The IP information of each address as an IPRecord, in the same order as ip_addresses.
+        """
+        return [self.get_ip_info(ip_address, fields_to_request) for ip_address in ip_addresses]
+
+    def iter_ip_infos(self, ip_addresses, fields_to_request=None, workers=1):
+        """
+        Looks up IP addresses and yields the results in input order.
+
+        Args:
+            ip_addresses (iterable): The IP addresses to get information for.
+            fields_to_request (list, optional): A list of fields to request. Defaults to None.
+            workers (int, optional): The number of concurrent lookups, if the provider supports it. Defaults to 1.
+
+        Yields:
+            tuple: (ip_address, data, error), where either data or error is None.
+        """
+        for ip_address in ip_addresses:
+            yield ip_address, self.get_ip_info(ip_address, fields_to_request), None
+
+class IPInfoProvider(Provider):
+    """A class to provide IP information from an API."""
+
+    def __init__(self, base_url="http://ip-api.com/json/", batch_url="http://ip-api.com/batch", cache=None, refresh=False,
+                 pool_size=10, retries=0, backoff_factor=0.5, prefix_cache=None, endpoints=None, hedge_percentile=95,
+                 local_classification=False, quota_ledger=None):
+        """
+        Initializes the IPInfoProvider class.
+
+        Args:
+            base_url (str, optional): The URL of the single lookup endpoint.
+            batch_url (str, optional): The URL of the batch lookup endpoint.
+            cache (LookupCache, optional): A cache for raw API payloads. Defaults to None.
+            refresh (bool, optional): Ignore cached entries but still store fresh results. Defaults to False.
+            pool_size (int, optional): The number of keep-alive connections to pool per host. Defaults to 10.
+            retries (int, optional): How often to retry connection errors and 5xx responses. Defaults to 0.
+            backoff_factor (float, optional): The backoff factor between retries. Defaults to 0.5.
+            prefix_cache (PrefixCache, optional): Reuses network fields across addresses of a prefix. Defaults to None.
+            endpoints (list, optional): Endpoints in order of preference. Replaces base_url and batch_url. Defaults to None.
+            hedge_percentile (float, optional): With several endpoints, a request that takes longer than this
+                percentile of the endpoint's recent latency is also sent to the next one. 0 disables hedging. Defaults to 95.
+            local_classification (bool, optional): Answer private, reserved and malformed addresses locally with
+                the failure ip-api would send, without a request. Defaults to False.
+            quota_ledger (QuotaLedger, optional): The ledger the endpoints' rate limiters share quota through.
+                It is closed with the provider. Defaults to None.
+        """
+        self.base_url = base_url
+        self.batch_url = batch_url
+        self.endpoints = endpoints or [Endpoint("ip-api", base_url, batch_url)]
+        self.hedge_percentile = hedge_percentile
+        self.cache = cache
+        self.refresh = refresh
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.prefix_cache = prefix_cache
+        self.local_classification = local_classification
+        self.quota_ledger = quota_ledger
+        self._session = None
+        self._hedge_pool = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def rate_limiter(self):
+        """The rate limiter of the primary endpoint's single lookups."""
+        return self.endpoints[0].rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter):
+        self.endpoints[0].rate_limiter = rate_limiter
+
+    @property
+    def batch_rate_limiter(self):
+        """The rate limiter of the primary endpoint's batch lookups."""
+        return self.endpoints[0].batch_rate_limiter
+
+    @batch_rate_limiter.setter
+    def batch_rate_limiter(self, rate_limiter):
+        self.endpoints[0].batch_rate_limiter = rate_limiter
+
+    @property
+    def session(self):
+        """
+        Returns the pooled HTTP session, creating it on first use.
+
+        Returns:
+            Session: A requests session shared by all lookups of this provider.
+        """
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                retry = Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff_factor,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=None,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        """Closes the pooled HTTP connections, the cache and the quota ledger."""
+        with self._session_lock:
+            if self._hedge_pool is not None:
+                # Losing hedged requests are left to finish on their own.
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+        if self.cache is not None:
+            self.cache.close()
+        if self.quota_ledger is not None:
+            self.quota_ledger.close()
+
+    @property
+    def quota(self):
+        """
+        Returns the current rate-limit quota of the single and batch endpoints.
+
+        Returns:
+            dict: The quota state of each endpoint, as reported by RateLimiter.quota.
+        """
+        return {"single": self.rate_limiter.quota, "batch": self.batch_rate_limiter.quota}
+
+    def _send(self, method, url, rate_limiter, ip_address=None, timeout=6, latency=None, **kwargs):
+        """
+        Sends a request, waiting for the rate limiter first and retrying after HTTP 429.
+
+        Args:
+            method (str): 'GET' or 'POST'.
+            url (str): The URL to request.
+            rate_limiter (RateLimiter): The rate limiter of the endpoint.
+            ip_address (str, optional): The address the request is for, used for timings. Defaults to None.
+            timeout (float, optional): The request timeout in seconds. Defaults to 6.
+            latency (LatencyWindow, optional): Records the response time, without rate-limit waits. Defaults to None.
+            **kwargs: Extra arguments for the request.
 
         Returns:
-            dict: A dictionary containing the IP information.
+            Response: The successful response.
+        """
+        send = self.session.post if method == "POST" else self.session.get
+        timings = self.timings
+        while True:
+            with timings.phase("rate_limit_wait", ip_address):
+                rate_limiter.acquire()
+            start = time.perf_counter()
+            response = send(url, timeout=timeout, **kwargs)
+            if latency is not None:
+                latency.add(time.perf_counter() - start)
+            if timings.enabled:
+                # elapsed covers connecting, sending and waiting for the headers; the rest is the body.
+                elapsed = response.elapsed.total_seconds()
+                timings.record("http", elapsed, ip_address)
+                timings.record("http_body", max(0.0, time.perf_counter() - start - elapsed), ip_address)
+            rate_limiter.update(response.headers)
+            if response.status_code != 429:
+                break
+            rate_limiter.exhaust()
+        response.raise_for_status()
+        return response
+
+    def _build_params(self, fields_to_request, numeric=True):
+        """
+        Builds the query parameters for an API request.
+
+        Args:
+            fields_to_request (list): A list of fields to request from the API.
+            numeric (bool, optional): Send the fields as ip-api's numeric bitmask when every field has a code.
+                                      Defaults to True.
+
+        Returns:
+            dict: The query parameters.
         """
-        url = f"{self.base_url}{ip_address}"
         params = {}
         if fields_to_request:
-            fields = [f for f in fields_to_request if f not in ["status", "message"]]
+            fields = tuple(f for f in fields_to_request if f not in ("status", "message"))
             if fields:
-                params['fields'] = ",".join(fields)
-                
-        response = requests.get(url, params=params, timeout=6)
-        response.raise_for_status()
-        data = response.json()
+                mask = field_mask(fields) if numeric else None
+                params['fields'] = str(mask) if mask is not None else ",".join(fields)
+        return params
+
+    def _set_display_ip(self, data, ip_address):
+        """Returns a payload as a compact IPRecord with the 'display_ip' key used by the display themes."""
+        record = IPRecord(data)
         if not ip_address and data.get("status") == "success":
-            data["display_ip"] = data.get("query", "Unknown")
+            record["display_ip"] = data.get("query", "Unknown")
         else:
-            data["display_ip"] = ip_address or data.get("query", "Unknown")
-        return data
+            record["display_ip"] = ip_address or data.get("query", "Unknown")
+        return record
+
+    def _classify(self, ip_address):
+        """Returns the failure payload for an address that ip-api would reject, or None if it needs a lookup."""
+        if not self.local_classification:
+            return None
+        message = classify(ip_address)
+        return failure_record(ip_address, message) if message is not None else None
+
+    def _get_cached(self, ip_address, fields_to_request):
+        """Returns a copy of the cached payload for an IP address, or None."""
+        if self.cache is None or self.refresh or not ip_address:
+            return None
+        with self.timings.phase("cache", ip_address):
+            return self.cache.get(ip_address, fields_to_request)
+
+    def _store_cached(self, ip_address, fields_to_request, data):
+        """Stores a raw payload in the cache, if it is a success or failures are cached, and in the prefix cache."""
+        if not ip_address:
+            return
+        if self.cache is not None and (data.get("status") == "success" or self.cache.negative_ttl > 0):
+            self.cache.set(ip_address, fields_to_request, data)
+        if self.prefix_cache is not None:
+            self.prefix_cache.set(ip_address, data)
+
+    def _get_from_prefix(self, ip_address, fields_to_request):
+        """
+        Returns the reusable prefix data for an address.
+
+        Returns:
+            tuple: (data, missing_host_fields), as returned by PrefixCache.get.
+        """
+        if self.prefix_cache is None or not ip_address:
+            return None, []
+        return self.prefix_cache.get(ip_address, fields_to_request)
+
+    def get_ip_info(self, ip_address, fields_to_request=None):
+        """
+        Gets IP information from the API.
+
+        Args:
+            ip_address (str): The IP address to get information for.
+            fields_to_request (list, optional): A list of fields to request from the API. Defaults to None.
+
+        Returns:
+            IPRecord: The IP information.
+        """
+        data = self._classify(ip_address)
+        if data is None:
+            data = self._get_cached(ip_address, fields_to_request)
+        if data is not None:
+            return self._set_display_ip(data, ip_address)
+
+        data, missing_host_fields = self._get_from_prefix(ip_address, fields_to_request)
+        if data is not None and not missing_host_fields:
+            return self._set_display_ip(data, ip_address)
+        if data is not None:
+            # The network is known; only fetch the per-host fields.
+            host_data = self._fetch(ip_address, missing_host_fields)
+            if host_data.get("status") != "success":
+                return self._set_display_ip(host_data, ip_address)
+            self.prefix_cache.set(ip_address, host_data)
+            data.update({f: host_data[f] for f in missing_host_fields if f in host_data})
+            return self._set_display_ip(data, ip_address)
+
+        data = self._fetch(ip_address, fields_to_request)
+        self._store_cached(ip_address, fields_to_request, data)
+        return self._set_display_ip(data, ip_address)
+
+    def _fetch(self, ip_address, fields_to_request):
+        """Requests the raw payload for one address from the single lookup endpoints."""
+        def request(endpoint):
+            params = self._build_params(fields_to_request, endpoint.numeric_fields)
+            response = self._send(
+                "GET", f"{endpoint.base_url}{ip_address}", endpoint.rate_limiter, ip_address=ip_address,
+                timeout=endpoint.timeout, latency=endpoint.latency, params=dict(params, **endpoint.params)
+            )
+            with self.timings.phase("json", ip_address):
+                return endpoint.adapt(response.json())
+
+        return self._call(self.endpoints, request)
+
+    def _fetch_batch(self, ip_addresses, fields_to_request):
+        """Requests the raw payloads for up to BATCH_SIZE addresses from the batch endpoints."""
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.batch_url]
+        if not endpoints:
+            return [self._fetch(ip_address, fields_to_request) for ip_address in ip_addresses]
+        def request(endpoint):
+            params = self._build_params(fields_to_request, endpoint.numeric_fields)
+            response = self._send(
+                "POST", endpoint.batch_url, endpoint.batch_rate_limiter, timeout=endpoint.timeout,
+                latency=endpoint.latency, json=ip_addresses, params=dict(params, **endpoint.params)
+            )
+            with self.timings.phase("json"):
+                return [endpoint.adapt(data) for data in response.json()]
+
+        return self._call(endpoints, request)
+
+    @staticmethod
+    def _attempt(endpoint, request):
+        """Runs a request against one endpoint and tells its circuit breaker how it went."""
+        try:
+            result = request(endpoint)
+        except Exception:
+            endpoint.breaker.record_failure()
+            raise
+        endpoint.breaker.record_success()
+        return result
+
+    def _hedge_delay(self, endpoint):
+        """Returns how long to wait for an endpoint before hedging, or None to wait for it to finish."""
+        if not self.hedge_percentile:
+            return None
+        delay = endpoint.latency.percentile(self.hedge_percentile)
+        return DEFAULT_HEDGE_DELAY if delay is None else delay
+
+    def _call(self, endpoints, request):
+        """
+        Sends a request to the first available endpoint, failing over and hedging to the next ones.
+
+        Endpoints whose circuit breaker is open are skipped. When a request fails, the next
+        endpoint is tried. When it is slower than the hedge percentile of the endpoint's recent
+        latency, the next endpoint is asked as well and the first successful answer wins.
+
+        Args:
+            endpoints (list): The candidate endpoints in order of preference.
+            request (callable): Sends the request to the endpoint it is given and returns the result.
+
+        Returns:
+            The result of the first successful request. If all fail, the first error is raised.
+        """
+        if len(endpoints) == 1:
+            return self._attempt(endpoints[0], request)
+
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with self._session_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.pool_size)
+            pool = self._hedge_pool
+
+        # Allow each breaker only when its endpoint is about to be used; a half-open breaker lets one trial through.
+        candidates = (endpoint for endpoint in endpoints if endpoint.breaker.allow())
+        pending = {}
+        errors = []
+        last = next(candidates, None)
+        if last is None:
+            # Every endpoint is cooling down; the primary is still better than failing outright.
+            return self._attempt(endpoints[0], request)
+        pending[pool.submit(self._attempt, last, request)] = last
+
+        while pending:
+            delay = self._hedge_delay(last) if last is not None else None
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # The request is slower than usual: hedge with the next endpoint.
+                last = next(candidates, None)
+                if last is not None:
+                    pending[pool.submit(self._attempt, last, request)] = last
+                continue
+            for future in done:
+                del pending[future]
+                try:
+                    return future.result()
+                except Exception as e:
+                    if not is_request_error(e):
+                        raise
+                    errors.append(e)
+            if not pending:
+                last = next(candidates, None)
+                if last is not None:
+                    pending[pool.submit(self._attempt, last, request)] = last
+        raise errors[0]
+
+    def get_ip_infos(self, ip_addresses, fields_to_request=None):
+        """
+        Gets IP information for several addresses using the batch endpoint.
+
+        The addresses are sent in chunks of up to BATCH_SIZE per request.
+
+        Args:
+            ip_addresses (list): The IP addresses to get information for.
+            fields_to_request (list, optional): A list of fields to request from the API. Defaults to None.
+
+        Returns:
+            list: The IP information of each address as an IPRecord, in the same order as ip_addresses.
+        """
+        results = [None] * len(ip_addresses)
+        fetched = {}
+        unshared_groups = set()
+        pending = list(range(len(ip_addresses)))
+
+        while pending:
+            to_fetch = []
+            waiting = []
+            groups = {}
+            for index in pending:
+                ip_address = ip_addresses[index]
+                if ip_address in fetched:
+                    results[index] = dict(fetched[ip_address])
+                    continue
+                data = self._classify(ip_address) or self._get_cached(ip_address, fields_to_request)
+                if data is None:
+                    data, missing_host_fields = self._get_from_prefix(ip_address, fields_to_request)
+                    if missing_host_fields:
+                        data = None
+                if data is not None:
+                    results[index] = data
+                    continue
+
+                # Send one address per prefix (or per duplicate address) and resolve the rest from its result.
+                prefix = self.prefix_cache.prefix_of(ip_address) if self.prefix_cache is not None else None
+                # The prefix cache can't answer a request for the API's default fields (no field list), so
+                # those addresses would wait for a round each; they are grouped by address instead.
+                shareable = fields_to_request and not any(f in PER_HOST_FIELDS and f != "query" for f in fields_to_request)
+                group = prefix if prefix is not None and shareable else ip_address
+                if group in unshared_groups:
+                    group = ip_address
+                if group in groups:
+                    waiting.append(index)
+                else:
+                    groups[group] = index
+                    to_fetch.append(index)
+            group_of = {index: group for group, index in groups.items()}
+
+            for start in range(0, len(to_fetch), BATCH_SIZE):
+                chunk = to_fetch[start:start + BATCH_SIZE]
+                payloads = self._fetch_batch([ip_addresses[i] for i in chunk], fields_to_request)
+                # The chunk's results are stored in one short cache transaction, not one per address.
+                with self.cache.batch() if self.cache is not None else nullcontext():
+                    for index, data in zip(chunk, payloads):
+                        self._store_cached(ip_addresses[index], fields_to_request, data)
+                for index, data in zip(chunk, payloads):
+                    fetched[ip_addresses[index]] = data
+                    results[index] = data
+                    if data.get("status") != "success":
+                        # A failed lookup tells nothing about its neighbours, so look them up one by one.
+                        unshared_groups.add(group_of[index])
+
+            pending = waiting
+
+        return [self._set_display_ip(data, ip_address) for ip_address, data in zip(ip_addresses, results)]
+
+    def iter_ip_infos(self, ip_addresses, fields_to_request=None, workers=1):
+        """
+        Looks up IP addresses and yields the results in input order.
+
+        With a single worker the addresses are sent to the batch endpoint in chunks.
+        With more workers each address is looked up on its own in a thread pool, so a
+        slow or failing address only affects its own result. Only a bounded number of
+        lookups is in flight at any time, so ip_addresses may be any iterable.
+
+        Args:
+            ip_addresses (iterable): The IP addresses to get information for.
+            fields_to_request (list, optional): A list of fields to request from the API. Defaults to None.
+            workers (int, optional): The number of concurrent lookups. Defaults to 1.
+
+        Yields:
+            tuple: (ip_address, data, error), where either data or error is None.
+        """
+        if workers > 1:
+            yield from self._iter_concurrent(ip_addresses, fields_to_request, workers)
+        else:
+            yield from self._iter_batched(ip_addresses, fields_to_request)
+
+    def _iter_batched(self, ip_addresses, fields_to_request):
+        """Yields lookup results chunk by chunk using the batch endpoint."""
+        for chunk in iter_chunks(ip_addresses, BATCH_SIZE):
+            try:
+                if len(chunk) == 1:
+                    ip_infos = [self.get_ip_info(chunk[0], fields_to_request)]
+                else:
+                    ip_infos = self.get_ip_infos(chunk, fields_to_request)
+            except Exception as e:
+                if not is_request_error(e):
+                    raise
+                for ip_address in chunk:
+                    yield ip_address, None, e
+                continue
+            for ip_address, data in zip(chunk, ip_infos):
+                yield ip_address, data, None
+
+    def _iter_concurrent(self, ip_addresses, fields_to_request, workers):
+        """
+        Yields lookup results from a thread pool, keeping at most 2 * workers lookups in flight.
+
+        Results are yielded in input order as soon as they are ready, also while the input stalls.
+        Duplicate addresses within the in-flight window share one lookup.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            in_flight = {}
+            references = Counter()
+
+            def collect():
+                ip_address, future = pending.popleft()
+                references[ip_address] -= 1
+                if not references[ip_address]:
+                    del references[ip_address]
+                    del in_flight[ip_address]
+                return self._collect(ip_address, future)
+
+            for ip_address in read_ahead(ip_addresses):
+                if ip_address is not IDLE:
+                    if ip_address not in in_flight:
+                        in_flight[ip_address] = executor.submit(self.get_ip_info, ip_address, fields_to_request)
+                    references[ip_address] += 1
+                    pending.append((ip_address, in_flight[ip_address]))
+                while pending and (pending[0][1].done() or len(pending) >= workers * 2):
+                    yield collect()
+            while pending:
+                yield collect()
+
+    @staticmethod
+    def _collect(ip_address, future):
+        """Waits for a lookup future and returns its (ip_address, data, error) tuple."""
+        try:
+            return ip_address, future.result(), None
+        except Exception as e:
+            if not is_request_error(e):
+                raise
+            return ip_address, None, e
@@ -0,0 +1,220 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so that we can import the whatsip modules
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rich.console import Console
+
+from api import IPInfoProvider
+from config import BASE_DEFAULT_CONFIG
+from display import DisplayManager
+from main import save_output
+from stub_server import StubServer, StubSettings, fake_record
+
+OUTPUT_FORMATS = [".json", ".ndjson", ".md", ".txt", ".csv", ".tsv"]
+
+def percentile(values, fraction):
+    """Returns the value below which the given fraction of the sorted values falls."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(latencies, wall_time, count):
+    """
+    Summarizes a set of timings.
+
+    Args:
+        latencies (list): The individual latencies in seconds.
+        wall_time (float): The total time of the run in seconds.
+        count (int): The number of items processed.
+
+    Returns:
+        dict: Throughput and latency statistics in milliseconds.
+    """
+    return {
+        "count": count,
+        "wall_time_s": round(wall_time, 4),
+        "throughput_per_s": round(count / wall_time, 1) if wall_time else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else None,
+    }
+
+def timed(function, latencies):
+    """Wraps a function so that each call's duration is appended to latencies, from whichever thread calls it."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+def make_ips(count, offset=0):
+    """Returns distinct public IPv4 addresses, 256 per /24 network."""
+    return [f"20.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(offset, offset + count)]
+
+def bench_lookups(server, count, workers):
+    """Measures lookup throughput and latency for the single, concurrent and batch paths."""
+    fields = BASE_DEFAULT_CONFIG["default_fields"]
+    results = {}
+
+    with IPInfoProvider(base_url=server.base_url, batch_url=server.batch_url) as provider:
+        latencies = []
+        start = time.perf_counter()
+        for ip in make_ips(count):
+            t0 = time.perf_counter()
+            provider.get_ip_info(ip, fields)
+            latencies.append(time.perf_counter() - t0)
+        results["single"] = summarize(latencies, time.perf_counter() - start, count)
+
+    with IPInfoProvider(base_url=server.base_url, batch_url=server.batch_url, pool_size=workers) as provider:
+        errors = 0
+        latencies = []
+        # Each lookup runs on a worker thread, so it is timed there rather than by when its result is yielded.
+        provider.get_ip_info = timed(provider.get_ip_info, latencies)
+        start = time.perf_counter()
+        for _, _, error in provider.iter_ip_infos(make_ips(count, count), fields, workers=workers):
+            errors += error is not None
+        wall_time = time.perf_counter() - start
+        results["concurrent"] = dict(summarize(latencies, wall_time, count), workers=workers, errors=errors)
+
+    with IPInfoProvider(base_url=server.base_url, batch_url=server.batch_url) as provider:
+        batch_latencies = []
+        ips = make_ips(count, 2 * count)
+        start = time.perf_counter()
+        for chunk_start in range(0, count, 100):
+            t0 = time.perf_counter()
+            provider.get_ip_infos(ips[chunk_start:chunk_start + 100], fields)
+            batch_latencies.append(time.perf_counter() - t0)
+        results["batch"] = dict(summarize(batch_latencies, time.perf_counter() - start, count), requests=len(batch_latencies))
+
+    return results
+
+def bench_rendering(records, repeat):
+    """Measures the render time of every theme registered in DisplayManager."""
+    console = Console(file=io.StringIO(), width=120, force_terminal=False)
+    display_manager = DisplayManager(console)
+    results = {}
+    for theme in display_manager._displays:
+        config = dict(BASE_DEFAULT_CONFIG, theme=theme)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with display_manager.open_stream(config, []) as stream:
+                for data in records:
+                    stream.add(data)
+            timings.append(time.perf_counter() - start)
+            console.file.seek(0)
+            console.file.truncate()
+        per_record = [t / len(records) for t in timings]
+        results[theme] = {
+            "records": len(records),
+            "per_record_ms": round(statistics.median(per_record) * 1000, 4),
+            "total_ms": round(statistics.median(timings) * 1000, 3),
+        }
+    return results
+
+def bench_output(records, repeat):
+    """Measures save_output for every output format."""
+    console = Console(file=io.StringIO())
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for ext in OUTPUT_FORMATS:
+            filename = os.path.join(temp_dir, f"output{ext}")
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                save_output(records, filename, BASE_DEFAULT_CONFIG, [], console)
+                timings.append(time.perf_counter() - start)
+            results[ext.lstrip(".")] = {
+                "records": len(records),
+                "total_ms": round(statistics.median(timings) * 1000, 3),
+                "bytes": os.path.getsize(filename),
+            }
+    return results
+
+def bench_cold_start(repeat):
+    """Measures the wall time of fresh whatsip processes."""
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, LOCALAPPDATA=home)
+        db_path = os.path.join(home, "ranges.csv")
+        with open(db_path, "w", encoding="utf-8") as f:
+            f.write("start,end,country,city\n8.8.8.0,8.8.8.255,United States,Mountain View\n")
+        commands = {
+            "help": [sys.executable, os.path.join(ROOT_DIR, "main.py"), "--help"],
+            "local_lookup": [sys.executable, os.path.join(ROOT_DIR, "main.py"), "8.8.8.8", "--provider", "local", "--db", db_path, "-f", "country,city"],
+        }
+        for name, command in commands.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(command, env=env, cwd=ROOT_DIR, capture_output=True, check=True)
+                timings.append(time.perf_counter() - start)
+            results[name] = {"median_ms": round(statistics.median(timings) * 1000, 2), "min_ms": round(min(timings) * 1000, 2)}
+    return results
+
+def main():
+    """Runs the benchmark suite and prints the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmarks whatsip against a local ip-api stand-in.")
+    parser.add_argument('--lookups', type=int, default=500, help='Number of lookups per lookup benchmark.')
+    parser.add_argument('--workers', type=int, default=16, help='Workers for the concurrent lookup benchmark.')
+    parser.add_argument('--records', type=int, default=200, help='Number of records for the render and output benchmarks.')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions for the render, output and cold-start benchmarks.')
+    parser.add_argument('--latency', type=float, default=20.0, help='Stub response delay in milliseconds.')
+    parser.add_argument('--jitter', type=float, default=10.0, help='Extra random stub delay of up to this many milliseconds.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of stub requests answered with HTTP 503.')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Stub requests allowed per window (0 for no limit).')
+    parser.add_argument('--window', type=float, default=60.0, help='Stub rate-limit window in seconds.')
+    parser.add_argument('--only', help='Comma-separated benchmarks to run: lookups, render, output, cold_start.')
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    selected = set(args.only.split(",")) if args.only else {"lookups", "render", "output", "cold_start"}
+    settings = StubSettings(args.latency / 1000, args.jitter / 1000, args.failure_rate, args.rate_limit, args.window, seed=0)
+    records = []
+    for ip in make_ips(args.records):
+        data = fake_record(ip)
+        data["display_ip"] = ip
+        records.append(data)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(args),
+        "results": {},
+    }
+    if "lookups" in selected:
+        with StubServer(settings) as server:
+            report["results"]["lookups"] = bench_lookups(server, args.lookups, args.workers)
+            report["results"]["lookups"]["stub_requests"] = server.settings.requests
+    if "render" in selected:
+        report["results"]["render"] = bench_rendering(records, args.repeat)
+    if "output" in selected:
+        report["results"]["output"] = bench_output(records, args.repeat)
+    if "cold_start" in selected:
+        report["results"]["cold_start"] = bench_cold_start(args.repeat)
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
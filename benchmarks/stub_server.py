@@ -0,0 +1,250 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Add the parent directory to the path so that we can import the whatsip modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projection import FIELD_BITS
+
+COUNTRIES = [
+    ("North America", "NA", "United States", "US", "CA", "California", "Mountain View", "America/Los_Angeles", -25200, "USD"),
+    ("Oceania", "OC", "Australia", "AU", "NSW", "New South Wales", "Sydney", "Australia/Sydney", 36000, "AUD"),
+    ("Europe", "EU", "Germany", "DE", "HE", "Hesse", "Frankfurt am Main", "Europe/Berlin", 7200, "EUR"),
+    ("Asia", "AS", "Japan", "JP", "13", "Tokyo", "Tokyo", "Asia/Tokyo", 32400, "JPY"),
+]
+ISPS = ["Google LLC", "Cloudflare, Inc.", "Hetzner Online GmbH", "Amazon.com, Inc.", "NTT Communications"]
+
+def fake_record(ip_address):
+    """
+    Returns a deterministic ip-api style record for an address.
+
+    Args:
+        ip_address (str): The address that was looked up.
+
+    Returns:
+        dict: A record with every field ip-api can return.
+    """
+    digest = hashlib.md5(ip_address.encode("utf-8")).digest()
+    continent, continent_code, country, country_code, region, region_name, city, timezone, offset, currency = COUNTRIES[digest[0] % len(COUNTRIES)]
+    isp = ISPS[digest[1] % len(ISPS)]
+    asn = 1000 + int.from_bytes(digest[2:4], "big")
+    return {
+        "status": "success",
+        "continent": continent,
+        "continentCode": continent_code,
+        "country": country,
+        "countryCode": country_code,
+        "region": region,
+        "regionName": region_name,
+        "city": city,
+        "district": "",
+        "zip": str(10000 + int.from_bytes(digest[4:6], "big") % 89999),
+        "lat": round(-60 + digest[6] / 255 * 120, 4),
+        "lon": round(-180 + digest[7] / 255 * 360, 4),
+        "timezone": timezone,
+        "offset": offset,
+        "currency": currency,
+        "isp": isp,
+        "org": isp,
+        "as": f"AS{asn} {isp}",
+        "asname": isp.split(",")[0].upper().replace(" ", "-"),
+        "reverse": f"host-{ip_address.replace('.', '-').replace(':', '-')}.example.net",
+        "mobile": digest[8] % 10 == 0,
+        "proxy": digest[9] % 20 == 0,
+        "hosting": digest[10] % 3 == 0,
+        "query": ip_address,
+    }
+
+def project(record, fields):
+    """Keeps only the requested fields of a record, like ip-api's 'fields' parameter: field names or a numeric bitmask."""
+    if not fields:
+        return record
+    if fields.isdigit():
+        mask = int(fields)
+        wanted = {field for field, bit in FIELD_BITS.items() if mask & bit}
+    else:
+        wanted = set(fields.split(","))
+    wanted |= {"status", "message"}
+    return {k: v for k, v in record.items() if k in wanted}
+
+class StubSettings:
+    """Latency, failure and rate-limit behaviour of the stub server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, rate_limit=0, window=60.0, seed=None):
+        """
+        Initializes the StubSettings class.
+
+        Args:
+            latency (float, optional): Base response delay in seconds. Defaults to 0.0.
+            jitter (float, optional): Extra random delay of up to this many seconds. Defaults to 0.0.
+            failure_rate (float, optional): Fraction of requests answered with HTTP 503. Defaults to 0.0.
+            rate_limit (int, optional): Requests allowed per window, 0 for no limit. Defaults to 0.
+            window (float, optional): The rate-limit window in seconds. Defaults to 60.0.
+            seed (int, optional): Seed for the random delays and failures. Defaults to None.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.window = window
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.requests = 0
+
+    def take(self):
+        """
+        Counts a request against the rate limit and draws its delay and failure.
+
+        Returns:
+            tuple: (allowed, failed, delay, headers), where headers holds X-Rl and X-Ttl when rate limiting is on.
+        """
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.failure_rate
+            if not self.rate_limit:
+                return True, failed, delay, {}
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used = 0
+            reset_in = max(0, int(round(self.window - (now - self.window_start))))
+            if self.used >= self.rate_limit:
+                return False, failed, delay, {"X-Rl": "0", "X-Ttl": str(reset_in)}
+            self.used += 1
+            return True, failed, delay, {"X-Rl": str(self.rate_limit - self.used), "X-Ttl": str(reset_in)}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers ip-api style requests from fake records."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40 ms per response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, payload, headers):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, addresses_from_request):
+        settings = self.server.settings
+        allowed, failed, delay, headers = settings.take()
+        if delay:
+            time.sleep(delay)
+        if not allowed:
+            self._respond(429, {"status": "fail", "message": "too many requests"}, headers)
+            return
+        if failed:
+            self._respond(503, {"status": "fail", "message": "service unavailable"}, headers)
+            return
+        url = urlparse(self.path)
+        fields = parse_qs(url.query).get("fields", [""])[0]
+        addresses, single = addresses_from_request(url)
+        records = [project(fake_record(address or "127.0.0.1"), fields) for address in addresses]
+        self._respond(200, records[0] if single else records, headers)
+
+    def do_GET(self):
+        if not self.path.startswith("/json/"):
+            self._respond(404, {"status": "fail", "message": "not found"}, {})
+            return
+        self._handle(lambda url: ([url.path[len("/json/"):]], True))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if not self.path.startswith("/batch"):
+            self._respond(404, {"status": "fail", "message": "not found"}, {})
+            return
+        queries = json.loads(body or b"[]")
+        self._handle(lambda url: ([q["query"] if isinstance(q, dict) else q for q in queries], False))
+
+class StubServer:
+    """Runs the stub ip-api server on a background thread."""
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        """
+        Initializes the StubServer class.
+
+        Args:
+            settings (StubSettings, optional): The server behaviour. Defaults to StubSettings().
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on, 0 for any free port. Defaults to 0.
+        """
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.settings = settings or StubSettings()
+        self._thread = None
+
+    @property
+    def settings(self):
+        return self.httpd.settings
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/json/"
+
+    @property
+    def batch_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/batch"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """Starts serving on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the server."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    """Runs the stub server in the foreground."""
+    parser = argparse.ArgumentParser(description="A local stand-in for the ip-api.com endpoints.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base response delay in milliseconds.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many milliseconds.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503.')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests allowed per window (0 for no limit).')
+    parser.add_argument('--window', type=float, default=60.0, help='Rate-limit window in seconds.')
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency / 1000, args.jitter / 1000, args.failure_rate, args.rate_limit, args.window)
+    server = StubServer(settings, args.host, args.port)
+    print(f"Serving on {server.base_url} and {server.batch_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
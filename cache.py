@@ -0,0 +1,231 @@
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+
+# How long a write waits for another process's transaction before it is skipped, in seconds. Every
+# transaction is short, so waiting longer would only mean that something is wrong with the database.
+BUSY_TIMEOUT = 2.0
+# Cache hits move an entry's accessed_at, which only matters for eviction, so hits are recorded this many at
+# a time instead of each opening a write transaction of its own.
+TOUCH_BATCH = 100
+
+class LookupCache:
+    """
+    A persistent, size-bounded cache of raw API lookup results backed by SQLite.
+
+    Several whatsip processes may share the database, so every write is a short transaction of its own
+    (or of one batch(), e.g. the results of one batch request), and a database that is locked or broken
+    only costs cache hits: errors are treated as misses and the writes are skipped.
+    """
+
+    def __init__(self, path, ttl=86400, max_entries=10000, negative_ttl=0, busy_timeout=BUSY_TIMEOUT):
+        """
+        Initializes the LookupCache class.
+
+        Args:
+            path (str): The path to the SQLite database file.
+            ttl (int, optional): How long an entry stays valid, in seconds. Defaults to 86400.
+            max_entries (int, optional): The maximum number of entries to keep. Defaults to 10000.
+            negative_ttl (int, optional): How long a failed lookup stays valid, in seconds. 0 means failed
+                                          lookups are not cached. Defaults to 0.
+            busy_timeout (float, optional): How long a write waits for a lock held by another process,
+                                            in seconds. Defaults to BUSY_TIMEOUT.
+
+        Raises:
+            sqlite3.Error: If the database can't be opened.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # Reentrant, so set() can be called inside batch().
+        self._lock = threading.RLock()
+        # Cache hits not yet written to accessed_at, as (accessed_at, ip, fields) rows.
+        self._touched = []
+        # Transactions are opened and committed explicitly, so none is left open between writes.
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Losing the last writes in a power cut costs a few lookups; syncing every commit costs every write.
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS lookups ("
+            "ip TEXT NOT NULL, fields TEXT NOT NULL, payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (ip, fields))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS lookups_accessed_at ON lookups (accessed_at)")
+        self._count = self._connection.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+
+    @staticmethod
+    def _fields_key(fields_to_request):
+        """
+        Returns a canonical key for a set of requested fields.
+
+        Args:
+            fields_to_request (list): A list of fields requested from the API.
+
+        Returns:
+            str: The fields joined in sorted order, or an empty string for the API defaults.
+        """
+        if not fields_to_request:
+            return ""
+        return ",".join(sorted({f for f in fields_to_request if f not in ["status", "message"]}))
+
+    def get(self, ip_address, fields_to_request=None):
+        """
+        Returns the cached API payload for an IP address and field set.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            fields_to_request (list, optional): A list of fields requested from the API. Defaults to None.
+
+        Returns:
+            dict: The raw API payload, or None if there is no fresh entry.
+        """
+        fields_key = self._fields_key(fields_to_request)
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._connection.execute(
+                    "SELECT payload, created_at FROM lookups WHERE ip = ? AND fields = ?",
+                    (ip_address, fields_key)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            payload, created_at = row
+            data = json.loads(payload)
+            ttl = self.ttl if data.get("status") == "success" else self.negative_ttl
+            if now - created_at >= ttl:
+                # The next set() replaces the expired entry, and eviction removes it if none comes.
+                return None
+            self._touched.append((now, ip_address, fields_key))
+            if len(self._touched) >= TOUCH_BATCH:
+                try:
+                    with self._transaction():
+                        self._write_touches()
+                except sqlite3.Error:
+                    pass
+        return data
+
+    def set(self, ip_address, fields_to_request, data):
+        """
+        Stores the raw API payload for an IP address and field set.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            fields_to_request (list): A list of fields requested from the API.
+            data (dict): The raw API payload.
+        """
+        fields_key = self._fields_key(fields_to_request)
+        payload = json.dumps(data, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            try:
+                with self._transaction():
+                    # Recent hits must count before entries are picked for eviction.
+                    self._write_touches()
+                    cursor = self._connection.execute(
+                        "INSERT OR IGNORE INTO lookups (ip, fields, payload, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                        (ip_address, fields_key, payload, now, now)
+                    )
+                    if not cursor.rowcount:
+                        self._connection.execute(
+                            "UPDATE lookups SET payload = ?, created_at = ?, accessed_at = ? WHERE ip = ? AND fields = ?",
+                            (payload, now, now, ip_address, fields_key)
+                        )
+                    elif self._count + 1 > self.max_entries:
+                        self._evict(self._count + 1)
+                    else:
+                        self._count += 1
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the set() calls of the block into one transaction, committed when the block ends.
+
+        The block should only store results: the database stays locked for other processes, and the cache
+        for other threads, until it ends. If the transaction can't be started, each set() runs in a
+        transaction of its own.
+        """
+        # Held for the whole block, so other threads wait instead of writing into this transaction, whose
+        # commit or rollback is only this block's to decide.
+        with self._lock:
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+                started = True
+            except sqlite3.Error:
+                # Another process holds the lock.
+                started = False
+            try:
+                yield self
+            finally:
+                if started:
+                    self._end_transaction()
+
+    @contextmanager
+    def _transaction(self):
+        """Runs the block in a transaction of its own, or in the open batch() transaction."""
+        if self._connection.in_transaction:
+            yield
+            return
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._rollback()
+            raise
+        self._end_transaction()
+
+    def _end_transaction(self):
+        """Commits the open transaction, or rolls it back if it can't be committed."""
+        try:
+            self._connection.execute("COMMIT")
+        except sqlite3.Error:
+            self._rollback()
+
+    def _rollback(self):
+        """Rolls back the open transaction and recounts the entries it had changed."""
+        try:
+            self._connection.execute("ROLLBACK")
+            self._count = self._connection.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+        except sqlite3.Error:
+            pass
+
+    def _write_touches(self):
+        """Writes the accessed_at of recent cache hits."""
+        touched, self._touched = self._touched, []
+        if touched:
+            self._connection.executemany("UPDATE lookups SET accessed_at = ? WHERE ip = ? AND fields = ?", touched)
+
+    def _evict(self, count):
+        """
+        Removes the least recently used entries until the cache is back under its size cap.
+
+        Args:
+            count (int): The number of entries, including the one just added.
+        """
+        target = int(self.max_entries * 0.9)
+        self._connection.execute(
+            "DELETE FROM lookups WHERE rowid IN (SELECT rowid FROM lookups ORDER BY accessed_at LIMIT ?)",
+            (count - target,)
+        )
+        self._count = self._connection.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+
+    def close(self):
+        """Writes the accessed_at of recent hits and closes the database. Closing twice does nothing."""
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                with self._transaction():
+                    self._write_touches()
+            except sqlite3.Error:
+                pass
+            self._connection.close()
+            self._connection = None
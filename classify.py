@@ -0,0 +1,84 @@
+from bisect import bisect_right
+import ipaddress
+
+PRIVATE_RANGE = "private range"
+RESERVED_RANGE = "reserved range"
+INVALID_QUERY = "invalid query"
+
+# Ranges that ip-api answers with 'private range' (RFC 1918 and unique local addresses).
+PRIVATE_NETWORKS = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "fc00::/7")
+# Other ranges that are never routed on the internet, which ip-api answers with 'reserved range':
+# "this network", CGNAT, loopback, link-local, IETF protocol assignments, documentation, benchmarking,
+# multicast and the old class E space (with the broadcast address).
+RESERVED_NETWORKS = (
+    "0.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16", "192.0.0.0/24", "192.0.2.0/24",
+    "198.18.0.0/15", "198.51.100.0/24", "203.0.113.0/24", "224.0.0.0/4", "240.0.0.0/4",
+    "::/127", "100::/64", "2001:db8::/32", "fe80::/10", "ff00::/8"
+)
+
+def _range_table(networks):
+    """
+    Builds the lookup table of one IP version.
+
+    Args:
+        networks (iterable): (network, message) pairs of that version.
+
+    Returns:
+        tuple: (starts, ends, messages), sorted by start, for bisecting with an address as an integer.
+    """
+    rows = sorted((int(network.network_address), int(network.broadcast_address), message) for network, message in networks)
+    return tuple(list(column) for column in zip(*rows))
+
+def _build_tables():
+    """Returns the range table of each IP version, keyed by version."""
+    networks = {4: [], 6: []}
+    for names, message in ((PRIVATE_NETWORKS, PRIVATE_RANGE), (RESERVED_NETWORKS, RESERVED_RANGE)):
+        for name in names:
+            network = ipaddress.ip_network(name)
+            networks[network.version].append((network, message))
+    return {version: _range_table(rows) for version, rows in networks.items()}
+
+_TABLES = _build_tables()
+
+def classify(ip_address):
+    """
+    Tells whether ip-api would reject an address without looking it up.
+
+    Args:
+        ip_address (str): The address or hostname given on the command line.
+
+    Returns:
+        str: ip-api's message for the failure ('private range', 'reserved range' or 'invalid query'),
+             or None if the address has to be looked up. Hostnames and the empty string (your own IP)
+             are always looked up.
+    """
+    if not ip_address:
+        return None
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        # Anything made only of digits and dots, or with a colon, was meant as an address. Other
+        # text may be a hostname, which ip-api resolves.
+        if ":" in ip_address or not ip_address.strip("0123456789."):
+            return INVALID_QUERY
+        return None
+
+    starts, ends, messages = _TABLES[address.version]
+    value = int(address)
+    index = bisect_right(starts, value) - 1
+    if index >= 0 and value <= ends[index]:
+        return messages[index]
+    return None
+
+def failure_record(ip_address, message):
+    """
+    Returns the payload ip-api sends for an address it rejects.
+
+    Args:
+        ip_address (str): The address that was given.
+        message (str): The failure message, as returned by classify().
+
+    Returns:
+        dict: A payload with status 'fail'.
+    """
+    return {"status": "fail", "message": message, "query": ip_address}
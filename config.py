@@ -1,5 +1,5 @@
 BASE_DEFAULT_CONFIG = {
-    "_comment_theme": "Set the display theme. Options: 'sleek', 'dashboard', 'tree', 'minimal', 'json', 'grid', 'markdown', 'compact'.",
+    "_comment_theme": "Set the display theme. Options: 'sleek', 'dashboard', 'tree', 'minimal', 'json', 'grid', 'markdown', 'compact', 'table', 'report'. 'table' shows all results as rows of one table; 'report' shows a summary of them.",
     "theme": "sleek",
     "style": {
         "header": "bold white on blue",
@@ -28,7 +28,43 @@ BASE_DEFAULT_CONFIG = {
         "org",
         "as",
         "query"
-    ]
+    ],
+    "_comment_cache": "Lookup results are cached in the config directory. 'cache_ttl' is in seconds; 'cache_max_entries' caps the cache size. Failed lookups are kept for 'negative_cache_ttl' seconds (0 disables).",
+    "cache_ttl": 86400,
+    "cache_max_entries": 10000,
+    "negative_cache_ttl": 600,
+    "_comment_classification": "Answer private, reserved and malformed addresses locally, the way ip-api would, without spending a request.",
+    "local_classification": True,
+    "_comment_http": "Connections are kept alive and reused. 'http_retries' retries connection errors and 5xx responses with exponential backoff.",
+    "http_pool_size": 10,
+    "http_retries": 0,
+    "http_backoff_factor": 0.5,
+    "_comment_prefix_reuse": "Reuse location and network fields for addresses in an already resolved prefix (e.g. the same /24) instead of asking the API again.",
+    "prefix_reuse": False,
+    "prefix_length_ipv4": 24,
+    "prefix_length_ipv6": 48,
+    "_comment_provider": "Where lookups come from. Options: 'ip-api' (online) or 'local' (offline, from the CSV file in 'local_db').",
+    "provider": "ip-api",
+    "local_db": "",
+    "_comment_live_table": "The 'table' theme redraws the table live until it has this many rows, then prints further rows as plain lines.",
+    "live_table_max_rows": 100,
+    "_comment_daemon": "Address of 'whatsip serve', as 'host:port' or a Unix socket path. 'daemon_cache_entries' caps the results it keeps in memory.",
+    "daemon_address": "127.0.0.1:8765",
+    "daemon_cache_entries": 50000,
+    "_comment_endpoints": "ip-api compatible services in order of preference, e.g. {\"name\": \"pro\", \"url\": \"https://pro.ip-api.com/json/\", \"batch_url\": \"https://pro.ip-api.com/batch\", \"params\": {\"key\": \"YOUR_KEY\"}}. 'field_map' renames a mirror's fields to ip-api's and 'timeout' is in seconds. Empty uses the free ip-api endpoint.",
+    "endpoints": [],
+    "_comment_quota": "Concurrent whatsip processes on this host share each endpoint's rate-limit quota through 'quota.json' in the config directory, so together they stay within the limit of their shared IP address. Set to false to let each process pace itself alone.",
+    "shared_quota": True,
+    "_comment_hedging": "With several endpoints, a lookup slower than 'hedge_percentile' of the endpoint's recent latency is also sent to the next one (0 disables). An endpoint that fails 'circuit_breaker_failures' times in a row is skipped for 'circuit_breaker_cooldown' seconds.",
+    "hedge_percentile": 95,
+    "circuit_breaker_failures": 5,
+    "circuit_breaker_cooldown": 30,
+    "_comment_deferred": "Slow fields that are fetched in the background after the others are shown, e.g. 'reverse' (a PTR lookup by ip-api). 'reverse_dns' is 'api' to ask the provider or 'local' to resolve PTR records on this machine.",
+    "deferred_fields": ["reverse"],
+    "reverse_dns": "api",
+    "_comment_summary": "The 'report' theme and --summary group results by 'summary_by' ('country', 'as', 'isp' or 'org') and list the 'summary_top' largest groups; the rest are combined into 'Other'.",
+    "summary_by": "country",
+    "summary_top": 20
 }
 
 CATEGORIES = {
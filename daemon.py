@@ -0,0 +1,400 @@
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from api import BATCH_SIZE, Provider, iter_chunks
+from records import IPRecord
+
+def parse_address(address):
+    """
+    Parses a daemon address.
+
+    Args:
+        address (str): 'host:port', or the path of a Unix socket (anything containing a '/').
+
+    Returns:
+        tuple: ("unix", path) or ("tcp", (host, port)).
+    """
+    if "/" in address or os.sep in address:
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"'{address}' is neither host:port nor a socket path")
+    return "tcp", (host.strip("[]"), int(port))
+
+class DaemonError(Exception):
+    """Raised when the daemon can't be reached or answers with an error."""
+
+class ResultCache:
+    """A thread-safe in-memory LRU of successful lookups that expire after a TTL."""
+
+    def __init__(self, max_entries=50000, ttl=86400, clock=time.monotonic):
+        """
+        Initializes the ResultCache class.
+
+        Args:
+            max_entries (int, optional): The maximum number of results to keep. Defaults to 50000.
+            ttl (int, optional): How many seconds a result stays valid. Defaults to 86400.
+            clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(ip_address, fields_to_request):
+        return ip_address, tuple(sorted(fields_to_request or ()))
+
+    def get(self, ip_address, fields_to_request):
+        """
+        Returns the cached result for an address and field list.
+
+        Args:
+            ip_address (str): The IP address.
+            fields_to_request (list): The requested fields.
+
+        Returns:
+            dict: The cached result, or None if there is no valid entry.
+        """
+        key = self._key(ip_address, fields_to_request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, data = entry
+            if self.clock() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, ip_address, fields_to_request, data):
+        """
+        Stores a successful result, evicting the least recently used entry when full.
+
+        Args:
+            ip_address (str): The IP address.
+            fields_to_request (list): The requested fields.
+            data (dict): The IP information dictionary.
+        """
+        if not ip_address or data.get("status") != "success":
+            return
+        key = self._key(ip_address, fields_to_request)
+        with self._lock:
+            self._entries[key] = (self.clock(), data)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """Answers lookup requests with JSON."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, payload):
+        # Results are IPRecords, which json only knows how to write as their dictionaries.
+        body = json.dumps(payload, ensure_ascii=False, default=IPRecord.to_dict).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        daemon = self.server.daemon
+        if url.path == "/health":
+            self._respond(200, daemon.health())
+        elif url.path == "/lookup":
+            fields = [f for f in query.get("fields", [""])[0].split(",") if f]
+            result = daemon.lookup([query.get("ip", [""])[0]], fields or None)[0]
+            self._respond(200, result)
+        else:
+            self._respond(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path != "/lookup":
+            self._respond(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(body or b"{}")
+            ips = [str(ip) for ip in request.get("ips", [])]
+            fields = request.get("fields") or None
+        except (ValueError, AttributeError, TypeError):
+            self._respond(400, {"error": "expected a JSON object with 'ips' and 'fields'"})
+            return
+        self._respond(200, {"results": self.server.daemon.lookup(ips, fields)})
+
+class _UnixDaemonHandler(_DaemonHandler):
+    """The handler for Unix sockets, which have no Nagle algorithm to disable."""
+
+    disable_nagle_algorithm = False
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    """A threading HTTP server listening on a Unix socket."""
+
+    address_family = getattr(socket, "AF_UNIX", None)
+
+    def server_bind(self):
+        # HTTPServer.server_bind resolves a host name, which a socket path doesn't have.
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def get_request(self):
+        # Unix socket peers have no address; the handler expects a (host, port) pair.
+        request, _ = self.socket.accept()
+        return request, ("local", 0)
+
+class DaemonServer:
+    """Serves lookups from one warm provider and an in-memory result cache."""
+
+    def __init__(self, provider, address, max_entries=50000, ttl=86400, workers=1):
+        """
+        Initializes the DaemonServer class.
+
+        Args:
+            provider (Provider): The provider that performs cache misses.
+            address (str): 'host:port' or the path of a Unix socket to listen on.
+            max_entries (int, optional): The size of the in-memory result cache. Defaults to 50000.
+            ttl (int, optional): How many seconds results are kept. Defaults to 86400.
+            workers (int, optional): Concurrent lookups per request, passed to iter_ip_infos. Defaults to 1.
+        """
+        self.provider = provider
+        self.address = address
+        self.results = ResultCache(max_entries, ttl)
+        self.workers = workers
+        self.started_at = time.time()
+        self.requests = 0
+        self.hits = 0
+        self._stats_lock = threading.Lock()
+
+        family, bind_address = parse_address(address)
+        self._socket_path = None
+        if family == "unix":
+            if _UnixHTTPServer.address_family is None:
+                raise ValueError("Unix sockets are not supported on this platform")
+            if os.path.exists(bind_address):
+                os.unlink(bind_address)
+            self.httpd = _UnixHTTPServer(bind_address, _UnixDaemonHandler)
+            os.chmod(bind_address, 0o600)
+            self._socket_path = bind_address
+        else:
+            self.httpd = ThreadingHTTPServer(bind_address, _DaemonHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.daemon = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lookup(self, ip_addresses, fields_to_request):
+        """
+        Looks up addresses, answering from the result cache where possible.
+
+        Args:
+            ip_addresses (list): The IP addresses to look up.
+            fields_to_request (list): The fields to request, or None for the provider's default.
+
+        Returns:
+            list: One dictionary per address in input order, holding "ip" and either "data" or "error".
+        """
+        results = [None] * len(ip_addresses)
+        misses = []
+        for index, ip_address in enumerate(ip_addresses):
+            data = self.results.get(ip_address, fields_to_request)
+            if data is None:
+                misses.append(index)
+            else:
+                results[index] = {"ip": ip_address, "data": data}
+
+        with self._stats_lock:
+            self.requests += len(ip_addresses)
+            self.hits += len(ip_addresses) - len(misses)
+
+        lookups = self.provider.iter_ip_infos([ip_addresses[i] for i in misses], fields_to_request, self.workers)
+        for index, (ip_address, data, error) in zip(misses, lookups):
+            if error is not None:
+                results[index] = {"ip": ip_address, "error": str(error)}
+                continue
+            self.results.set(ip_address, fields_to_request, data)
+            results[index] = {"ip": ip_address, "data": data}
+        return results
+
+    def health(self):
+        """
+        Returns the state of the daemon.
+
+        Returns:
+            dict: Uptime, lookup counters, cache size and, when known, the API quota.
+        """
+        with self._stats_lock:
+            state = {
+                "status": "ok",
+                "uptime": round(time.time() - self.started_at, 1),
+                "lookups": self.requests,
+                "cache_hits": self.hits,
+                "cached": len(self.results),
+            }
+        quota = getattr(self.provider, "quota", None)
+        if quota is not None:
+            state["quota"] = quota
+        return state
+
+    def serve_forever(self):
+        """Answers requests until close() is called or the process is interrupted."""
+        self.httpd.serve_forever()
+
+    def close(self):
+        """Stops listening and closes the provider."""
+        self.httpd.server_close()
+        if self._socket_path is not None and os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        self.provider.close()
+
+class DaemonProvider(Provider):
+    """A provider that forwards lookups to a running 'whatsip serve' daemon."""
+
+    def __init__(self, address, timeout=30):
+        """
+        Initializes the DaemonProvider class.
+
+        Args:
+            address (str): 'host:port' or the path of the daemon's Unix socket.
+            timeout (int, optional): The timeout of each request in seconds. Defaults to 30.
+        """
+        self.address = address
+        self.timeout = timeout
+        self._family, self._target = parse_address(address)
+        # One kept-alive connection per thread, so background lookups don't interleave on a socket.
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connect(self):
+        import http.client
+
+        if self._family == "tcp":
+            return http.client.HTTPConnection(*self._target, timeout=self.timeout)
+
+        target = self._target
+
+        class UnixHTTPConnection(http.client.HTTPConnection):
+            def connect(self):
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(target)
+
+        return UnixHTTPConnection("localhost", timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        """
+        Sends a request to the daemon over a kept-alive connection.
+
+        Args:
+            method (str): 'GET' or 'POST'.
+            path (str): The path, including the query string.
+            payload (dict, optional): A JSON body. Defaults to None.
+
+        Returns:
+            dict: The decoded JSON response.
+        """
+        import http.client
+
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with self.timings.phase("daemon"):
+            # A kept-alive connection may have been closed by the daemon; retry once on a fresh one.
+            for attempt in range(2):
+                connection = getattr(self._local, "connection", None)
+                if connection is None:
+                    connection = self._local.connection = self._connect()
+                    with self._connections_lock:
+                        self._connections.append(connection)
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    status, content = response.status, response.read()
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    self._local.connection = None
+                    with self._connections_lock:
+                        if connection in self._connections:
+                            self._connections.remove(connection)
+                    if attempt:
+                        raise DaemonError(f"Could not reach the whatsip daemon at {self.address}: {e}") from e
+        if status != 200:
+            raise DaemonError(f"The whatsip daemon answered with HTTP {status}.")
+        return json.loads(content)
+
+    def close(self):
+        """Closes the connections to the daemon."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def get_ip_info(self, ip_address, fields_to_request=None):
+        """
+        Gets information for one IP address from the daemon.
+
+        Args:
+            ip_address (str): The IP address to get information for.
+            fields_to_request (list, optional): A list of fields to request. Defaults to None.
+
+        Returns:
+            IPRecord: The IP information.
+        """
+        from urllib.parse import urlencode
+
+        query = urlencode({"ip": ip_address, "fields": ",".join(fields_to_request or [])})
+        result = self._request("GET", f"/lookup?{query}")
+        if "error" in result:
+            raise DaemonError(result["error"])
+        return IPRecord(result["data"])
+
+    def iter_ip_infos(self, ip_addresses, fields_to_request=None, workers=1):
+        """
+        Looks up IP addresses in chunks of up to BATCH_SIZE per request and yields the results in input order.
+
+        Args:
+            ip_addresses (iterable): The IP addresses to get information for.
+            fields_to_request (list, optional): A list of fields to request. Defaults to None.
+            workers (int, optional): Ignored; the daemon decides how to perform lookups. Defaults to 1.
+
+        Yields:
+            tuple: (ip_address, data, error), where either data or error is None.
+        """
+        for chunk in iter_chunks(ip_addresses, BATCH_SIZE):
+            try:
+                results = self._request("POST", "/lookup", {"ips": chunk, "fields": fields_to_request})["results"]
+            except DaemonError as e:
+                for ip_address in chunk:
+                    yield ip_address, None, e
+                continue
+            for ip_address, result in zip(chunk, results):
+                if "error" in result:
+                    yield ip_address, None, DaemonError(result["error"])
+                else:
+                    yield ip_address, IPRecord(result["data"]), None
@@ -0,0 +1,197 @@
+from collections import deque
+import queue
+import socket
+import sys
+
+from api import is_request_error
+
+# Background lookups run at least this many at a time, so a few slow PTR records don't hold up the rest.
+DEFAULT_WORKERS = 4
+# Lookups submitted but not yet finished, per worker; submit() waits for one to finish beyond that.
+MAX_PENDING_PER_WORKER = 4
+# Plain output and -o hold back the records that follow one still waiting for its deferred fields. Beyond
+# this many, results are not taken in until the lookups holding them back finish.
+MAX_HELD_BACK = 1000
+
+def resolve_reverse(ip_address):
+    """
+    Resolves the PTR record of an address on this machine.
+
+    Args:
+        ip_address (str): The IP address.
+
+    Returns:
+        str: The host name, or an empty string if there is none (as ip-api reports it).
+    """
+    try:
+        return socket.gethostbyaddr(ip_address)[0]
+    except (OSError, UnicodeError):
+        return ""
+
+class DeferredLookups:
+    """Fetches slow fields of already shown results in the background and hands them back as patches."""
+
+    def __init__(self, provider, fields, resolver="api", workers=DEFAULT_WORKERS, keep_order=False, max_pending=None):
+        """
+        Initializes the DeferredLookups class.
+
+        Args:
+            provider (Provider): The provider the fast fields came from.
+            fields (list): The deferred fields, e.g. ['reverse'].
+            resolver (str, optional): 'api' to request the fields from the provider, or 'local' to resolve
+                                      'reverse' with this machine's DNS resolver. Defaults to 'api'.
+            workers (int, optional): The number of concurrent background lookups. Defaults to DEFAULT_WORKERS.
+            keep_order (bool, optional): Remember submitted records so completed() can return them in
+                                         submission order. Defaults to False.
+            max_pending (int, optional): The most lookups that may be submitted but not yet finished.
+                                         Defaults to MAX_PENDING_PER_WORKER per worker.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.provider = provider
+        self.fields = list(fields)
+        self.resolver = resolver
+        self.keep_order = keep_order
+        self.max_pending = max_pending or workers * MAX_PENDING_PER_WORKER
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._done = queue.SimpleQueue()
+        self._order = deque()
+        # Lookups that finished while submit() waited for room, not yet handed back.
+        self._finished = deque()
+        # Only touched by the thread that submits and collects; workers report through _done.
+        self._outstanding = 0
+        self._in_flight = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stops the background lookups that have not started yet."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _lookup(self, ip_address):
+        """Fetches the deferred fields of one address and returns them as a dictionary."""
+        with self.provider.timings.phase("deferred", ip_address):
+            patch = {}
+            fields = self.fields
+            if self.resolver == "local" and "reverse" in fields:
+                patch["reverse"] = resolve_reverse(ip_address)
+                fields = [f for f in fields if f != "reverse"]
+            if fields:
+                data = self.provider.get_ip_info(ip_address, fields)
+                if data.get("status") == "success":
+                    patch.update({f: data[f] for f in fields if f in data})
+            return patch
+
+    def submit(self, record, ip_address):
+        """
+        Starts fetching the deferred fields of a result.
+
+        Args:
+            record (dict): The IP information dictionary that was shown without them.
+            ip_address (str): The address to look up, normally the record's 'query'.
+        """
+        entry = self._in_flight.get(id(record))
+        if entry is None:
+            while self._outstanding >= self.max_pending:
+                self._finished.append(self._finish(*self._done.get()))
+            # Results for duplicate addresses may share one record; it only needs one lookup.
+            entry = self._in_flight[id(record)] = [record, False]
+            self._outstanding += 1
+            future = self._executor.submit(self._lookup, ip_address)
+            future.add_done_callback(lambda future: self._done.put((entry, future)))
+        if self.keep_order:
+            self._order.append(entry)
+
+    def add_complete(self, record):
+        """
+        Queues a record that already has its deferred fields, keeping its place for completed().
+
+        Args:
+            record (dict): The IP information dictionary.
+        """
+        if self.keep_order:
+            self._order.append([record, True])
+
+    def _finish(self, entry, future):
+        """Merges a finished lookup into its record and returns (record, patch)."""
+        self._outstanding -= 1
+        del self._in_flight[id(entry[0])]
+        try:
+            patch = future.result()
+        except Exception as e:
+            # A deferred field is a nice-to-have; a failed lookup leaves it out.
+            daemon = sys.modules.get("daemon")
+            if not (is_request_error(e) or isinstance(e, OSError) or (daemon is not None and isinstance(e, daemon.DaemonError))):
+                raise
+            patch = {}
+        record = entry[0]
+        record.update(patch)
+        entry[1] = True
+        return record, patch
+
+    def ready(self):
+        """
+        Yields the lookups that have finished so far, without waiting.
+
+        Yields:
+            tuple: (record, patch). The patch is already merged into the record; it is empty if the lookup failed.
+        """
+        while self._finished:
+            yield self._finished.popleft()
+        while True:
+            try:
+                entry, future = self._done.get_nowait()
+            except queue.Empty:
+                return
+            yield self._finish(entry, future)
+
+    def wait(self):
+        """
+        Waits until at least one lookup has finished and yields the finished ones.
+
+        Yields:
+            tuple: (record, patch), as in ready().
+        """
+        if not self._finished and self._outstanding:
+            self._finished.append(self._finish(*self._done.get()))
+        yield from self.ready()
+
+    @property
+    def pending(self):
+        """Whether lookups are still running, or finished without being handed back yet."""
+        return bool(self._outstanding or self._finished)
+
+    @property
+    def held_back(self):
+        """The number of records completed() is holding back until the records before them are complete."""
+        return len(self._order)
+
+    def drain(self):
+        """
+        Waits for the remaining lookups and yields them as they finish.
+
+        Yields:
+            tuple: (record, patch), as in ready().
+        """
+        yield from self.ready()
+        while self._outstanding:
+            entry, future = self._done.get()
+            yield self._finish(entry, future)
+
+    def completed(self):
+        """
+        Returns the records whose deferred fields have arrived, in submission order.
+
+        A record is only returned once every record submitted before it is complete as well.
+
+        Returns:
+            list: The completed records, each returned once.
+        """
+        records = []
+        while self._order and self._order[0][1]:
+            records.append(self._order.popleft()[0])
+        return records
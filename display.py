@@ -1,15 +1,10 @@
+import importlib
 import sys
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.box import ROUNDED
-from rich.columns import Columns
-from rich.text import Text
-from rich.tree import Tree
-from rich.json import JSON
-from rich.markdown import Markdown
-
-from config import BASE_DEFAULT_CONFIG, CATEGORIES
+
+from config import BASE_DEFAULT_CONFIG
+from projection import PENDING_VALUE, ProjectionPlan
+
+# rich's renderables are imported inside each theme, so a run only pays for the theme it uses.
 
 class Display:
     """Base class for all display themes."""
@@ -22,31 +17,28 @@ class Display:
             console (Console): The rich console object.
             config (dict): The configuration dictionary.
             data (dict): The IP information dictionary.
-            fields_to_show (list): A list of fields to show in the output.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
         """
         self.console = console
         self.config = config
         self.data = data
-        self.fields_to_show = fields_to_show
+        self.plan = ProjectionPlan.of(config, fields_to_show)
+        self.fields_to_show = self.plan.fields_to_show
         self.style = self.config.get("style", BASE_DEFAULT_CONFIG["style"])
-        self.current_fields = self._get_current_fields()
+        self.current_fields = self.plan.fields_for(data)
 
-    def _get_current_fields(self):
+    def render(self):
         """
-        Returns the list of fields to display.
+        Builds the IP information as a rich renderable.
 
         Returns:
-            list: A list of fields to display.
+            The renderable that display() prints.
         """
-        if not self.fields_to_show:
-            return self.config.get("default_fields", BASE_DEFAULT_CONFIG["default_fields"])
-        if 'all' in self.fields_to_show:
-            return [key for key in self.data if key != "status"]
-        return self.fields_to_show
+        raise NotImplementedError
 
     def display(self):
         """Displays the IP information."""
-        raise NotImplementedError
+        self.console.print(self.render())
 
     def _make_info_table(self, fields):
         """
@@ -58,6 +50,8 @@ class Display:
         Returns:
             Table: A rich Table object.
         """
+        from rich.table import Table
+
         table = Table(box=None, show_header=False, padding=(0, 1))
         table.add_column(style=self.style.get("field_name", "cyan"))
         table.add_column(style=self.style.get("field_value", "white"))
@@ -70,7 +64,11 @@ class Display:
 class SleekDisplay(Display):
     """Displays the IP information in a sleek table."""
 
-    def display(self):
+    def render(self):
+        from rich.box import ROUNDED
+        from rich.panel import Panel
+        from rich.table import Table
+
         table = Table(box=ROUNDED, show_header=True, header_style=self.style.get("header", "bold white on blue"))
         table.add_column("Field", style=self.style.get("field_name", "cyan"), no_wrap=True)
         table.add_column("Value", style=self.style.get("field_value", "white"))
@@ -80,52 +78,56 @@ class SleekDisplay(Display):
                 table.add_row(field.capitalize(), str(self.data[field]))
         
         panel_title = f"Information for [bold]{self.data.get('display_ip', 'N/A')}[/bold]"
-        self.console.print(
-            Panel(
-                table,
-                title=panel_title,
-                border_style=self.style.get("panel_border", "blue"),
-                expand=False
-            )
+        return Panel(
+            table,
+            title=panel_title,
+            border_style=self.style.get("panel_border", "blue"),
+            expand=False
         )
 
 class DashboardDisplay(Display):
     """Displays the IP information in a dashboard."""
 
-    def display(self):
-        self.console.print(Panel(f"[bold]Information for {self.data.get('display_ip', 'N/A')}[/bold]", expand=False, border_style=self.style.get("panel_border", "blue")))
+    def render(self):
+        from rich.columns import Columns
+        from rich.console import Group
+        from rich.panel import Panel
+
+        header = Panel(f"[bold]Information for {self.data.get('display_ip', 'N/A')}[/bold]", expand=False, border_style=self.style.get("panel_border", "blue"))
 
         panels = []
         
-        processed_fields = set()
-        for cat_name, cat_fields in CATEGORIES.items():
-            fields_in_cat = [f for f in cat_fields if f in self.current_fields]
+        categories, other_fields = self.plan.groups(self.current_fields)
+        for cat_name, fields_in_cat in categories:
             table = self._make_info_table(fields_in_cat)
             if table.row_count > 0:
                 panels.append(Panel(table, title=f"[bold]{cat_name}[/bold]", border_style=self.style.get("panel_border", "blue"), expand=True))
-                processed_fields.update(fields_in_cat)
 
-        other_fields = [f for f in self.current_fields if f not in processed_fields and f not in ['query', 'status']]
         if other_fields:
             other_table = self._make_info_table(other_fields)
             if other_table.row_count > 0:
                 panels.append(Panel(other_table, title="[bold]Other[/bold]", border_style=self.style.get("panel_border", "blue"), expand=True))
         
         if panels:
-            self.console.print(Columns(panels, expand=True))
+            return Group(header, Columns(panels, expand=True))
+        return header
     
 
 class JsonDisplay(Display):
     """Displays the IP information in JSON format."""
 
-    def display(self):
+    def render(self):
+        from rich.json import JSON
+
         output_data = {field: self.data[field] for field in self.current_fields if field in self.data}
-        self.console.print(JSON.from_data(output_data))
+        return JSON.from_data(output_data)
 
 class CompactDisplay(Display):
     """Displays the IP information in a compact format."""
 
-    def display(self):
+    def render(self):
+        from rich.text import Text
+
         text = Text()
         query = self.data.get('display_ip', 'N/A')
         text.append(f"IP: {query}", style="bold")
@@ -136,21 +138,24 @@ class CompactDisplay(Display):
                 text.append(f"{field.capitalize()}: ", style=self.style.get('field_name', 'cyan'))
                 text.append(str(self.data[field]), style=self.style.get('field_value', 'white'))
                 
-        self.console.print(text)
+        return text
 
 class GridDisplay(Display):
     """Displays the IP information in a grid."""
 
-    def display(self):
+    def render(self):
+        from rich.box import ROUNDED
+        from rich.table import Table
+
         table = Table(box=ROUNDED, show_header=True, header_style=self.style.get("header", "bold white on blue"), title=f"Information for [bold]{self.data.get('display_ip', 'N/A')}[/bold]")
         table.add_column("Category", style="bold", no_wrap=True)
         table.add_column("Field", style=self.style.get("field_name", "cyan"))
         table.add_column("Value", style=self.style.get("field_value", "white"))
         
-        processed_fields = set()
+        categories, other_fields = self.plan.groups(self.current_fields)
         
-        for cat_name, cat_fields in CATEGORIES.items():
-            fields_to_show_in_cat = [f for f in cat_fields if f in self.current_fields and f in self.data]
+        for cat_name, cat_fields in categories:
+            fields_to_show_in_cat = [f for f in cat_fields if f in self.data]
             if not fields_to_show_in_cat:
                 continue
             
@@ -159,9 +164,8 @@ class GridDisplay(Display):
                 category_cell = f"[{self.style.get('panel_border', 'blue')}]{cat_name}[/]" if first_in_cat else ""
                 table.add_row(category_cell, field.capitalize(), str(self.data[field]))
                 first_in_cat = False
-                processed_fields.add(field)
 
-        other_fields = [f for f in self.current_fields if f not in processed_fields and f not in ['query', 'status'] and f in self.data]
+        other_fields = [f for f in other_fields if f in self.data]
         if other_fields:
             first_in_cat = True
             for field in other_fields:
@@ -169,29 +173,30 @@ class GridDisplay(Display):
                 table.add_row(category_cell, field.capitalize(), str(self.data[field]))
                 first_in_cat = False
                 
-        self.console.print(table)
+        return table
 
 class MarkdownDisplay(Display):
     """Displays the IP information in Markdown format."""
 
-    def display(self):
+    def render(self):
+        from rich.markdown import Markdown
+
         markdown_string = self.generate_markdown_string()
-        self.console.print(Markdown(markdown_string))
+        return Markdown(markdown_string)
 
     def generate_markdown_string(self):
         markdown_string = f"# IP Information for {self.data.get('display_ip', 'N/A')}\n\n"
-        processed_fields = set()
+        categories, other_fields = self.plan.groups(self.current_fields)
 
-        for cat_name, cat_fields in CATEGORIES.items():
-            fields_in_cat = [f for f in cat_fields if f in self.current_fields and f in self.data]
+        for cat_name, cat_fields in categories:
+            fields_in_cat = [f for f in cat_fields if f in self.data]
             if fields_in_cat:
                 markdown_string += f"## {cat_name}\n"
                 for field in fields_in_cat:
                     markdown_string += f"- **{field.capitalize()}**: {self.data[field]}\n"
                 markdown_string += "\n"
-                processed_fields.update(fields_in_cat)
 
-        other_fields = [f for f in self.current_fields if f not in processed_fields and f not in ['query', 'status'] and f in self.data]
+        other_fields = [f for f in other_fields if f in self.data]
         if other_fields:
             markdown_string += "## Other\n"
             for field in other_fields:
@@ -203,23 +208,29 @@ class MarkdownDisplay(Display):
 class MinimalDisplay(Display):
     """Displays the IP information in a minimal format."""
 
-    def display(self):
-        self.console.print(f"--- IP Information for [bold]{self.data.get('display_ip', 'N/A')}[/bold] ---")
+    def render(self):
+        from rich.console import Group
+
+        # render_str applies markup and highlighting the same way console.print does for a string.
+        lines = [self.console.render_str(f"--- IP Information for [bold]{self.data.get('display_ip', 'N/A')}[/bold] ---")]
 
         for field in self.current_fields:
             if field in self.data:
-                self.console.print(f"[{self.style.get('field_name', 'cyan')}]{field.capitalize()}:[/] [{self.style.get('field_value', 'white')}]{self.data[field]}[/]")
+                lines.append(self.console.render_str(f"[{self.style.get('field_name', 'cyan')}]{field.capitalize()}:[/] [{self.style.get('field_value', 'white')}]{self.data[field]}[/]"))
+        return Group(*lines)
 
 class TreeDisplay(Display):
     """Displays the IP information in a tree."""
 
-    def display(self):
+    def render(self):
+        from rich.tree import Tree
+
         tree = Tree(
             f"IP Information for [bold]{self.data.get('display_ip', 'N/A')}[/bold]",
             guide_style=self.style.get("panel_border", "blue")
         )
 
-        field_to_category = {field: cat for cat, fields in CATEGORIES.items() for field in fields}
+        field_to_category = self.plan.field_to_category
 
         grouped_fields = {}
         other_fields = []
@@ -247,31 +258,171 @@ class TreeDisplay(Display):
             for field in other_fields:
                 branch.add(f"[{self.style.get('field_name', 'cyan')}]{field.capitalize()}:[/] [{self.style.get('field_value', 'white')}]{self.data[field]}[/]")
 
-        self.console.print(tree)
+        return tree
+
+
+class RecordStream:
+    """Displays a sequence of results one record at a time with a per-record theme."""
+
+    def __init__(self, display_manager, config, fields_to_show):
+        """
+        Initializes the RecordStream class.
+
+        Args:
+            display_manager (DisplayManager): The display manager that renders each record.
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+        """
+        self.display_manager = display_manager
+        self.config = config
+        # Resolved once here instead of again for every record.
+        self.plan = ProjectionPlan.of(config, fields_to_show)
+        self.count = 0
+        # The last record, redrawn while its deferred fields are on their way.
+        self._live = None
+        self._live_data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _separate(self):
+        """Prints a blank line between records."""
+        if self.count > 0:
+            self.display_manager.console.print()
+        self.count += 1
+
+    def _settle(self):
+        """Stops redrawing the last record, leaving it on screen as it is."""
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+            self._live_data = None
+            if not self.display_manager.console.is_terminal:
+                # Live leaves the final render without a line break when it isn't a terminal.
+                self.display_manager.console.line()
+
+    def _render(self, data):
+        """Returns the renderable of a record with the configured theme."""
+        theme = self.config.get("theme", BASE_DEFAULT_CONFIG["theme"])
+        return self.display_manager.get_display(theme, self.config, data, self.plan).render()
+
+    def add(self, data):
+        """
+        Displays the next record.
+
+        Deferred fields that are still missing are shown as pending, and the record is redrawn
+        when update() brings them, as long as no other record has been shown since.
+
+        Args:
+            data (dict): The IP information dictionary.
+        """
+        self._settle()
+        self._separate()
+        pending = [f for f in self.plan.deferred_fields if f not in data] if data.get("status") == "success" else []
+        if not pending:
+            self.display_manager.display(data, self.config, self.plan)
+            return
+
+        from rich.live import Live
+
+        self._live_data = data
+        self._live = Live(self._render(dict(data, **{f: PENDING_VALUE for f in pending})),
+                          console=self.display_manager.console, auto_refresh=False)
+        self._live.start(refresh=True)
+
+    def update(self, ip_address, patch):
+        """
+        Shows deferred fields that arrived after their record.
+
+        Args:
+            ip_address (str): The 'display_ip' of the record.
+            patch (dict): The deferred fields; empty if they could not be fetched.
+        """
+        if self._live is not None and self._live_data.get("display_ip") == ip_address:
+            self._live.update(self._render(dict(self._live_data, **patch)), refresh=True)
+            self._settle()
+            return
+        # The record has been printed for good; add the values below it.
+        style = self.config.get("style", BASE_DEFAULT_CONFIG["style"])
+        for field, value in patch.items():
+            self.display_manager.console.print(f"[{style.get('field_name', 'cyan')}]{field.capitalize()} for {ip_address}:[/] [{style.get('field_value', 'white')}]{value}[/]")
+
+    def add_error(self, ip_address, error):
+        """
+        Displays a lookup that failed with an exception.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            error (Exception): The exception raised by the lookup.
+        """
+        self._settle()
+        self._separate()
+        self.display_manager.display_error(error)
+
+    def close(self):
+        """Finishes the output."""
+        self._settle()
 
 
 class DisplayManager:
     """Manages the display of IP information."""
 
-    def __init__(self, console):
+    def __init__(self, console, plain=False):
         """
         Initializes the DisplayManager class.
 
         Args:
             console (Console): The rich console object.
+            plain (bool, optional): Write results as plain text straight to the console's file instead
+                                    of rendering them with rich. Defaults to False.
         """
         self.console = console
+        self.plain = plain
+        # Themes are referenced as "module.ClassName" and only imported when chosen.
         self._displays = {
-            "sleek": SleekDisplay,
-            "dashboard": DashboardDisplay,
-            "tree": TreeDisplay,
-            "minimal": MinimalDisplay,
-            "json": JsonDisplay,
-            "grid": GridDisplay,
-            "markdown": MarkdownDisplay,
-            "compact": CompactDisplay
+            "sleek": "display.SleekDisplay",
+            "dashboard": "display.DashboardDisplay",
+            "tree": "display.TreeDisplay",
+            "minimal": "display.MinimalDisplay",
+            "json": "display.JsonDisplay",
+            "grid": "display.GridDisplay",
+            "markdown": "display.MarkdownDisplay",
+            "compact": "display.CompactDisplay",
+            "table": "live_display.LiveTableDisplay",
+            "report": "aggregate.ReportDisplay"
+        }
+        # The plain counterpart of each theme; themes built from boxes share a plain layout.
+        self._plain_displays = {
+            "sleek": "plain_display.PlainMinimalDisplay",
+            "dashboard": "plain_display.PlainGroupedDisplay",
+            "tree": "plain_display.PlainGroupedDisplay",
+            "minimal": "plain_display.PlainMinimalDisplay",
+            "json": "plain_display.PlainJsonDisplay",
+            "grid": "plain_display.PlainGroupedDisplay",
+            "markdown": "plain_display.PlainMarkdownDisplay",
+            "compact": "plain_display.PlainCompactDisplay",
+            "table": "plain_display.PlainTableDisplay",
+            "report": "plain_display.PlainReportDisplay"
         }
 
+    def get_display_class(self, theme_name):
+        """
+        Imports and returns the display class for the given theme name.
+
+        Args:
+            theme_name (str): The name of the theme to use.
+
+        Returns:
+            type: The display class, falling back to SleekDisplay for unknown themes. In plain mode, the
+                  theme's plain counterpart.
+        """
+        displays = self._plain_displays if self.plain else self._displays
+        module_name, class_name = displays.get(theme_name, displays["sleek"]).rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), class_name)
+
     def get_display(self, theme_name, config, data, fields_to_show):
         """
         Returns a display object for the given theme name.
@@ -280,14 +431,52 @@ class DisplayManager:
             theme_name (str): The name of the theme to use.
             config (dict): The configuration dictionary.
             data (dict): The IP information dictionary.
-            fields_to_show (list): A list of fields to show in the output.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
 
         Returns:
             Display: A display object.
         """
-        display_class = self._displays.get(theme_name, SleekDisplay)
+        display_class = self.get_display_class(theme_name)
         return display_class(self.console, config, data, fields_to_show)
 
+    def open_stream(self, config, fields_to_show):
+        """
+        Returns a stream that displays many results with the configured theme.
+
+        Multi-record themes render all results together; other themes render one record at a time.
+        In plain mode, the theme's plain counterpart writes to the console's file without rich.
+
+        Args:
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+
+        Returns:
+            RecordStream, a multi-record display or a plain display: An object with add(), add_error(), update() and close().
+        """
+        theme = config.get("theme", BASE_DEFAULT_CONFIG["theme"])
+        display_class = self.get_display_class(theme)
+        if self.plain:
+            return display_class(self.console.file, config, fields_to_show)
+        if getattr(display_class, "multi_record", False):
+            return display_class(self.console, config, fields_to_show)
+        return RecordStream(self, config, fields_to_show)
+
+    def display_error(self, error):
+        """
+        Displays an error panel for a lookup that raised an exception.
+
+        Args:
+            error (Exception): The exception raised by the lookup.
+        """
+        from rich.panel import Panel
+
+        # Errors that don't come from requests (e.g. from the daemon) shouldn't pull it in.
+        requests = sys.modules.get("requests")
+        if requests is not None and isinstance(error, requests.exceptions.Timeout):
+            self.console.print(Panel("The API did not respond in time.", title="[bold red]Request Timed Out[/bold red]", border_style="red"))
+        else:
+            self.console.print(Panel(f"Error: {error}", title="[bold red]Request Failed[/bold red]", border_style="red"))
+
     def display(self, data, config, fields_to_show):
         """
         Displays the IP information.
@@ -295,14 +484,24 @@ class DisplayManager:
         Args:
             data (dict): The IP information dictionary.
             config (dict): The configuration dictionary.
-            fields_to_show (list): A list of fields to show in the output.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
         """
+        if self.plain:
+            with self.open_stream(config, fields_to_show) as stream:
+                stream.add(data)
+            return
         if data.get("status") == "fail":
+            from rich.panel import Panel
+
             style = config.get("style", BASE_DEFAULT_CONFIG["style"])
             error_message = data.get("message", "Unknown error")
             self.console.print(Panel(f"Error: {error_message}", title="[bold red]Request Failed[/bold red]", border_style=style.get("error", "red")))
             return
 
         theme = config.get("theme", BASE_DEFAULT_CONFIG["theme"])
+        if getattr(self.get_display_class(theme), "multi_record", False):
+            with self.open_stream(config, fields_to_show) as stream:
+                stream.add(data)
+            return
         display = self.get_display(theme, config, data, fields_to_show)
         display.display()
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+import csv
+from itertools import chain, islice
+import os
+
+# Rows read, looked up and written at a time. Only one chunk is held in memory, so files of any size can
+# be enriched; each distinct address of a chunk is looked up once.
+DEFAULT_CHUNK_ROWS = 10000
+# Results kept from earlier chunks, so addresses that recur across the file are only looked up again once
+# they have not been seen for a while. Bounds memory like the chunk size does.
+DEFAULT_MEMO_ENTRIES = 100000
+DELIMITERS = {".csv": ",", ".tsv": "\t", ".tab": "\t"}
+
+def delimiter_for(filename, first_line=""):
+    """
+    Chooses the delimiter of a delimited file.
+
+    Args:
+        filename (str): The name of the file; '.csv', '.tsv' and '.tab' decide the delimiter.
+        first_line (str, optional): The first line of the file, sniffed for other names. Defaults to "".
+
+    Returns:
+        str: The delimiter, ',' if it can't be told.
+    """
+    delimiter = DELIMITERS.get(os.path.splitext(filename)[1].lower())
+    if delimiter is not None:
+        return delimiter
+    try:
+        return csv.Sniffer().sniff(first_line, delimiters=",\t;|").delimiter
+    except csv.Error:
+        return ","
+
+def resolve_column(column, header):
+    """
+    Finds the column that holds the addresses.
+
+    Args:
+        column (str): The column's name in the header, or its number (1 is the first).
+        header (list): The header row, or None if the file has none.
+
+    Returns:
+        int: The index of the column.
+
+    Raises:
+        ValueError: If there is no such column.
+    """
+    if header is not None and column in header:
+        return header.index(column)
+    if column.isdigit() and int(column) >= 1:
+        return int(column) - 1
+    if header is None:
+        raise ValueError(f"'{column}' is not a column number, and the file has no header")
+    raise ValueError(f"There is no column '{column}'. Columns are: {', '.join(header)}")
+
+def open_rows(stream, filename, delimiter=None):
+    """
+    Reads the rows of a delimited file.
+
+    Args:
+        stream (file): The file, opened with newline="".
+        filename (str): The name of the file, for choosing the delimiter.
+        delimiter (str, optional): The delimiter; chosen from the name or the first line by default.
+
+    Returns:
+        tuple: (delimiter, rows), where rows is a csv reader over the whole file.
+    """
+    first_line = stream.readline()
+    if delimiter is None:
+        delimiter = delimiter_for(filename, first_line)
+    # The first line was only peeked at, so it is put back in front of the rest.
+    return delimiter, csv.reader(chain([first_line], stream), delimiter=delimiter)
+
+class Enricher:
+    """Appends lookup results to the rows of a delimited file, one chunk of rows at a time."""
+
+    def __init__(self, lookup, column, fields, chunk_rows=DEFAULT_CHUNK_ROWS, memo_entries=DEFAULT_MEMO_ENTRIES):
+        """
+        Initializes the Enricher class.
+
+        Args:
+            lookup (callable): Called with the distinct addresses of a chunk; returns (ip_address, data, error)
+                               tuples, as Provider.iter_ip_infos does.
+            column (int): The index of the column that holds the addresses.
+            fields (list): The fields to append to each row, in order.
+            chunk_rows (int, optional): The number of rows per chunk. Defaults to DEFAULT_CHUNK_ROWS.
+            memo_entries (int, optional): The number of recent results kept across chunks. Defaults to DEFAULT_MEMO_ENTRIES.
+        """
+        self.lookup = lookup
+        self.column = column
+        self.fields = list(fields)
+        self.chunk_rows = chunk_rows
+        self.memo_entries = memo_entries
+        # The cells of recently looked up addresses, least recently used first; None for addresses ip-api rejected.
+        self._memo = OrderedDict()
+        self.rows = 0
+        self.lookups = 0
+        self.failed = 0
+
+    def enrich(self, rows):
+        """
+        Appends the fields of each row's address to the row.
+
+        Rows keep their order. Rows without an address, and rows whose lookup failed, get empty cells.
+
+        Args:
+            rows (iterable): The rows, as lists of cells, without the header.
+
+        Yields:
+            list: Each row with one cell per field appended.
+        """
+        blank = [""] * len(self.fields)
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_rows))
+            if not chunk:
+                return
+            addresses = [self._address(row) for row in chunk]
+            values = self._look_up(dict.fromkeys(ip for ip in addresses if ip))
+            for row, ip in zip(chunk, addresses):
+                yield row + values.get(ip, blank)
+            self.rows += len(chunk)
+
+    def _address(self, row):
+        """Returns the address in a row, or '' if the row has none."""
+        return row[self.column].strip() if self.column < len(row) else ""
+
+    def _look_up(self, addresses):
+        """Looks up the distinct addresses of a chunk that aren't memoized and returns the cells to append for each."""
+        values = {}
+        missing = []
+        for ip in addresses:
+            if ip in self._memo:
+                self._memo.move_to_end(ip)
+                values[ip] = self._memo[ip]
+            else:
+                missing.append(ip)
+
+        for ip, data, error in (self.lookup(missing) if missing else ()):
+            self.lookups += 1
+            if error is not None:
+                # Errors such as timeouts may pass, so the address is looked up again when it recurs.
+                self.failed += 1
+                continue
+            cells = None
+            if data is None or data.get("status") != "success":
+                self.failed += 1
+            else:
+                cells = [data.get(field, "") for field in self.fields]
+            values[ip] = self._memo[ip] = cells
+        while len(self._memo) > self.memo_entries:
+            self._memo.popitem(last=False)
+        # Failed lookups get the empty cells of rows without an address.
+        return {ip: cells for ip, cells in values.items() if cells is not None}
+
+    def header(self, header):
+        """
+        Returns the header row of the output.
+
+        Args:
+            header (list): The header row of the input.
+
+        Returns:
+            list: The header with the names of the appended fields.
+        """
+        return header + self.fields
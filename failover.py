@@ -0,0 +1,196 @@
+from collections import deque
+import math
+import threading
+import time
+
+from config import BASE_DEFAULT_CONFIG
+from ratelimit import RateLimiter
+
+class LatencyWindow:
+    """Remembers the most recent response times of an endpoint."""
+
+    def __init__(self, size=200, min_samples=20):
+        """
+        Initializes the LatencyWindow class.
+
+        Args:
+            size (int, optional): How many recent samples to keep. Defaults to 200.
+            min_samples (int, optional): How many samples are needed before percentiles are reported. Defaults to 20.
+        """
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        """Records a response time in seconds."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        """
+        Returns a percentile of the recent response times.
+
+        Args:
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The response time in seconds, or None while there are too few samples.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        rank = max(1, math.ceil(percent / 100 * len(samples)))
+        return samples[rank - 1]
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint for a while after repeated failures."""
+
+    def __init__(self, failures=5, cooldown=30, clock=time.monotonic):
+        """
+        Initializes the CircuitBreaker class.
+
+        Args:
+            failures (int, optional): Consecutive failures that open the circuit. Defaults to 5.
+            cooldown (float, optional): Seconds before a trial request is let through again. Defaults to 30.
+            clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        """
+        self.failures = failures
+        self.cooldown = cooldown
+        self.clock = clock
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Returns 'closed', 'open' or 'half-open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self.clock() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """
+        Checks whether a request may be sent.
+
+        Once the cooldown has passed, a single trial request is let through; its
+        outcome closes the circuit again or restarts the cooldown.
+
+        Returns:
+            bool: True if the request may be sent.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.clock() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Counts a failure, opening the circuit once there are too many in a row."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_flight or self._consecutive_failures >= self.failures:
+                self._opened_at = self.clock()
+            self._trial_in_flight = False
+
+class Endpoint:
+    """An ip-api compatible lookup service, with its own rate limits, latency history and circuit breaker."""
+
+    def __init__(self, name, base_url, batch_url=None, params=None, field_map=None, timeout=6,
+                 breaker_failures=5, breaker_cooldown=30, adapter=None, numeric_fields=None):
+        """
+        Initializes the Endpoint class.
+
+        Args:
+            name (str): A name for messages, e.g. "ip-api".
+            base_url (str): The single lookup URL; the IP address is appended to it.
+            batch_url (str, optional): The batch lookup URL, if the service has one. Defaults to None.
+            params (dict, optional): Extra query parameters, e.g. an API key. Defaults to None.
+            field_map (dict, optional): Maps the service's field names to ip-api's. Defaults to None.
+            timeout (float, optional): The request timeout in seconds. Defaults to 6.
+            breaker_failures (int, optional): Consecutive failures that take the endpoint out of rotation. Defaults to 5.
+            breaker_cooldown (float, optional): Seconds the endpoint stays out of rotation. Defaults to 30.
+            adapter (callable, optional): Turns a raw record into an ip-api style record; runs after field_map. Defaults to None.
+            numeric_fields (bool, optional): The service understands ip-api's numeric 'fields' bitmask.
+                Defaults to True unless field_map or adapter is given.
+        """
+        self.name = name
+        self.base_url = base_url
+        self.batch_url = batch_url
+        self.params = params or {}
+        self.field_map = field_map or {}
+        self.timeout = timeout
+        self.adapter = adapter
+        self.numeric_fields = numeric_fields if numeric_fields is not None else not field_map and adapter is None
+        self.rate_limiter = RateLimiter()
+        self.batch_rate_limiter = RateLimiter()
+        self.latency = LatencyWindow()
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+
+    def __repr__(self):
+        return f"Endpoint({self.name!r}, {self.base_url!r})"
+
+    def adapt(self, record):
+        """
+        Maps a record from this endpoint onto ip-api's field names.
+
+        Args:
+            record (dict): The raw record.
+
+        Returns:
+            dict: The record with ip-api field names and a 'status' field.
+        """
+        if self.field_map:
+            record = {self.field_map.get(k, k): v for k, v in record.items()}
+        if self.adapter is not None:
+            record = self.adapter(record)
+        if "status" not in record:
+            record["status"] = "success"
+        return record
+
+def endpoints_from_config(config, base_url, batch_url):
+    """
+    Builds the endpoints described in the configuration.
+
+    Args:
+        config (dict): The configuration dictionary. Its 'endpoints' list holds objects with 'url' and
+                       optionally 'name', 'batch_url', 'params', 'field_map', 'timeout' and 'numeric_fields'.
+        base_url (str): The single lookup URL used when no endpoints are configured.
+        batch_url (str): The batch lookup URL used when no endpoints are configured.
+
+    Returns:
+        list: The endpoints in order of preference.
+    """
+    failures = config.get("circuit_breaker_failures", BASE_DEFAULT_CONFIG["circuit_breaker_failures"])
+    cooldown = config.get("circuit_breaker_cooldown", BASE_DEFAULT_CONFIG["circuit_breaker_cooldown"])
+    endpoints = []
+    for index, options in enumerate(config.get("endpoints") or []):
+        if not isinstance(options, dict) or not options.get("url"):
+            raise ValueError(f"endpoint #{index + 1} needs a 'url'")
+        endpoints.append(Endpoint(
+            options.get("name", options["url"]),
+            options["url"],
+            batch_url=options.get("batch_url"),
+            params=options.get("params"),
+            field_map=options.get("field_map"),
+            timeout=options.get("timeout", 6),
+            numeric_fields=options.get("numeric_fields"),
+            breaker_failures=failures,
+            breaker_cooldown=cooldown
+        ))
+    if not endpoints:
+        endpoints.append(Endpoint("ip-api", base_url, batch_url, breaker_failures=failures, breaker_cooldown=cooldown))
+    return endpoints
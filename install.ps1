@@ -156,7 +156,7 @@ if ($LASTEXITCODE -ne 0) {
 }
 Write-Host $LANG.DEPS_INSTALLED
 
-Copy-Item -Path @("main.py", "api.py", "config.py", "display.py") -Destination $appDir
+Copy-Item -Path @("main.py", "aggregate.py", "api.py", "cache.py", "classify.py", "config.py", "daemon.py", "deferred.py", "display.py", "enrich.py", "failover.py", "live_display.py", "local_db.py", "plain_display.py", "projection.py", "quota.py", "ratelimit.py", "records.py", "scan.py", "spatial.py", "timings.py", "writers.py") -Destination $appDir
 
 $scriptsDir = Join-Path $env:LOCALAPPDATA "Scripts"
 New-Item -ItemType Directory -Force $scriptsDir | Out-Null
@@ -175,7 +175,7 @@ if [ $? -ne 0 ]; then
 fi
 echo -e " ${C_GREEN}✓${C_RESET}"
 
-cp main.py api.py config.py display.py "$APP_DIR/"
+cp main.py aggregate.py api.py cache.py classify.py config.py daemon.py deferred.py display.py enrich.py failover.py live_display.py local_db.py plain_display.py projection.py quota.py ratelimit.py records.py scan.py spatial.py timings.py writers.py "$APP_DIR/"
 
 INSTALL_DIR="$HOME/.local/bin"
 mkdir -p "$INSTALL_DIR"
@@ -0,0 +1,167 @@
+from config import BASE_DEFAULT_CONFIG
+from projection import PENDING_VALUE, ProjectionPlan
+
+class LiveTableDisplay:
+    """Displays many results as rows of one table that grows while lookups complete."""
+
+    # Tells DisplayManager that this theme renders a whole stream of records.
+    multi_record = True
+
+    # Cells are cut to this width once the table switches to plain rows.
+    MAX_PLAIN_WIDTH = 40
+
+    def __init__(self, console, config, fields_to_show):
+        """
+        Initializes the LiveTableDisplay class.
+
+        Args:
+            console (Console): The rich console object.
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+        """
+        self.console = console
+        self.config = config
+        self.style = config.get("style", BASE_DEFAULT_CONFIG["style"])
+        plan = ProjectionPlan.of(config, fields_to_show)
+        self.fields = [f for f in plan.table_fields if f != "query"]
+        self.deferred_fields = [f for f in plan.deferred_fields if f in self.fields]
+        self.max_live_rows = config.get("live_table_max_rows", BASE_DEFAULT_CONFIG["live_table_max_rows"])
+        self.headers = ["IP"] + [field.capitalize() for field in self.fields]
+        self.widths = [len(header) for header in self.headers]
+        self.row_count = 0
+        self._table = None
+        self._live = None
+        self._plain = False
+        # The cells and style of each row of the live table, and the rows still waiting for deferred fields by IP.
+        self._rows = []
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _new_table(self):
+        """Returns an empty table with the header row."""
+        from rich.box import ROUNDED
+        from rich.table import Table
+
+        table = Table(box=ROUNDED, show_header=True, header_style=self.style.get("header", "bold white on blue"))
+        table.add_column(self.headers[0], style="bold", no_wrap=True)
+        for header in self.headers[1:]:
+            table.add_column(header, style=self.style.get("field_value", "white"))
+        return table
+
+    def _start(self):
+        """Creates the table and starts rendering it live."""
+        from rich.live import Live
+
+        self._table = self._new_table()
+        self._live = Live(self._table, console=self.console, refresh_per_second=8)
+        self._live.start()
+
+    def _switch_to_plain(self):
+        """Stops the live table and continues with plain rows that are printed once."""
+        self._live.stop()
+        self._live = None
+        self._rows = []
+        self._pending = {}
+        if not self.console.is_terminal:
+            self.console.line()
+        self._plain = True
+        self.widths = [min(width, self.MAX_PLAIN_WIDTH) for width in self.widths]
+
+    def _add_row(self, cells, style=None, message=False):
+        """
+        Adds a row to the live table, or prints it as a plain line past the row threshold.
+
+        Args:
+            cells (list): The cell texts.
+            style (str, optional): The style of the row. Defaults to None.
+            message (bool, optional): The second cell is a message that may span the other columns. Defaults to False.
+        """
+        if self._live is None and not self._plain:
+            self._start()
+        if self._live is not None and self.row_count >= self.max_live_rows:
+            self._switch_to_plain()
+
+        self.row_count += 1
+        if self._plain:
+            # Lined up with the columns of the table printed above it.
+            if message:
+                self.console.out(f"│ {cells[0][:self.widths[0]].ljust(self.widths[0])} │ {cells[1]}", style=style, highlight=False)
+                return
+            line = " │ ".join(cell[:width].ljust(width) for cell, width in zip(cells, self.widths))
+            self.console.out(f"│ {line} │", style=style, highlight=False)
+            return
+
+        self.widths = [max(width, len(cell)) for width, cell in zip(self.widths, cells)]
+        self._rows.append((cells, style))
+        self._table.add_row(*cells, style=style)
+
+    def add(self, data):
+        """
+        Adds a result as a row.
+
+        Args:
+            data (dict): The IP information dictionary.
+        """
+        ip_address = str(data.get("display_ip", "N/A"))
+        if data.get("status") == "fail":
+            self.add_error(ip_address, data.get("message", "Unknown error"))
+            return
+        pending = [f for f in self.deferred_fields if f not in data]
+        self._add_row([ip_address] + [PENDING_VALUE if field in pending else str(data.get(field, "")) for field in self.fields])
+        if pending and not self._plain:
+            self._pending.setdefault(ip_address, []).append(len(self._rows) - 1)
+
+    def update(self, ip_address, patch):
+        """
+        Fills in deferred fields that arrived after their row was added.
+
+        Rows still in the live table are redrawn; rows already printed as plain lines get a line below them.
+
+        Args:
+            ip_address (str): The 'display_ip' of the record.
+            patch (dict): The deferred fields; empty if they could not be fetched.
+        """
+        rows = self._pending.pop(ip_address, None)
+        if rows is None:
+            if patch and self.row_count:
+                text = ", ".join(f"{field.capitalize()}: {value}" for field, value in patch.items())
+                width = self.widths[0]
+                self.console.out(f"│ {ip_address[:width].ljust(width)} │ {text}", highlight=False)
+            return
+
+        for index in rows:
+            cells, style = self._rows[index]
+            for position, field in enumerate(self.fields, 1):
+                if field in self.deferred_fields:
+                    cells[position] = str(patch.get(field, ""))
+            self.widths = [max(width, len(cell)) for width, cell in zip(self.widths, cells)]
+        self._table = self._new_table()
+        for cells, style in self._rows:
+            self._table.add_row(*cells, style=style)
+        self._live.update(self._table, refresh=True)
+
+    def add_error(self, ip_address, error):
+        """
+        Adds a failed lookup as a row.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            error (Exception or str): The error of the lookup.
+        """
+        cells = [str(ip_address or "N/A"), f"Error: {error}"] + [""] * (len(self.fields) - 1)
+        self._add_row(cells[:len(self.headers)], style=self.style.get("error", "bold red"), message=True)
+
+    def close(self):
+        """Stops live rendering, leaving the final table on screen."""
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+            self._rows = []
+            self._pending = {}
+            if not self.console.is_terminal:
+                self.console.line()
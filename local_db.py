@@ -0,0 +1,164 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import csv
+import ipaddress
+
+from api import Provider
+from records import IPRecord
+
+_LOW_64_BITS = (1 << 64) - 1
+
+# Converters for the non-string fields of ip-api's response format.
+_FIELD_TYPES = {
+    "lat": float,
+    "lon": float,
+    "offset": int,
+    "mobile": lambda value: value.strip().lower() in ("1", "true", "yes"),
+    "proxy": lambda value: value.strip().lower() in ("1", "true", "yes"),
+    "hosting": lambda value: value.strip().lower() in ("1", "true", "yes"),
+}
+
+def _parse_address(value):
+    """Parses an IP address given either in text form or as an integer."""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.ip_address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+class _RangeIndex:
+    """A sorted index of IP ranges stored in compact integer arrays."""
+
+    def __init__(self, ranges, wide):
+        """
+        Initializes the _RangeIndex class.
+
+        Args:
+            ranges (list): (start, end, record_id) tuples with integer addresses.
+            wide (bool): Whether the addresses are 128-bit IPv6 addresses.
+        """
+        ranges.sort()
+        self.wide = wide
+        self.record_ids = array('I', (record_id for _, _, record_id in ranges))
+        if wide:
+            # 128-bit addresses are split into high and low 64-bit words.
+            self.start_high = array('Q', (start >> 64 for start, _, _ in ranges))
+            self.start_low = array('Q', (start & _LOW_64_BITS for start, _, _ in ranges))
+            self.end_high = array('Q', (end >> 64 for _, end, _ in ranges))
+            self.end_low = array('Q', (end & _LOW_64_BITS for _, end, _ in ranges))
+        else:
+            self.starts = array('Q', (start for start, _, _ in ranges))
+            self.ends = array('Q', (end for _, end, _ in ranges))
+
+    def __len__(self):
+        return len(self.record_ids)
+
+    def find(self, value):
+        """
+        Finds the range containing an address.
+
+        Args:
+            value (int): The address as an integer.
+
+        Returns:
+            int: The record id of the matching range, or None.
+        """
+        if self.wide:
+            high, low = value >> 64, value & _LOW_64_BITS
+            left = bisect_left(self.start_high, high)
+            right = bisect_right(self.start_high, high, left)
+            index = bisect_right(self.start_low, low, left, right) - 1
+            if index < 0 or (high, low) > (self.end_high[index], self.end_low[index]):
+                return None
+        else:
+            index = bisect_right(self.starts, value) - 1
+            if index < 0 or value > self.ends[index]:
+                return None
+        return self.record_ids[index]
+
+class LocalDBProvider(Provider):
+    """A provider that answers lookups offline from a local IP-range geolocation CSV file."""
+
+    def __init__(self, path):
+        """
+        Initializes the LocalDBProvider class.
+
+        The CSV file needs a header with 'start' and 'end' columns holding the first and last
+        address of each range (as text or integers), followed by columns named after ip-api's fields.
+
+        Args:
+            path (str): The path to the CSV file.
+        """
+        self.path = path
+        self.fields = []
+        self.records = []
+        self._load(path)
+
+    def _load(self, path):
+        """Reads the CSV file and builds the IPv4 and IPv6 range indexes."""
+        record_ids = {}
+        ranges = {4: [], 6: []}
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header or "start" not in header or "end" not in header:
+                raise ValueError(f"'{path}' needs a header with 'start' and 'end' columns.")
+            start_column, end_column = header.index("start"), header.index("end")
+            field_columns = [i for i, name in enumerate(header) if i not in (start_column, end_column)]
+            self.fields = [header[i] for i in field_columns]
+            converters = [_FIELD_TYPES.get(name, str) for name in self.fields]
+
+            for line_number, row in enumerate(reader, start=2):
+                if not row:
+                    continue
+                try:
+                    start, end = _parse_address(row[start_column]), _parse_address(row[end_column])
+                    values = tuple(
+                        convert(row[i]) if row[i] != "" else None
+                        for i, convert in zip(field_columns, converters)
+                    )
+                except (ValueError, IndexError) as e:
+                    raise ValueError(f"Invalid range on line {line_number} of '{path}': {e}") from e
+                if start.version != end.version or int(start) > int(end):
+                    raise ValueError(f"Invalid range on line {line_number} of '{path}'.")
+
+                # Identical field values are stored once and shared by all their ranges.
+                record_id = record_ids.get(values)
+                if record_id is None:
+                    record_id = record_ids[values] = len(self.records)
+                    self.records.append(values)
+                ranges[start.version].append((int(start), int(end), record_id))
+
+        self._indexes = {4: _RangeIndex(ranges[4], wide=False), 6: _RangeIndex(ranges[6], wide=True)}
+
+    def get_ip_info(self, ip_address, fields_to_request=None):
+        """
+        Gets IP information from the local database.
+
+        Args:
+            ip_address (str): The IP address to get information for.
+            fields_to_request (list, optional): A list of fields to return. Defaults to None (all fields).
+
+        Returns:
+            IPRecord: The IP information, using ip-api's field names.
+        """
+        if not ip_address:
+            return IPRecord({"status": "fail", "message": "the local provider needs an IP address", "query": "", "display_ip": "Unknown"})
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return IPRecord({"status": "fail", "message": "invalid query", "query": ip_address, "display_ip": ip_address})
+
+        record_id = self._indexes[address.version].find(int(address))
+        if record_id is None:
+            return IPRecord({"status": "fail", "message": "not found", "query": ip_address, "display_ip": ip_address})
+
+        wanted = set(fields_to_request) if fields_to_request else None
+        data = IPRecord(status="success")
+        for name, value in zip(self.fields, self.records[record_id]):
+            if value is not None and (wanted is None or name in wanted):
+                data[name] = value
+        if not fields_to_request or "query" in fields_to_request:
+            data["query"] = ip_address
+        data["display_ip"] = ip_address
+        return data
@@ -1,14 +1,22 @@
 import argparse
+import itertools
 import json
 import os
 import sys
-import requests
-from rich.console import Console
-from rich.panel import Panel
 
 from config import BASE_DEFAULT_CONFIG
 from display import DisplayManager
-from api import IPInfoProvider
+from aggregate import FLAG_FIELDS, SUMMARY_FIELDS
+from api import IPInfoProvider, PrefixCache
+from projection import ProjectionPlan
+from timings import Timings
+
+# Runs of at most this many addresses, shown on a terminal, get deferred fields in the background after the
+# others. Larger runs request them with the others, in the same batch requests.
+DEFER_MAX_ADDRESSES = 10
+
+# rich, requests, sqlite3 and the local database are imported where they are first needed,
+# so that --help and cached lookups start quickly.
 
 def get_config_dir():
     """Returns the path to the configuration directory depending on the OS."""
@@ -62,125 +70,906 @@ def load_config(config_path, console):
         console.print(f"[bold red]Error:[/bold red] Config file '[cyan]{config_path}[/cyan]' is corrupted or unreadable. Using default settings.", style="bold red")
         return BASE_DEFAULT_CONFIG
 
+def open_cache(config_dir, config, console):
+    """
+    Opens the lookup cache stored in the configuration directory.
+
+    Args:
+        config_dir (str): The path to the configuration directory.
+        config (dict): The configuration dictionary.
+        console (Console): The rich console object.
+
+    Returns:
+        LookupCache: The lookup cache, or None if it could not be opened.
+    """
+    import sqlite3
+    from cache import LookupCache
+
+    cache_path = os.path.join(config_dir, 'cache.sqlite3')
+    try:
+        os.makedirs(config_dir, exist_ok=True)
+        return LookupCache(
+            cache_path,
+            ttl=config.get("cache_ttl", BASE_DEFAULT_CONFIG["cache_ttl"]),
+            max_entries=config.get("cache_max_entries", BASE_DEFAULT_CONFIG["cache_max_entries"]),
+            negative_ttl=config.get("negative_cache_ttl", BASE_DEFAULT_CONFIG["negative_cache_ttl"])
+        )
+    except (sqlite3.Error, OSError):
+        console.print(f"[bold red]Warning:[/bold red] Could not open the lookup cache at '[cyan]{cache_path}[/cyan]'. Caching is disabled.", style="yellow")
+        return None
+
+def share_quota(endpoints, config_dir, console):
+    """
+    Makes the endpoints pace their requests with the quota ledger that all whatsip processes share.
+
+    Args:
+        endpoints (list): The endpoints of the provider.
+        config_dir (str): The path to the configuration directory.
+        console (Console): The rich console object.
+
+    Returns:
+        QuotaLedger: The ledger, to be closed with the provider, or None if it could not be opened.
+    """
+    from quota import QuotaLedger, SharedRateLimiter
+
+    ledger_path = os.path.join(config_dir, 'quota.json')
+    try:
+        ledger = QuotaLedger(ledger_path)
+    except OSError:
+        console.print(f"[bold red]Warning:[/bold red] Could not open the quota ledger at '[cyan]{ledger_path}[/cyan]'. Requests are paced for this process only.", style="yellow")
+        return None
+    for endpoint in endpoints:
+        # Quotas are counted per URL, so endpoints with the same URL share one.
+        endpoint.rate_limiter = SharedRateLimiter(ledger, endpoint.base_url)
+        if endpoint.batch_url:
+            endpoint.batch_rate_limiter = SharedRateLimiter(ledger, endpoint.batch_url)
+    return ledger
+
+def create_provider(args, config, config_dir, console):
+    """
+    Creates the IP information provider selected on the command line or in the config.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config (dict): The configuration dictionary.
+        config_dir (str): The path to the configuration directory.
+        console (Console): The rich console object.
+
+    Returns:
+        Provider: The provider, or None if it could not be created.
+    """
+    if getattr(args, "via_daemon", False):
+        from daemon import DaemonProvider
+
+        try:
+            return DaemonProvider(args.daemon_address or config.get("daemon_address", BASE_DEFAULT_CONFIG["daemon_address"]))
+        except ValueError as e:
+            console.print(f"[bold red]Error:[/bold red] Invalid daemon address. {e}", style="bold red")
+            return None
+
+    provider_name = args.provider or config.get("provider", BASE_DEFAULT_CONFIG["provider"])
+    if provider_name == "local":
+        db_path = args.db or config.get("local_db", BASE_DEFAULT_CONFIG["local_db"])
+        if not db_path:
+            console.print("[bold red]Error:[/bold red] The local provider needs a database file. Use --db or set 'local_db' in the config.", style="bold red")
+            return None
+        from local_db import LocalDBProvider
+
+        try:
+            return LocalDBProvider(db_path)
+        except (IOError, ValueError) as e:
+            console.print(f"[bold red]Error:[/bold red] Could not load the local database '{db_path}'. {e}", style="bold red")
+            return None
+
+    from failover import endpoints_from_config
+
+    try:
+        endpoints = endpoints_from_config(config, "http://ip-api.com/json/", "http://ip-api.com/batch")
+    except ValueError as e:
+        console.print(f"[bold red]Error:[/bold red] Invalid 'endpoints' in the config. {e}", style="bold red")
+        return None
+
+    quota_ledger = None
+    if config.get("shared_quota", BASE_DEFAULT_CONFIG["shared_quota"]):
+        quota_ledger = share_quota(endpoints, config_dir, console)
+
+    cache = None if args.no_cache else open_cache(config_dir, config, console)
+    prefix_cache = None
+    if config.get("prefix_reuse", BASE_DEFAULT_CONFIG["prefix_reuse"]):
+        prefix_cache = PrefixCache(
+            ipv4_prefix=config.get("prefix_length_ipv4", BASE_DEFAULT_CONFIG["prefix_length_ipv4"]),
+            ipv6_prefix=config.get("prefix_length_ipv6", BASE_DEFAULT_CONFIG["prefix_length_ipv6"])
+        )
+    return IPInfoProvider(
+        cache=cache,
+        prefix_cache=prefix_cache,
+        refresh=args.refresh,
+        pool_size=max(args.workers, config.get("http_pool_size", BASE_DEFAULT_CONFIG["http_pool_size"])),
+        retries=config.get("http_retries", BASE_DEFAULT_CONFIG["http_retries"]),
+        backoff_factor=config.get("http_backoff_factor", BASE_DEFAULT_CONFIG["http_backoff_factor"]),
+        endpoints=endpoints,
+        hedge_percentile=config.get("hedge_percentile", BASE_DEFAULT_CONFIG["hedge_percentile"]),
+        local_classification=config.get("local_classification", BASE_DEFAULT_CONFIG["local_classification"]),
+        quota_ledger=quota_ledger
+    )
+
+def read_ips(stream):
+    """
+    Lazily reads IP addresses from a file object, one per line.
+
+    Blank lines and lines starting with '#' are skipped.
+
+    Args:
+        stream (file): The file object to read from.
+
+    Yields:
+        str: An IP address.
+    """
+    for line in stream:
+        ip = line.strip()
+        if ip and not ip.startswith('#'):
+            yield ip
+
 def save_output(results, filename, config, fields_to_show, console):
     """
     Saves the output to a file.
 
     Args:
-        results (list): A list of IP information dictionaries.
+        results (iterable): IP information dictionaries.
         filename (str): The name of the file to save the output to.
         config (dict): The configuration dictionary.
         fields_to_show (list): A list of fields to show in the output.
         console (Console): The rich console object.
     """
-    _ , ext = os.path.splitext(filename)
-    ext = ext.lower()
+    from writers import create_writer, open_output
 
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            if ext == '.json':
-                output_data = []
-                current_fields = fields_to_show
-                if not current_fields:
-                    current_fields = config.get("default_fields", BASE_DEFAULT_CONFIG["default_fields"])
-                
-                for data in results:
-                    if 'all' in current_fields:
-                        output_data.append({k: v for k, v in data.items() if k != 'status'})
-                    else:
-                        output_data.append({field: data[field] for field in current_fields if field in data})
-                
-                if len(output_data) == 1:
-                    output_data = output_data[0]
-
-                json.dump(output_data, f, indent=4)
-
-            elif ext == '.md':
-                md_content = ""
-                for data in results:
-                    display_manager = DisplayManager(console)
-                    display = display_manager.get_display("markdown", config, data, fields_to_show)
-                    md_content += display.generate_markdown_string()
-                    if len(results) > 1:
-                        md_content += "---\n\n"
-                f.write(md_content)
-            else:
-                text_content = ""
-                for data in results:
-                    text_content += f"--- IP Information for {data.get('display_ip', 'N/A')} ---\n"
-                    
-                    current_fields = fields_to_show
-                    if not current_fields:
-                        current_fields = config.get("default_fields", BASE_DEFAULT_CONFIG["default_fields"])
-                    if 'all' in current_fields:
-                        current_fields = [key for key in data if key not in ["status"]]
-
-                    for field in current_fields:
-                        if field in data:
-                            text_content += f"{field.capitalize()}: {data[field]}\n"
-                    text_content += "\n"
-                f.write(text_content)
-                
+        with open_output(filename) as f, create_writer(filename, f, config, fields_to_show) as writer:
+            for data in results:
+                writer.write(data)
         console.print(f"Output saved to [green]{filename}[/green]")
     except IOError as e:
         console.print(f"[bold red]Error:[/bold red] Could not write to file '{filename}'. {e}", style="bold red")
 
-def main():
-    """The main function of the program."""
+def serve(argv, config_dir):
+    """
+    Runs 'whatsip serve': a resident process that answers lookups from a warm provider.
+
+    Args:
+        argv (list): The command line arguments after 'serve'.
+        config_dir (str): The path to the configuration directory.
+    """
     parser = argparse.ArgumentParser(
-        description="A stylish IP address lookup tool.",
-        formatter_class=argparse.RawTextHelpFormatter
+        prog="whatsip serve",
+        description="Answer lookups as JSON over localhost HTTP or a Unix socket, keeping the provider and results warm."
     )
-    parser.add_argument('ip', nargs='*', default=[], help='IP address(es) to look up. Your own by default.')
-    
-    config_dir = get_config_dir()
+    default_config_path = os.path.join(config_dir, 'config.json')
+    parser.add_argument('--listen', help="'host:port' or a Unix socket path to listen on. Default is 'daemon_address' from the config.")
+    parser.add_argument('--config', default=default_config_path, help=f'Path to a custom config file. Default is {default_config_path}')
+    parser.add_argument('--provider', choices=['ip-api', 'local'], help='Where lookups come from. Default is taken from the config file.')
+    parser.add_argument('--db', help='Path to the IP-range CSV file used by the local provider.')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Concurrent lookups per request. With one, cache misses use the batch endpoint.')
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', action='store_true', help='Do not read from or write to the lookup cache.')
+    cache_group.add_argument('--refresh', action='store_true', help='Ignore cached results and refresh them from the API.')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    from rich.console import Console
+    from daemon import DaemonServer
+
+    console = Console(stderr=True)
+    config = load_config(args.config, console)
+    ip_info_provider = create_provider(args, config, config_dir, console)
+    if ip_info_provider is None:
+        return
+    address = args.listen or config.get("daemon_address", BASE_DEFAULT_CONFIG["daemon_address"])
+    try:
+        server = DaemonServer(
+            ip_info_provider,
+            address,
+            max_entries=config.get("daemon_cache_entries", BASE_DEFAULT_CONFIG["daemon_cache_entries"]),
+            ttl=config.get("cache_ttl", BASE_DEFAULT_CONFIG["cache_ttl"]),
+            workers=args.workers
+        )
+    except (OSError, ValueError) as e:
+        ip_info_provider.close()
+        console.print(f"[bold red]Error:[/bold red] Could not listen on '{address}'. {e}", style="bold red")
+        return
+
+    console.print(f"whatsip daemon listening on [green]{address}[/green]. Press Ctrl+C to stop.")
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            console.print("Daemon stopped.")
+
+def add_output_arguments(parser, config_dir):
+    """
+    Adds the options of every command that shows results: config, fields, theme, output and timings.
+
+    Args:
+        parser (ArgumentParser): The parser to add the options to.
+        config_dir (str): The path to the configuration directory.
+    """
     default_config_path = os.path.join(config_dir, 'config.json')
     parser.add_argument('--config', default=default_config_path, help=f'Path to a custom config file. Default is {default_config_path}')
     
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-f', '--fields', help='Comma-separated list of fields to display (e.g., "city,isp,lat,lon").')
     group.add_argument('-a', '--all', action='store_true', help='Display all available fields from the API.')
+    group.add_argument('--summary', choices=SUMMARY_FIELDS, metavar='BY', help=f'Show a report of the results grouped by BY ({", ".join(SUMMARY_FIELDS)}) instead of each result. With -o, the report is saved.')
 
+    parser.add_argument('-t', '--theme', help='Display theme to use instead of the one in the config file (e.g., "table" for many IPs).')
+    parser.add_argument('--ndjson', action='store_true', help='Print each result as a line of JSON as soon as it arrives.')
+    parser.add_argument('--plain', action='store_true', help='Print results as plain text, without colors, boxes or rich. Default when stdout is not a terminal.')
     parser.add_argument('-o', '--output', help='Save output to a file (e.g., output.json, output.md). Format is detected from extension.')
+    add_timing_arguments(parser)
 
-    args = parser.parse_args()
-    
-    console = Console()
-    config = load_config(args.config, console)
-    display_manager = DisplayManager(console)
-    ip_info_provider = IPInfoProvider()
+def add_timing_arguments(parser):
+    """
+    Adds the options that measure a run: --timings, --timings-format and --profile.
+
+    Args:
+        parser (ArgumentParser): The parser to add the options to.
+    """
+    parser.add_argument('--timings', action='store_true', help='Print how long each phase took to stderr.')
+    parser.add_argument('--timings-format', choices=['table', 'json'], default='table', help='How --timings prints the phases: as a table (default) or JSON.')
+    parser.add_argument('--profile', metavar='FILE', help='Write a cProfile dump of the run to FILE (read it with pstats or snakeviz).')
+
+def add_lookup_arguments(parser, config_dir):
+    """
+    Adds the options shared by lookups and 'whatsip scan': the output options, provider, workers and cache.
+
+    Args:
+        parser (ArgumentParser): The parser to add the options to.
+        config_dir (str): The path to the configuration directory.
+    """
+    add_output_arguments(parser, config_dir)
+    add_provider_arguments(parser)
+
+def add_provider_arguments(parser):
+    """
+    Adds the options that choose where lookups come from: provider, daemon, workers and cache.
+
+    Args:
+        parser (ArgumentParser): The parser to add the options to.
+    """
+    parser.add_argument('--provider', choices=['ip-api', 'local'], help='Where lookups come from. Default is taken from the config file.')
+    parser.add_argument('--db', help='Path to the IP-range CSV file used by the local provider.')
+    parser.add_argument('--via-daemon', action='store_true', help="Send lookups to a running 'whatsip serve'.")
+    parser.add_argument('--daemon-address', metavar='ADDRESS', help="'host:port' or a Unix socket path of the daemon used with --via-daemon. Default is taken from the config file.")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of concurrent lookups. With more than one, each IP is requested separately.')
+
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', action='store_true', help='Do not read from or write to the lookup cache.')
+    cache_group.add_argument('--refresh', action='store_true', help='Ignore cached results and refresh them from the API.')
+
+def run_with_timings(command, args, config_dir):
+    """
+    Runs a command, recording its phases for --timings and profiling it for --profile.
+
+    Args:
+        command (callable): Called as command(args, config_dir, timings).
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+    """
+    timings = Timings(enabled=args.timings)
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with timings.phase("total"):
+            command(args, config_dir, timings)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.timings:
+            timings.print_summary(args.timings_format)
+
+def main():
+    """The main function of the program."""
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2:], get_config_dir())
+        return
+    if sys.argv[1:2] == ['scan']:
+        scan(sys.argv[2:], get_config_dir())
+        return
+    if sys.argv[1:2] == ['near']:
+        near(sys.argv[2:], get_config_dir())
+        return
+    if sys.argv[1:2] == ['enrich']:
+        enrich(sys.argv[2:], get_config_dir())
+        return
+
+    parser = argparse.ArgumentParser(
+        description="A stylish IP address lookup tool.\nRun 'whatsip serve' to start a resident daemon for fast repeated lookups,\nor 'whatsip scan FILE...' to look up the addresses found in log files,\nor 'whatsip near LAT,LON --from FILE' to search saved results by location,\nor 'whatsip enrich FILE --column ip' to add lookup fields to the rows of a CSV or TSV file.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('ip', nargs='*', default=[], help='IP address(es) to look up. Your own by default.')
+    parser.add_argument('-i', '--input', help='Read IP addresses from a file, one per line. Use "-" for stdin.')
     
+    config_dir = get_config_dir()
+    add_lookup_arguments(parser, config_dir)
+
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    run_with_timings(run, args, config_dir)
+
+def prepare_output(args, timings, lookups=True, addresses=None):
+    """
+    Loads the configuration and resolves how results are shown.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        timings (Timings): Records how long each phase takes.
+        lookups (bool, optional): The results come from lookups. False for saved results, which are shown
+                                  as they are, without fetching deferred fields. Defaults to True.
+        addresses (int, optional): The number of addresses to look up, if it is known before the run starts.
+
+    Returns:
+        tuple: (console, config, plan).
+    """
+    from rich.console import Console
+
+    # With --ndjson, stdout carries only records; messages go to stderr.
+    console = Console(stderr=args.ndjson)
+    # Colors and boxes are lost in a pipe or file anyway, so results skip rich there and are written as text.
+    args.plain = args.plain or not console.is_terminal
+    with timings.phase("load_config"):
+        config = load_config(args.config, console)
+    if args.theme:
+        config = dict(config, theme=args.theme)
+    if args.summary:
+        config = dict(config, theme="report", summary_by=args.summary)
+    if not lookups:
+        config = dict(config, deferred_fields=[])
+    elif addresses is None or addresses > DEFER_MAX_ADDRESSES or not sys.stdout.isatty():
+        # Fetching fields one address at a time only pays off for someone watching a few lookups; only
+        # fields resolved on this machine, which cost no requests, are still deferred.
+        deferred_fields = config.get("deferred_fields", BASE_DEFAULT_CONFIG["deferred_fields"])
+        local = "reverse" in deferred_fields and config.get("reverse_dns", BASE_DEFAULT_CONFIG["reverse_dns"]) == "local"
+        config = dict(config, deferred_fields=["reverse"] if local else [])
+
     fields_to_show = []
-    if args.all:
+    if args.summary:
+        fields_to_show = [args.summary] + list(FLAG_FIELDS)
+    elif args.all:
         fields_to_show = ['all']
     elif args.fields:
         fields_to_show = [f.strip() for f in args.fields.split(',')]
 
-    fields_to_request = fields_to_show
-    if not fields_to_show:
-        fields_to_request = config.get("default_fields", BASE_DEFAULT_CONFIG["default_fields"])
-    if 'all' in fields_to_request:
-        fields_to_request = BASE_DEFAULT_CONFIG["_all_possible_fields"]
+    # Resolved once and shared by the provider, the display and the writers.
+    plan = ProjectionPlan(config, fields_to_show, extra_fields=getattr(args, "extra_fields", ()))
+    return console, config, plan
 
-    ips_to_lookup = args.ip if args.ip else ['']
-    results = []
+def prepare_lookups(args, config_dir, timings, addresses=None):
+    """
+    Loads the configuration and creates what every lookup command needs.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+        timings (Timings): Records how long each phase takes.
+        addresses (int, optional): The number of addresses to look up, if it is known before the run starts.
+
+    Returns:
+        tuple: (console, config, provider, plan), or None if the provider could not be created.
+    """
+    console, config, plan = prepare_output(args, timings, addresses=addresses)
+    ip_info_provider = create_provider(args, config, config_dir, console)
+    if ip_info_provider is None:
+        return None
+    ip_info_provider.timings = timings
+    return console, config, ip_info_provider, plan
+
+def run(args, config_dir, timings):
+    """
+    Looks up the requested IP addresses and shows or saves the results.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+        timings (Timings): Records how long each phase takes.
+    """
+    prepared = prepare_lookups(args, config_dir, timings, addresses=None if args.input else max(len(args.ip), 1))
+    if prepared is None:
+        return
+    console, config, ip_info_provider, plan = prepared
+
+    with ip_info_provider:
+        input_file = None
+        if args.input == '-':
+            ips_to_lookup = itertools.chain(args.ip, read_ips(sys.stdin))
+        elif args.input:
+            try:
+                input_file = open(args.input, 'r', encoding='utf-8')
+            except IOError as e:
+                console.print(f"[bold red]Error:[/bold red] Could not read input file '{args.input}'. {e}", style="bold red")
+                return
+            ips_to_lookup = itertools.chain(args.ip, read_ips(input_file))
+        else:
+            ips_to_lookup = args.ip if args.ip else ['']
 
-    for ip in ips_to_lookup:
         try:
-            ip_info = ip_info_provider.get_ip_info(ip, fields_to_request)
-            display_manager.display(ip_info, config, fields_to_show)
-            if ip_info.get("status") == "success":
-                 results.append(ip_info)
-        except requests.exceptions.Timeout:
-            console.print(Panel("The API did not respond in time.", title="[bold red]Request Timed Out[/bold red]", border_style="red"))
-        except requests.exceptions.RequestException as e:
-            console.print(Panel(f"Error: {e}", title="[bold red]Request Failed[/bold red]", border_style="red"))
-        
-        if len(ips_to_lookup) > 1 and ip != ips_to_lookup[-1]:
-            console.print()
+            # Slow fields such as 'reverse' are left out here and fetched in the background once a result is shown.
+            results = ip_info_provider.iter_ip_infos(ips_to_lookup, plan.fast_fields, args.workers)
+            show_results(results, args, config, plan, ip_info_provider, console, timings)
+        finally:
+            if input_file is not None:
+                input_file.close()
+
+def show_results(results, args, config, plan, ip_info_provider, console, timings):
+    """
+    Shows lookup results as they arrive, as NDJSON or with the configured theme, and saves them with -o.
+
+    Args:
+        results (iterable): (ip_address, data, error) tuples, as yielded by Provider.iter_ip_infos.
+        args (Namespace): The parsed command line arguments.
+        config (dict): The configuration dictionary.
+        plan (ProjectionPlan): The fields of the run.
+        ip_info_provider (Provider): The provider, used for deferred fields. None for saved results.
+        console (Console): The rich console object.
+        timings (Timings): Records how long each phase takes.
+    """
+    from writers import NdjsonWriter, OutputFile
+
+    if args.summary:
+        show_summary(results, args, config, plan, console, timings)
+        return
+    ndjson_writer = NdjsonWriter(sys.stdout, config, plan, flush=True) if args.ndjson else None
+    # Created with the first saved record, so a run without results doesn't overwrite an existing file.
+    output = OutputFile(args.output, config, plan) if args.output else None
+
+    stream = None if args.ndjson else DisplayManager(console, plain=args.plain).open_stream(config, plan)
+    deferred = None
+    if plan.deferred_fields and ip_info_provider is not None:
+        from deferred import DEFAULT_WORKERS, MAX_HELD_BACK, DeferredLookups
+
+        deferred = DeferredLookups(
+            ip_info_provider,
+            plan.deferred_fields,
+            resolver=config.get("reverse_dns", BASE_DEFAULT_CONFIG["reverse_dns"]),
+            workers=max(args.workers, DEFAULT_WORKERS),
+            # Saved records wait for their deferred fields, so files get complete records in input order.
+            keep_order=output is not None
+        )
+
+    def save(ip_info):
+        """Saves a complete record with -o, and stops saving if the file can't be written."""
+        nonlocal output
+        try:
+            with timings.phase("save_output", ip_info.get("display_ip")):
+                output.write(ip_info)
+        except IOError as e:
+            console.print(f"[bold red]Error:[/bold red] Could not write to file '{args.output}'. {e}", style="bold red")
+            failed, output = output, None
+            try:
+                failed.close()
+            except IOError:
+                pass
+
+    def apply_patches(patches):
+        """Shows deferred fields as they arrive and saves the records that are now complete."""
+        for ip_info, patch in patches:
+            with timings.phase("render", ip_info.get("display_ip")):
+                if stream is None:
+                    ndjson_writer.write_patch(ip_info.get("display_ip"), patch)
+                else:
+                    stream.update(ip_info.get("display_ip"), patch)
+        if output is not None:
+            for ip_info in deferred.completed():
+                save(ip_info)
+
+    try:
+        for ip, ip_info, error in results:
+            with timings.phase("render", ip):
+                if stream is None:
+                    ndjson_writer.write(ip_info if error is None else {"status": "fail", "message": str(error), "query": ip})
+                elif error is not None:
+                    stream.add_error(ip, error)
+                else:
+                    stream.add(ip_info)
+
+            success = ip_info is not None and ip_info.get("status") == "success"
+            if success and deferred is not None and any(f not in ip_info for f in plan.deferred_fields):
+                deferred.submit(ip_info, ip_info.get("query") or ip)
+            elif success and output is not None:
+                if deferred is not None:
+                    # Keeps its place behind records that are still waiting for deferred fields.
+                    deferred.add_complete(ip_info)
+                else:
+                    save(ip_info)
+            if deferred is not None:
+                apply_patches(deferred.ready())
+                # Stop taking results while too many records wait behind one that lacks its deferred fields.
+                while deferred.pending and max(deferred.held_back, getattr(stream, "held_back", 0)) > MAX_HELD_BACK:
+                    apply_patches(deferred.wait())
+        if deferred is not None:
+            apply_patches(deferred.drain())
+    finally:
+        if deferred is not None:
+            deferred.close()
+        if stream is not None:
+            with timings.phase("render"):
+                stream.close()
+        # Also when the run is interrupted, so the saved records form a complete file.
+        if output is not None:
+            try:
+                with timings.phase("save_output"):
+                    output.close()
+            except IOError as e:
+                console.print(f"[bold red]Error:[/bold red] Could not write to file '{args.output}'. {e}", style="bold red")
+                output = None
+
+    if output is not None:
+        if output.count:
+            console.print(f"Output saved to [green]{args.output}[/green]")
+        else:
+            console.print(f"No results to save; '[cyan]{args.output}[/cyan]' was left unchanged.", style="yellow")
+
+def scan(argv, config_dir):
+    """
+    Runs 'whatsip scan': counts the IP addresses in log files and looks up each distinct one.
+
+    Args:
+        argv (list): The command line arguments after 'scan'.
+        config_dir (str): The path to the configuration directory.
+    """
+    parser = argparse.ArgumentParser(
+        prog="whatsip scan",
+        description="Count the IP addresses in log files and look up each distinct address once.\nResults are ordered by hits and carry a 'hits' field.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE', help='Log files to scan.')
+    scanner_group = parser.add_mutually_exclusive_group()
+    scanner_group.add_argument('--column', type=int, metavar='N', help='Only take addresses from the N-th whitespace-separated column (1 is the first).')
+    scanner_group.add_argument('--regex', metavar='PATTERN', help="Only take addresses matched by PATTERN: its 'ip' group, its first group, or the whole match.")
+    parser.add_argument('-j', '--jobs', type=int, help='Processes that scan chunks of large files in parallel. Default is the number of CPUs.')
+    parser.add_argument('--top', type=int, metavar='N', help='Only look up the N addresses with the most hits.')
+    add_lookup_arguments(parser, config_dir)
+
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.column is not None and args.column < 1:
+        parser.error("--column must be at least 1")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    args.extra_fields = ("hits",)
+
+    run_with_timings(run_scan, args, config_dir)
+
+def show_summary(results, args, config, plan, console, timings):
+    """
+    Summarizes lookup results for --summary and shows the report, or prints it as JSON with --ndjson.
+
+    Args:
+        results (iterable): (ip_address, data, error) tuples, as yielded by Provider.iter_ip_infos.
+        args (Namespace): The parsed command line arguments.
+        config (dict): The configuration dictionary.
+        plan (ProjectionPlan): The fields of the run.
+        console (Console): The rich console object.
+        timings (Timings): Records how long each phase takes.
+    """
+    from aggregate import ReportDisplay
+    from writers import open_output, write_summary
+
+    report = ReportDisplay(console, config, plan)
+    for ip, ip_info, error in results:
+        if error is not None:
+            report.add_error(ip, error)
+        else:
+            report.add(ip_info)
+    with timings.phase("aggregate"):
+        summary = report.summarize()
+
+    with timings.phase("render"):
+        if args.ndjson:
+            print(json.dumps(summary, ensure_ascii=False), flush=True)
+        elif args.plain:
+            # A name without an extension is written as text.
+            write_summary("", sys.stdout, summary)
+        else:
+            console.print(report.render(summary))
+
+    if args.output:
+        try:
+            with timings.phase("save_output"), open_output(args.output) as f:
+                write_summary(args.output, f, summary)
+            console.print(f"Output saved to [green]{args.output}[/green]")
+        except IOError as e:
+            console.print(f"[bold red]Error:[/bold red] Could not write to file '{args.output}'. {e}", style="bold red")
+
+def run_scan(args, config_dir, timings):
+    """
+    Scans the log files given to 'whatsip scan' and shows or saves the results.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+        timings (Timings): Records how long each phase takes.
+    """
+    import re
+    from scan import scan_files
+
+    prepared = prepare_lookups(args, config_dir, timings)
+    if prepared is None:
+        return
+    console, config, ip_info_provider, plan = prepared
+
+    try:
+        with timings.phase("scan"):
+            hits = scan_files(args.files, column=args.column, regex=args.regex, jobs=args.jobs)
+    except re.error as e:
+        console.print(f"[bold red]Error:[/bold red] Invalid --regex. {e}", style="bold red")
+        return
+    except OSError as e:
+        console.print(f"[bold red]Error:[/bold red] Could not read '{e.filename}'. {e.strerror}", style="bold red")
+        return
+    if not hits:
+        console.print("No IP addresses found.", style="yellow")
+        return
+
+    ranked = [ip for ip, _ in hits.most_common(args.top)]
+    with ip_info_provider:
+        results = ip_info_provider.iter_ip_infos(ranked, plan.fast_fields, args.workers)
+        show_results(add_hits(results, hits), args, config, plan, ip_info_provider, console, timings)
+
+def add_hits(results, hits):
+    """
+    Adds each address's hit count to its lookup result.
+
+    Args:
+        results (iterable): (ip_address, data, error) tuples.
+        hits (Counter): The number of times each address was seen.
+
+    Yields:
+        tuple: The same tuples; successful results carry a 'hits' field.
+    """
+    for ip, ip_info, error in results:
+        if ip_info is not None:
+            ip_info["hits"] = hits[ip]
+        yield ip, ip_info, error
+
+def near(argv, config_dir):
+    """
+    Runs 'whatsip near': searches saved lookup results by location, or clusters them.
+
+    Args:
+        argv (list): The command line arguments after 'near'.
+        config_dir (str): The path to the configuration directory.
+    """
+    from spatial import parse_distance, parse_location
+
+    parser = argparse.ArgumentParser(
+        prog="whatsip near",
+        description="Search saved lookup results by location, or group them into clusters.\nResults need the 'lat' and 'lon' fields.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('location', nargs='?', metavar='LAT,LON', help='The location to search around, in degrees (e.g. 52.52,13.40).')
+    parser.add_argument('--from', dest='sources', nargs='+', required=True, metavar='FILE', help='Saved results: NDJSON (from --ndjson or -o results.ndjson), JSON, CSV or TSV.')
+    parser.add_argument('-r', '--radius', help='Only results within this distance (e.g. 50km, 500m, 10mi). With --cluster, the radius of a cluster (default 50km).')
+    parser.add_argument('-k', type=int, metavar='N', help='Only the N nearest results. With --cluster, only show the N largest clusters (default 20).')
+    parser.add_argument('--cluster', action='store_true', help='Group all results by location instead of searching around one.')
+    add_output_arguments(parser, config_dir)
+
+    args = parser.parse_args(argv)
+    if args.k is not None and args.k < 1:
+        parser.error("-k must be at least 1")
+    try:
+        args.radius = parse_distance(args.radius) if args.radius is not None else None
+        args.location = parse_location(args.location) if args.location is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.cluster and args.location is not None:
+        parser.error("--cluster groups all results and does not take a location")
+    if not args.cluster and args.location is None:
+        parser.error("give a location (LAT,LON) or --cluster")
+    if not args.cluster and args.radius is None and args.k is None:
+        parser.error("give --radius, -k or both")
+    if not args.cluster:
+        args.extra_fields = ("distance",)
+
+    run_with_timings(run_near, args, config_dir)
+
+def run_near(args, config_dir, timings):
+    """
+    Loads the saved results given to 'whatsip near', indexes them and shows the matches or clusters.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+        timings (Timings): Records how long each phase takes.
+    """
+    from itertools import chain
+    from spatial import DEFAULT_CLUSTER_RADIUS_KM, GeoIndex, read_records
+
+    console, config, plan = prepare_output(args, timings, lookups=False)
+    try:
+        with timings.phase("index"):
+            index = GeoIndex(chain.from_iterable(read_records(path) for path in args.sources))
+    except OSError as e:
+        console.print(f"[bold red]Error:[/bold red] Could not read '{e.filename}'. {e.strerror}", style="bold red")
+        return
+    except ValueError as e:
+        console.print(f"[bold red]Error:[/bold red] Could not parse the saved results. {e}", style="bold red")
+        return
+    if index.skipped:
+        console.print(f"Skipped {index.skipped} results without 'lat' and 'lon'.", style="yellow")
+
+    if args.cluster:
+        with timings.phase("cluster"):
+            clusters = index.clusters(args.radius or DEFAULT_CLUSTER_RADIUS_KM)
+        show_clusters(clusters, args, config, console, timings)
+        return
+
+    lat, lon = args.location
+    with timings.phase("search"):
+        if args.k is not None:
+            found = index.nearest(lat, lon, args.k, args.radius)
+        else:
+            found = index.within(lat, lon, args.radius)
+    if not found:
+        console.print("No results found.", style="yellow")
+        return
+
+    def results():
+        for distance, ip_info in found:
+            ip_info["distance"] = round(distance, 1)
+            yield ip_info.get("query") or ip_info.get("display_ip"), ip_info, None
+
+    show_results(results(), args, config, plan, None, console, timings)
+
+def show_clusters(clusters, args, config, console, timings):
+    """
+    Shows the clusters found by 'whatsip near --cluster', or prints them as NDJSON, and saves them with -o.
+
+    Args:
+        clusters (list): The clusters, as returned by GeoIndex.clusters.
+        args (Namespace): The parsed command line arguments.
+        config (dict): The configuration dictionary.
+        console (Console): The rich console object.
+        timings (Timings): Records how long each phase takes.
+    """
+    from spatial import render_clusters
+    from writers import open_output, write_clusters
+
+    with timings.phase("render"):
+        if args.ndjson:
+            for cluster in clusters:
+                print(json.dumps(cluster, ensure_ascii=False), flush=True)
+        elif args.plain:
+            write_clusters("", sys.stdout, clusters[:args.k or 20])
+        else:
+            console.print(render_clusters(clusters[:args.k or 20], len(clusters), config))
+
+    if args.output:
+        try:
+            with timings.phase("save_output"), open_output(args.output) as f:
+                write_clusters(args.output, f, clusters)
+            console.print(f"Output saved to [green]{args.output}[/green]")
+        except IOError as e:
+            console.print(f"[bold red]Error:[/bold red] Could not write to file '{args.output}'. {e}", style="bold red")
+
+def enrich(argv, config_dir):
+    """
+    Runs 'whatsip enrich': adds lookup fields to the rows of a CSV or TSV file.
+
+    Args:
+        argv (list): The command line arguments after 'enrich'.
+        config_dir (str): The path to the configuration directory.
+    """
+    from enrich import DEFAULT_CHUNK_ROWS
+
+    parser = argparse.ArgumentParser(
+        prog="whatsip enrich",
+        description="Add lookup fields as new columns to the rows of a CSV or TSV file.\nThe file is read in chunks, so it may be larger than memory; rows keep their order.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    default_config_path = os.path.join(config_dir, 'config.json')
+    parser.add_argument('input', metavar='INPUT', help='The CSV or TSV file to enrich. Use "-" for stdin.')
+    parser.add_argument('--column', required=True, help='The column that holds the IP addresses: its name in the header, or its number (1 is the first).')
+    parser.add_argument('--config', default=default_config_path, help=f'Path to a custom config file. Default is {default_config_path}')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-f', '--fields', help='Comma-separated list of fields to add (e.g., "country,as,isp").')
+    group.add_argument('-a', '--all', action='store_true', help='Add all available fields from the API.')
+    parser.add_argument('-o', '--output', help='The file to write. Default is stdout. Its delimiter follows the extension (.csv or .tsv), or else the input\'s.')
+    parser.add_argument('--delimiter', help='The delimiter of the input. Default follows the extension, or is guessed from the first line.')
+    parser.add_argument('--no-header', action='store_true', help='The input has no header row; --column is then a number.')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, metavar='N', help=f'Rows read and looked up at a time (default {DEFAULT_CHUNK_ROWS}).')
+    add_timing_arguments(parser)
+    add_provider_arguments(parser)
+
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.chunk_rows < 1:
+        parser.error("--chunk-rows must be at least 1")
+    if args.delimiter is not None:
+        args.delimiter = args.delimiter.replace("\\t", "\t")
+        if len(args.delimiter) != 1:
+            parser.error("--delimiter must be a single character")
+
+    run_with_timings(run_enrich, args, config_dir)
+
+def run_enrich(args, config_dir, timings):
+    """
+    Enriches the file given to 'whatsip enrich' and writes the result.
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+        config_dir (str): The path to the configuration directory.
+        timings (Timings): Records how long each phase takes.
+    """
+    import csv
+    from functools import partial
+    from rich.console import Console
+    from enrich import DELIMITERS, Enricher, open_rows, resolve_column
+
+    # stdout may carry the enriched rows; messages go to stderr.
+    console = Console(stderr=True)
+    with timings.phase("load_config"):
+        config = load_config(args.config, console)
+    fields_to_show = ['all'] if args.all else [f.strip() for f in args.fields.split(',')] if args.fields else []
+    plan = ProjectionPlan(config, fields_to_show)
+    # The address is already in the row, and failed lookups leave the cells empty.
+    fields = [f for f in plan.table_fields if f not in ("query", "status")]
+
+    try:
+        input_file = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8-sig', newline='')
+    except IOError as e:
+        console.print(f"[bold red]Error:[/bold red] Could not read input file '{args.input}'. {e}", style="bold red")
+        return
+    output_file = None
+    try:
+        delimiter, rows = open_rows(input_file, args.input, args.delimiter)
+        header = None if args.no_header else next(rows, [])
+        try:
+            column = resolve_column(args.column, header)
+        except ValueError as e:
+            console.print(f"[bold red]Error:[/bold red] Invalid --column. {e}", style="bold red")
+            return
+
+        # The output is opened before the provider, so a bad path doesn't leave its cache and sessions open.
+        if args.output:
+            try:
+                output_file = open(args.output, 'w', encoding='utf-8', newline='')
+            except IOError as e:
+                console.print(f"[bold red]Error:[/bold red] Could not write to file '{args.output}'. {e}", style="bold red")
+                return
+        ip_info_provider = create_provider(args, config, config_dir, console)
+        if ip_info_provider is None:
+            return
+        ip_info_provider.timings = timings
+        output_delimiter = DELIMITERS.get(os.path.splitext(args.output or "")[1].lower(), delimiter)
+        writer = csv.writer(output_file or sys.stdout, delimiter=output_delimiter, lineterminator="\n")
+
+        with ip_info_provider:
+            lookup = partial(ip_info_provider.iter_ip_infos, fields_to_request=plan.request_fields, workers=args.workers)
+            enricher = Enricher(lookup, column, fields, chunk_rows=args.chunk_rows)
+            with timings.phase("enrich"):
+                if header is not None:
+                    writer.writerow(enricher.header(header))
+                writer.writerows(enricher.enrich(rows))
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not None:
+            output_file.close()
 
-    if args.output and results:
-        save_output(results, args.output, config, fields_to_show, console)
+    console.print(f"Enriched {enricher.rows} rows with {enricher.lookups} lookups ({enricher.failed} failed).")
+    if args.output:
+        console.print(f"Output saved to [green]{args.output}[/green]")
 
 if __name__ == "__main__":
     try:
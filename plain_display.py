@@ -0,0 +1,274 @@
+from collections import deque
+import json
+import sys
+
+from projection import ProjectionPlan
+
+# The plain themes write text straight to a file object: no rich, no markup, no layout. They are used
+# with --plain and whenever stdout is not a terminal, where colors and boxes would be thrown away.
+
+def error_message(error):
+    """
+    Returns the text shown for a lookup that raised an exception.
+
+    Args:
+        error (Exception or str): The error of the lookup.
+
+    Returns:
+        str: The message, worded as DisplayManager.display_error words it.
+    """
+    # Errors that don't come from requests (e.g. from the daemon) shouldn't pull it in.
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(error, requests.exceptions.Timeout):
+        return "The API did not respond in time."
+    return str(error)
+
+class PlainStream:
+    """Base class for the plain themes, which write one record at a time as preformatted text."""
+
+    # Written between two records.
+    separator = "\n"
+
+    def __init__(self, file, config, fields_to_show, flush=True):
+        """
+        Initializes the PlainStream class.
+
+        Args:
+            file (file): The file object to write to, usually sys.stdout.
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+            flush (bool, optional): Flush the file after every record, so a reader at the other end of
+                                    a pipe gets each record as soon as it is shown. Defaults to True.
+        """
+        self.file = file
+        self.config = config
+        self.plan = ProjectionPlan.of(config, fields_to_show)
+        self.flush = flush
+        self.count = 0
+        # Records waiting for deferred fields, followed by the records added after them, as
+        # [text or record, waiting] pairs. Text can't be redrawn, so records are written in order
+        # once they are complete.
+        self._queue = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def format_record(self, data):
+        """
+        Formats a record.
+
+        Args:
+            data (dict): The IP information dictionary.
+
+        Returns:
+            str: The text of the record, without a trailing line break.
+        """
+        raise NotImplementedError
+
+    def format_error(self, ip_address, message):
+        """
+        Formats a failed lookup.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            message (str): What went wrong.
+
+        Returns:
+            str: The text of the failure, without a trailing line break.
+        """
+        return f"Error for {ip_address or 'N/A'}: {message}"
+
+    @property
+    def held_back(self):
+        """The number of records held back until the record before them gets its deferred fields."""
+        return len(self._queue)
+
+    def _write(self, text):
+        """Writes the text of a record after the ones before it."""
+        if self.count > 0:
+            self.file.write(self.separator)
+        self.file.write(text)
+        self.file.write("\n")
+        self.count += 1
+
+    def _enqueue(self, text):
+        """Writes the text of a record, or queues it behind records still waiting for deferred fields."""
+        if self._queue:
+            self._queue.append([text, False])
+        else:
+            self._write(text)
+            if self.flush:
+                self.file.flush()
+
+    def add(self, data):
+        """
+        Shows the next record, or holds it back until its deferred fields arrive through update().
+
+        Args:
+            data (dict): The IP information dictionary.
+        """
+        if data.get("status") == "fail":
+            self._enqueue(self.format_error(data.get("display_ip"), data.get("message", "Unknown error")))
+        elif any(field not in data for field in self.plan.deferred_fields):
+            self._queue.append([data, True])
+        else:
+            self._enqueue(self.format_record(data))
+
+    def update(self, ip_address, patch):
+        """
+        Completes a record that was waiting for deferred fields and writes the records that are now ready.
+
+        Args:
+            ip_address (str): The 'display_ip' of the record.
+            patch (dict): The deferred fields; empty if they could not be fetched.
+        """
+        for entry in self._queue:
+            if entry[1] and entry[0].get("display_ip") == ip_address:
+                entry[0] = self.format_record(dict(entry[0], **patch))
+                entry[1] = False
+                break
+        else:
+            if patch:
+                self._enqueue("\n".join(f"{field.capitalize()} for {ip_address}: {value}" for field, value in patch.items()))
+            return
+
+        while self._queue and not self._queue[0][1]:
+            self._write(self._queue.popleft()[0])
+        if self.flush:
+            self.file.flush()
+
+    def add_error(self, ip_address, error):
+        """
+        Shows a lookup that failed with an exception.
+
+        Args:
+            ip_address (str): The IP address that was looked up.
+            error (Exception or str): The error of the lookup.
+        """
+        self._enqueue(self.format_error(ip_address, error_message(error)))
+
+    def close(self):
+        """Writes the records that are still queued, without the deferred fields they never got."""
+        while self._queue:
+            text, waiting = self._queue.popleft()
+            self._write(self.format_record(text) if waiting else text)
+        self.file.flush()
+
+    def _lines(self, fields, data, indent=""):
+        """Returns 'Field: value' lines for the fields that the record has."""
+        return [f"{indent}{field.capitalize()}: {data[field]}" for field in fields if field in data]
+
+
+class PlainMinimalDisplay(PlainStream):
+    """Writes each record as a block of 'Field: value' lines, like the minimal theme."""
+
+    def format_record(self, data):
+        lines = [f"--- IP Information for {data.get('display_ip', 'N/A')} ---"]
+        lines.extend(self._lines(self.plan.fields_for(data), data))
+        return "\n".join(lines)
+
+class PlainGroupedDisplay(PlainStream):
+    """Writes each record with its fields grouped by category, like the dashboard, grid and tree themes."""
+
+    def format_record(self, data):
+        lines = [f"IP Information for {data.get('display_ip', 'N/A')}"]
+        categories, other_fields = self.plan.groups(self.plan.fields_for(data))
+        for cat_name, cat_fields in categories + [("Other", other_fields)]:
+            cat_lines = self._lines(cat_fields, data, indent="  ")
+            if cat_lines:
+                lines.append(f"{cat_name}:")
+                lines.extend(cat_lines)
+        return "\n".join(lines)
+
+class PlainCompactDisplay(PlainStream):
+    """Writes each record on one line, like the compact theme."""
+
+    def format_record(self, data):
+        parts = [f"IP: {data.get('display_ip', 'N/A')}"]
+        parts.extend(self._lines([f for f in self.plan.fields_for(data) if f != "query"], data))
+        return " | ".join(parts)
+
+class PlainJsonDisplay(PlainStream):
+    """Writes each record as indented JSON, like the json theme."""
+
+    def format_record(self, data):
+        fields = self.plan.fields_for(data)
+        return json.dumps({field: data[field] for field in fields if field in data}, indent=2, ensure_ascii=False)
+
+class PlainMarkdownDisplay(PlainStream):
+    """Writes each record as Markdown source instead of rendering it."""
+
+    def format_record(self, data):
+        from display import MarkdownDisplay
+
+        return MarkdownDisplay(None, self.config, data, self.plan).generate_markdown_string().rstrip("\n")
+
+class PlainTableDisplay(PlainStream):
+    """Writes results as tab-separated rows under a header row, like the table theme."""
+
+    separator = ""
+
+    def __init__(self, file, config, fields_to_show, flush=True):
+        super().__init__(file, config, fields_to_show, flush)
+        self.fields = [f for f in self.plan.table_fields if f != "query"]
+
+    def _write(self, text):
+        if self.count == 0:
+            self.file.write("\t".join(["IP"] + [field.capitalize() for field in self.fields]) + "\n")
+        super()._write(text)
+
+    def _row(self, cells):
+        """Joins cells into a row, keeping tabs and line breaks in values from breaking it up."""
+        return "\t".join(str(cell).replace("\t", " ").replace("\n", " ") for cell in cells)
+
+    def format_record(self, data):
+        return self._row([data.get("display_ip", "N/A")] + [data.get(field, "") for field in self.fields])
+
+    def format_error(self, ip_address, message):
+        return self._row([ip_address or "N/A", f"Error: {message}"])
+
+class PlainReportDisplay:
+    """Writes the report of the report theme as text once all results are in."""
+
+    def __init__(self, file, config, fields_to_show, flush=True):
+        """
+        Initializes the PlainReportDisplay class.
+
+        Args:
+            file (file): The file object to write to, usually sys.stdout.
+            config (dict): The configuration dictionary; 'summary_by' and 'summary_top' shape the report.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+            flush (bool, optional): Unused; the report is written once. Defaults to True.
+        """
+        from aggregate import ReportDisplay
+
+        self.file = file
+        # Only its aggregation is used, which needs no console.
+        self.report = ReportDisplay(None, config, fields_to_show)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, data):
+        """Adds a result to the summary."""
+        self.report.add(data)
+
+    def add_error(self, ip_address, error):
+        """Counts a failed lookup."""
+        self.report.add_error(ip_address, error)
+
+    def update(self, ip_address, patch):
+        """Deferred fields are not part of the summary."""
+
+    def close(self):
+        """Writes the report."""
+        from writers import write_summary
+
+        # A name without an extension is written as text.
+        write_summary("", self.file, self.report.summarize())
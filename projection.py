@@ -0,0 +1,166 @@
+from functools import lru_cache
+
+from config import BASE_DEFAULT_CONFIG, CATEGORIES
+
+# ip-api's numeric codes for its fields; a request's 'fields' parameter may be the sum of them.
+FIELD_BITS = {
+    "country": 1,
+    "countryCode": 2,
+    "region": 4,
+    "regionName": 8,
+    "city": 16,
+    "zip": 32,
+    "lat": 64,
+    "lon": 128,
+    "timezone": 256,
+    "isp": 512,
+    "org": 1024,
+    "as": 2048,
+    "reverse": 4096,
+    "query": 8192,
+    "status": 16384,
+    "message": 32768,
+    "mobile": 65536,
+    "proxy": 131072,
+    "district": 524288,
+    "continent": 1048576,
+    "continentCode": 2097152,
+    "asname": 4194304,
+    "currency": 8388608,
+    "hosting": 16777216,
+    "offset": 33554432,
+}
+
+# Fields that are never shown under a category or under "Other".
+UNGROUPED_FIELDS = ("query", "status")
+
+# Shown in place of a deferred field until its value arrives.
+PENDING_VALUE = "…"
+
+@lru_cache(maxsize=64)
+def field_mask(fields):
+    """
+    Encodes fields as ip-api's numeric 'fields' value.
+
+    'status' and 'message' are always included, so failures can be told apart.
+
+    Args:
+        fields (tuple): The field names.
+
+    Returns:
+        int: The bitmask, or None if a field has no numeric code.
+    """
+    mask = FIELD_BITS["status"] | FIELD_BITS["message"]
+    for field in fields:
+        bit = FIELD_BITS.get(field)
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+class ProjectionPlan:
+    """The fields a run requests, shows and writes, resolved once and shared by the provider, themes and writers."""
+
+    def __init__(self, config, fields_to_show, extra_fields=()):
+        """
+        Initializes the ProjectionPlan class.
+
+        Args:
+            config (dict): The configuration dictionary.
+            fields_to_show (list): The fields given on the command line; empty for the config's
+                                   default fields, or ['all'] for every field.
+            extra_fields (tuple, optional): Fields that whatsip adds to each record itself, e.g. 'hits';
+                                            they are shown but never requested. Defaults to ().
+        """
+        self.fields_to_show = list(fields_to_show or [])
+        self.extra_fields = list(extra_fields)
+        fields = self.fields_to_show or list(config.get("default_fields", BASE_DEFAULT_CONFIG["default_fields"]))
+        self.show_all = 'all' in fields
+        if self.show_all:
+            self.display_fields = None
+            self.request_fields = list(BASE_DEFAULT_CONFIG["_all_possible_fields"])
+        else:
+            self.request_fields = [f for f in fields if f not in self.extra_fields]
+            self.display_fields = self.request_fields + self.extra_fields
+        # Tables need the same columns for every record, so 'all' means every field the API can return.
+        self.table_fields = self.display_fields or self.request_fields + self.extra_fields
+        # Slow fields are fetched after the others, unless there would be nothing else to show first.
+        slow_fields = config.get("deferred_fields", BASE_DEFAULT_CONFIG["deferred_fields"])
+        self.deferred_fields = [f for f in self.request_fields if f in slow_fields]
+        self.fast_fields = [f for f in self.request_fields if f not in self.deferred_fields]
+        if all(f in UNGROUPED_FIELDS for f in self.fast_fields):
+            self.deferred_fields = []
+            self.fast_fields = self.request_fields
+        self.field_to_category = {field: category for category, fields in CATEGORIES.items() for field in fields}
+        self._groups = {}
+
+    @classmethod
+    def of(cls, config, fields_to_show):
+        """
+        Returns fields_to_show if it already is a plan, or builds one from it.
+
+        Args:
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): The fields to show, or an existing plan.
+
+        Returns:
+            ProjectionPlan: The plan.
+        """
+        if isinstance(fields_to_show, cls):
+            return fields_to_show
+        return cls(config, fields_to_show)
+
+    def fields_for(self, data):
+        """
+        Returns the fields to show for a record.
+
+        Args:
+            data (dict): The IP information dictionary.
+
+        Returns:
+            list: The display fields, or every key of the record except 'status' when showing all fields.
+        """
+        if self.display_fields is not None:
+            return self.display_fields
+        return [key for key in data if key != "status"]
+
+    def project(self, data):
+        """
+        Returns the fields of a record that should be output.
+
+        Args:
+            data (dict): The IP information dictionary.
+
+        Returns:
+            dict: The selected fields.
+        """
+        if self.display_fields is None:
+            return {k: v for k, v in data.items() if k != 'status'}
+        return {field: data[field] for field in self.display_fields if field in data}
+
+    def groups(self, fields):
+        """
+        Splits fields into CATEGORIES, keeping the order of each category.
+
+        Args:
+            fields (list): The fields to split, e.g. from fields_for().
+
+        Returns:
+            tuple: (categories, other_fields). categories is a list of (category name, fields)
+                   for the categories that have fields; other_fields holds the remaining fields
+                   except 'query' and 'status', in their original order.
+        """
+        key = tuple(fields)
+        groups = self._groups.get(key)
+        if groups is None:
+            selected = set(key)
+            categories = []
+            for category, category_fields in CATEGORIES.items():
+                in_category = [f for f in category_fields if f in selected]
+                if in_category:
+                    categories.append((category, in_category))
+            other_fields = [f for f in key if f not in self.field_to_category and f not in UNGROUPED_FIELDS]
+            groups = (categories, other_fields)
+            if len(self._groups) < 64:
+                self._groups[key] = groups
+        return groups
@@ -0,0 +1,231 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# A process waiting for quota checks the ledger at least this often (seconds), which also shows the
+# others that it is still waiting.
+MAX_POLL_INTERVAL = 1.0
+# How soon a waiter whose turn has not come yet looks again while quota is available.
+TURN_POLL_INTERVAL = 0.05
+# A waiter that has not checked the ledger for this long has exited and loses its place in the queue.
+STALE_WAITER_AFTER = 5.0
+
+class QuotaLedger:
+    """
+    The rate-limit quota of each endpoint, shared by every whatsip process on the host.
+
+    The ledger is a small JSON file, normally quota.json in the config directory. It is read and
+    rewritten under an exclusive file lock (flock, or msvcrt.locking on Windows), and the lock is held
+    only while it is read and rewritten, never while waiting for quota.
+    """
+
+    def __init__(self, path, clock=time.time):
+        """
+        Initializes the QuotaLedger class.
+
+        Args:
+            path (str): The path to the ledger file. It is created if it does not exist.
+            clock (callable, optional): Returns the current wall-clock time in seconds, which every
+                                        process shares. Defaults to time.time.
+
+        Raises:
+            OSError: If the file can't be opened.
+        """
+        self.path = path
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), "r+", encoding="utf-8")
+        # The file lock is held by the open file, so it does not keep out the threads of this process.
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Closes the ledger file."""
+        self._file.close()
+
+    def _lock_file(self):
+        """Takes the file lock, waiting for other processes."""
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    return
+                except OSError:
+                    # LK_LOCK gives up after about 10 seconds.
+                    continue
+
+    def _unlock_file(self):
+        """Releases the file lock."""
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def bucket(self, key):
+        """
+        Locks the ledger and yields the quota of an endpoint, which is saved when the block ends.
+
+        Args:
+            key (str): The endpoint, e.g. its URL.
+
+        Yields:
+            dict: 'limit', 'remaining' and 'reset_at' (wall-clock seconds), each None while unknown,
+                  'next_ticket' and 'waiters' (ticket -> when its process last looked). Changes are saved.
+        """
+        with self._lock:
+            self._lock_file()
+            try:
+                self._file.seek(0)
+                try:
+                    state = json.loads(self._file.read() or "{}")
+                    if not isinstance(state, dict):
+                        state = {}
+                except ValueError:
+                    # A damaged ledger only costs what it knew about the quota.
+                    state = {}
+                bucket = state.setdefault(key, {})
+                for name in ("limit", "remaining", "reset_at"):
+                    bucket.setdefault(name, None)
+                bucket.setdefault("next_ticket", 0)
+                bucket.setdefault("waiters", {})
+                yield bucket
+                self._file.seek(0)
+                self._file.truncate()
+                self._file.write(json.dumps(state))
+                self._file.flush()
+            finally:
+                self._unlock_file()
+
+class SharedRateLimiter:
+    """
+    Paces API requests like RateLimiter, but with the quota kept in a QuotaLedger, so that concurrent
+    whatsip processes behind one IP address share ip-api's per-IP quota instead of each assuming all of it.
+
+    Processes that find the quota used up take a ticket and are served in ticket order once the
+    window resets.
+    """
+
+    def __init__(self, ledger, key, sleep=time.sleep):
+        """
+        Initializes the SharedRateLimiter class.
+
+        Args:
+            ledger (QuotaLedger): The ledger shared with the other processes.
+            key (str): The endpoint whose quota this is, e.g. its URL.
+            sleep (callable, optional): Sleeps for the given number of seconds. Defaults to time.sleep.
+        """
+        self.ledger = ledger
+        self.key = key
+        self._sleep = sleep
+
+    @property
+    def quota(self):
+        """
+        Returns the current quota state.
+
+        Returns:
+            dict: 'limit', 'remaining' and 'reset_in' (seconds), each None while unknown.
+        """
+        with self.ledger.bucket(self.key) as bucket:
+            now = self.ledger.clock()
+            self._roll_window(bucket, now)
+            reset_in = None if bucket["reset_at"] is None else max(0.0, bucket["reset_at"] - now)
+            return {"limit": bucket["limit"], "remaining": bucket["remaining"], "reset_in": reset_in}
+
+    def _roll_window(self, bucket, now):
+        """Starts a new window once the reported reset time has passed."""
+        if bucket["reset_at"] is not None and now >= bucket["reset_at"]:
+            bucket["remaining"] = bucket["limit"]
+            bucket["reset_at"] = None
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent without exceeding the shared quota and reserves it.
+
+        When the quota is used up, this waits in line with the other processes until the window resets.
+        """
+        ticket = None
+        while True:
+            with self.ledger.bucket(self.key) as bucket:
+                now = self.ledger.clock()
+                self._roll_window(bucket, now)
+                waiters = bucket["waiters"]
+                for other, seen in list(waiters.items()):
+                    if now - seen > STALE_WAITER_AFTER:
+                        del waiters[other]
+                if ticket is not None:
+                    waiters[ticket] = now
+                first = min(waiters, key=int) if waiters else None
+
+                if bucket["remaining"] is None:
+                    waiters.pop(ticket, None)
+                    return
+                if bucket["remaining"] > 0 and first in (None, ticket):
+                    bucket["remaining"] -= 1
+                    waiters.pop(ticket, None)
+                    return
+                if bucket["remaining"] <= 0 and bucket["reset_at"] is None:
+                    # The quota is used up but the reset time is unknown; wait for a fresh header.
+                    bucket["remaining"] = None
+                    waiters.pop(ticket, None)
+                    return
+                if ticket is None:
+                    ticket = str(bucket["next_ticket"])
+                    bucket["next_ticket"] += 1
+                    waiters[ticket] = now
+                if bucket["remaining"] > 0:
+                    delay = TURN_POLL_INTERVAL
+                else:
+                    delay = min(MAX_POLL_INTERVAL, bucket["reset_at"] - now)
+            self._sleep(delay)
+
+    def update(self, headers):
+        """
+        Updates the shared quota from the headers of an API response.
+
+        Args:
+            headers (dict): The response headers.
+        """
+        try:
+            remaining = int(headers.get("X-Rl"))
+            reset_in = int(headers.get("X-Ttl"))
+        except (TypeError, ValueError):
+            return
+
+        with self.ledger.bucket(self.key) as bucket:
+            now = self.ledger.clock()
+            bucket["limit"] = max(bucket["limit"] or 0, remaining + 1)
+            if bucket["remaining"] is None or bucket["reset_at"] is None or now >= bucket["reset_at"]:
+                bucket["remaining"] = remaining
+            else:
+                # Requests in flight in any process were already reserved, so keep the lower count.
+                bucket["remaining"] = min(bucket["remaining"], remaining)
+            bucket["reset_at"] = now + reset_in
+
+    def exhaust(self, reset_in=None):
+        """
+        Marks the shared quota as used up, e.g. after an HTTP 429 response.
+
+        Args:
+            reset_in (int, optional): Seconds until the window resets, if the response did not report it.
+        """
+        with self.ledger.bucket(self.key) as bucket:
+            bucket["remaining"] = 0
+            if reset_in is not None:
+                bucket["reset_at"] = self.ledger.clock() + reset_in
+            elif bucket["reset_at"] is None:
+                bucket["reset_at"] = self.ledger.clock() + 60
@@ -0,0 +1,98 @@
+import threading
+import time
+
+class RateLimiter:
+    """Paces API requests using the quota reported in ip-api's X-Rl and X-Ttl headers."""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initializes the RateLimiter class.
+
+        Args:
+            clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+            sleep (callable, optional): Sleeps for the given number of seconds. Defaults to time.sleep.
+        """
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._limit = None
+        self._remaining = None
+        self._reset_at = None
+
+    @property
+    def quota(self):
+        """
+        Returns the current quota state.
+
+        Returns:
+            dict: 'limit', 'remaining' and 'reset_in' (seconds), each None while unknown.
+        """
+        with self._lock:
+            self._roll_window(self._clock())
+            reset_in = None if self._reset_at is None else max(0.0, self._reset_at - self._clock())
+            return {"limit": self._limit, "remaining": self._remaining, "reset_in": reset_in}
+
+    def _roll_window(self, now):
+        """Starts a new window once the reported reset time has passed."""
+        if self._reset_at is not None and now >= self._reset_at:
+            self._remaining = self._limit
+            self._reset_at = None
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent without exceeding the quota and reserves it.
+
+        When the quota is used up, this sleeps until the window resets.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._roll_window(now)
+                if self._remaining is None:
+                    return
+                if self._remaining > 0:
+                    self._remaining -= 1
+                    return
+                if self._reset_at is None:
+                    # The quota is used up but the reset time is unknown; wait for a fresh header.
+                    self._remaining = None
+                    return
+                delay = self._reset_at - now
+            self._sleep(delay)
+
+    def update(self, headers):
+        """
+        Updates the quota from the headers of an API response.
+
+        Args:
+            headers (dict): The response headers.
+        """
+        try:
+            remaining = int(headers.get("X-Rl"))
+            reset_in = int(headers.get("X-Ttl"))
+        except (TypeError, ValueError):
+            return
+
+        with self._lock:
+            now = self._clock()
+            self._limit = max(self._limit or 0, remaining + 1)
+            if self._remaining is None or self._reset_at is None or now >= self._reset_at:
+                self._remaining = remaining
+            else:
+                # Requests still in flight were already reserved, so keep the lower count.
+                self._remaining = min(self._remaining, remaining)
+            self._reset_at = now + reset_in
+
+    def exhaust(self, reset_in=None):
+        """
+        Marks the quota as used up, e.g. after an HTTP 429 response.
+
+        Args:
+            reset_in (int, optional): Seconds until the window resets, if the response did not report it.
+        """
+        with self._lock:
+            self._remaining = 0
+            if reset_in is not None:
+                self._reset_at = self._clock() + reset_in
+            elif self._reset_at is None:
+                self._reset_at = self._clock() + 60
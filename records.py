@@ -0,0 +1,112 @@
+from collections.abc import MutableMapping
+import sys
+
+# The fields of an ip-api response in the order the API returns them, then the ones whatsip adds.
+RECORD_FIELDS = (
+    "status", "message", "continent", "continentCode", "country", "countryCode", "region", "regionName",
+    "city", "district", "zip", "lat", "lon", "timezone", "offset", "currency", "isp", "org", "as",
+    "asname", "reverse", "mobile", "proxy", "hosting", "query", "display_ip", "hits"
+)
+# Text fields whose values repeat across many records; every record shares one copy of each value.
+INTERNED_FIELDS = frozenset((
+    "status", "continent", "continentCode", "country", "countryCode", "region", "regionName", "city",
+    "district", "zip", "timezone", "currency", "isp", "org", "as", "asname"
+))
+_SLOTTED = frozenset(RECORD_FIELDS)
+# Tells an unset slot from one set to None.
+_missing = object()
+
+class IPRecord(MutableMapping):
+    """
+    The result of a lookup, stored compactly.
+
+    Known fields live in slots instead of a per-record hash table, and repeated text such as the
+    country or ISP is interned, so a record costs a fraction of the dictionary it was built from.
+    Fields that ip-api does not define are kept in a small dictionary of their own. Records behave
+    like dictionaries (get, in, items, update, ==), so themes and writers can use either.
+    """
+
+    __slots__ = RECORD_FIELDS + ("_extra",)
+
+    def __init__(self, data=(), **kwargs):
+        """
+        Initializes the IPRecord class.
+
+        Args:
+            data (dict or iterable, optional): The fields of the record, as for dict(). Defaults to ().
+            **kwargs: More fields.
+        """
+        self._extra = None
+        self.update(data, **kwargs)
+
+    def __getitem__(self, key):
+        if key in _SLOTTED:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _SLOTTED:
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _SLOTTED:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for key in RECORD_FIELDS:
+            if getattr(self, key, _missing) is not _missing:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        if key in _SLOTTED:
+            return getattr(self, key, _missing) is not _missing
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        if key in _SLOTTED:
+            return getattr(self, key, default)
+        if self._extra is None:
+            return default
+        return self._extra.get(key, default)
+
+    def __repr__(self):
+        return f"IPRecord({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        self.update(state)
+
+    def to_dict(self):
+        """
+        Returns the record as a plain dictionary, e.g. for json.dumps().
+
+        Returns:
+            dict: The fields of the record, in ip-api's order.
+        """
+        return {key: self[key] for key in self}
@@ -0,0 +1,177 @@
+from collections import Counter
+from functools import lru_cache
+import ipaddress
+import mmap
+import os
+import re
+
+# Files are split into chunks of about this size at line boundaries; each chunk is scanned on its own.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Dotted quads that are not part of a longer number, dotted sequence or path (such as Chrome/120.0.0.0).
+# Octets are checked when candidates are validated; leaving them out of the pattern (and scanning IPv4
+# and IPv6 in separate passes) keeps the regex fast.
+IPV4_PATTERN = re.compile(rb"\b(?<![./])\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b(?!\.\d)")
+# Anything that looks like an IPv6 address. Not preceded by '/', so timestamps such as
+# 10/Oct/2024:13:55:36 are skipped instead of being validated later. Forms with a dotted quad at
+# the end (::ffff:1.2.3.4) are left to the IPv4 pattern, so they are counted once, as IPv4.
+IPV6_PATTERN = re.compile(rb"(?<![\w:./])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?![\w:.])")
+
+@lru_cache(maxsize=8)
+def compile_regex(pattern):
+    """
+    Compiles a --regex pattern for scanning bytes.
+
+    Args:
+        pattern (str): The regular expression.
+
+    Returns:
+        Pattern: The compiled pattern, in multiline mode.
+    """
+    return re.compile(pattern.encode("utf-8"), re.MULTILINE)
+
+def chunk_bounds(data, chunk_size=CHUNK_SIZE):
+    """
+    Splits a buffer into chunks that end at line boundaries.
+
+    Args:
+        data (mmap or bytes): The file contents.
+        chunk_size (int, optional): The approximate size of a chunk. Defaults to CHUNK_SIZE.
+
+    Returns:
+        list: (start, end) offsets covering the whole buffer.
+    """
+    bounds = []
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b"\n", min(start + chunk_size, size))
+        end = size if end == -1 else end + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def count_addresses(data, start, end, column=None, regex=None):
+    """
+    Counts the address candidates in part of a buffer.
+
+    Args:
+        data (mmap or bytes): The file contents.
+        start (int): The offset to start at, at the beginning of a line.
+        end (int): The offset to stop at, at the end of a line.
+        column (int, optional): Only look at this whitespace-separated column, starting at 1. Defaults to None.
+        regex (str, optional): Only take what this pattern matches: its 'ip' group, its first group,
+                               or the whole match. Defaults to None.
+
+    Returns:
+        Counter: The number of times each candidate (bytes) occurs. Candidates are not validated yet.
+    """
+    if regex is not None:
+        pattern = compile_regex(regex)
+        if "ip" in pattern.groupindex:
+            group = "ip"
+        else:
+            group = 1 if pattern.groups else 0
+        return Counter(match.group(group) for match in pattern.finditer(data, start, end))
+
+    if column is None:
+        # Neither pattern has groups, so findall() returns whole matches straight into the Counter.
+        counts = Counter(IPV4_PATTERN.findall(data, start, end))
+        counts.update(IPV6_PATTERN.findall(data, start, end))
+        return counts
+
+    counts = Counter()
+    index = column - 1
+    for line in data[start:end].split(b"\n"):
+        fields = line.split(None, column)
+        if len(fields) > index:
+            counts.update(IPV4_PATTERN.findall(fields[index]) or IPV6_PATTERN.findall(fields[index]))
+    return counts
+
+def scan_chunk(path, start, end, column=None, regex=None):
+    """
+    Counts the address candidates in one chunk of a file. Runs in a worker process.
+
+    Args:
+        path (str): The path of the file.
+        start (int): The offset of the chunk.
+        end (int): The end offset of the chunk.
+        column (int, optional): As in count_addresses. Defaults to None.
+        regex (str, optional): As in count_addresses. Defaults to None.
+
+    Returns:
+        Counter: The number of times each candidate occurs in the chunk.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return count_addresses(data, start, end, column, regex)
+
+def normalize(counts):
+    """
+    Drops candidates that are not IP addresses and merges different spellings of the same address.
+
+    Args:
+        counts (Counter): Candidate counts, with bytes keys.
+
+    Returns:
+        Counter: The counts by address, in the form ip-api reports as 'query' (e.g. compressed IPv6).
+    """
+    addresses = Counter()
+    for candidate, count in counts.items():
+        if not candidate:
+            continue
+        try:
+            address = ipaddress.ip_address(candidate.decode("ascii").strip("[]"))
+        except (UnicodeDecodeError, ValueError):
+            continue
+        if address.version == 6 and address.ipv4_mapped is not None:
+            # Dual-stack servers log IPv4 clients as ::ffff:a.b.c.d.
+            address = address.ipv4_mapped
+        addresses[str(address)] += count
+    return addresses
+
+def scan_files(paths, column=None, regex=None, jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    Counts the IP addresses in files, reading each one once through a memory map.
+
+    Files larger than one chunk are split at line boundaries and the chunks are scanned
+    in parallel by a pool of processes.
+
+    Args:
+        paths (list): The files to scan.
+        column (int, optional): Only look at this whitespace-separated column, starting at 1. Defaults to None.
+        regex (str, optional): Only take what this pattern matches: its 'ip' group, its first group,
+                               or the whole match. Defaults to None.
+        jobs (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        chunk_size (int, optional): The approximate size of a chunk. Defaults to CHUNK_SIZE.
+
+    Returns:
+        Counter: The number of times each address was seen, most frequent first via most_common().
+    """
+    if regex is not None:
+        # Fail on a bad pattern here rather than in every worker.
+        compile_regex(regex)
+    jobs = jobs or os.cpu_count() or 1
+
+    counts = Counter()
+    tasks = []
+    for path in paths:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                bounds = chunk_bounds(data, chunk_size)
+                if len(bounds) == 1 or jobs == 1:
+                    for start, end in bounds:
+                        counts.update(count_addresses(data, start, end, column, regex))
+                else:
+                    tasks.extend((path, start, end) for start, end in bounds)
+
+    if tasks:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            futures = [executor.submit(scan_chunk, path, start, end, column, regex) for path, start, end in tasks]
+            for future in futures:
+                counts.update(future.result())
+
+    return normalize(counts)
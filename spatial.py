@@ -0,0 +1,373 @@
+import heapq
+import math
+import re
+
+EARTH_RADIUS_KM = 6371.0088
+# Points per leaf of the k-d tree; leaves are scanned one point after another.
+LEAF_SIZE = 16
+DISTANCE_UNITS = {"km": 1.0, "m": 0.001, "mi": 1.609344}
+DEFAULT_CLUSTER_RADIUS_KM = 50.0
+# How many records of an NDJSON file are held back for patches with their deferred fields.
+PATCH_WINDOW = 1000
+# The columns of a cluster, as written to CSV, TSV and text files.
+CLUSTER_FIELDS = ("cluster", "size", "locations", "lat", "lon", "radius_km", "country", "city", "ips")
+
+def parse_distance(text):
+    """
+    Parses a distance such as '50km', '500m', '10mi' or '50' (kilometres).
+
+    Args:
+        text (str): The distance.
+
+    Returns:
+        float: The distance in kilometres.
+
+    Raises:
+        ValueError: If the distance is malformed or negative.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?|\.\d+)\s*(km|mi|m)?\s*", text.lower())
+    if match is None:
+        raise ValueError(f"'{text}' is not a distance like 50km, 500m or 10mi")
+    return float(match.group(1)) * DISTANCE_UNITS[match.group(2) or "km"]
+
+def parse_location(text):
+    """
+    Parses a location given as 'LAT,LON' in degrees.
+
+    Args:
+        text (str): The location.
+
+    Returns:
+        tuple: (lat, lon) as floats.
+
+    Raises:
+        ValueError: If the location is malformed or out of range.
+    """
+    try:
+        lat, lon = (float(part) for part in text.split(","))
+    except ValueError:
+        raise ValueError(f"'{text}' is not a location like 52.52,13.40") from None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"'{text}' is out of range; latitude must be within ±90 and longitude within ±180")
+    return lat, lon
+
+def to_vector(lat, lon):
+    """Returns the point on the unit sphere for a latitude and longitude in degrees."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+def chord_to_km(chord):
+    """Returns the great-circle distance for a straight-line distance between points on the unit sphere."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+def km_to_chord(km):
+    """Returns the straight-line distance on the unit sphere for a great-circle distance."""
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+class GeoIndex:
+    """
+    A spatial index over lookup results, for radius, nearest-neighbour and clustering queries.
+
+    Results are indexed by location: IP geolocation is city-level, so millions of results usually
+    share far fewer distinct coordinates, and each coordinate is one point of the index however many
+    results it has. Points are kept as 3D unit vectors in a k-d tree, which avoids special cases at
+    the poles and the antimeridian, since straight-line distance between unit vectors grows with
+    great-circle distance.
+    """
+
+    def __init__(self, records):
+        """
+        Initializes the GeoIndex class.
+
+        Args:
+            records (iterable): IP information dictionaries. Those without 'lat' and 'lon' are counted in
+                                'skipped' and left out.
+        """
+        self.locations = []
+        self.records = []
+        self.vectors = []
+        self.skipped = 0
+        point_of = {}
+        for data in records:
+            try:
+                location = (float(data["lat"]), float(data["lon"]))
+            except (KeyError, TypeError, ValueError):
+                self.skipped += 1
+                continue
+            point = point_of.get(location)
+            if point is None:
+                point = point_of[location] = len(self.locations)
+                self.locations.append(location)
+                self.records.append([])
+                self.vectors.append(to_vector(*location))
+            self.records[point].append(data)
+
+        # The tree is stored in flat lists: each node covers order[start:end]; inner nodes split it
+        # in half at a plane across one axis.
+        self.order = list(range(len(self.vectors)))
+        self._columns = tuple(list(column) for column in zip(*self.vectors)) if self.vectors else ((), (), ())
+        self._start, self._end, self._axis, self._split, self._children = [], [], [], [], []
+        if self.vectors:
+            self._build(0, len(self.order))
+
+    def __len__(self):
+        return sum(len(records) for records in self.records)
+
+    def _build(self, start, end):
+        """Builds the node for order[start:end] and its subtree, and returns its index."""
+        node = len(self._start)
+        self._start.append(start)
+        self._end.append(end)
+        self._axis.append(None)
+        self._split.append(None)
+        self._children.append(None)
+        if end - start > LEAF_SIZE:
+            # Split at the median of the axis with the largest spread, judged from a sample of the points.
+            indexes = self.order[start:end]
+            sample = indexes[::max(1, len(indexes) // 256)]
+            spreads = []
+            for column in self._columns:
+                values = list(map(column.__getitem__, sample))
+                spreads.append(max(values) - min(values))
+            axis = spreads.index(max(spreads))
+            column = self._columns[axis]
+            self.order[start:end] = sorted(indexes, key=column.__getitem__)
+            middle = (start + end) // 2
+            self._axis[node] = axis
+            self._split[node] = column[self.order[middle]]
+            self._children[node] = (self._build(start, middle), self._build(middle, end))
+        return node
+
+    def _nearest_points(self, vector, max_chord=2.0):
+        """
+        Yields the points of the index from nearest to farthest.
+
+        Nodes and points share one priority queue, keyed by the least distance anything in them can
+        have, so the search only opens the nodes that can hold the next point and stops as soon as
+        the caller does.
+
+        Args:
+            vector (tuple): The query point as a unit vector.
+            max_chord (float, optional): Stop at points farther than this straight-line distance. Defaults to 2.0.
+
+        Yields:
+            tuple: (chord, point), the straight-line distance and the index of the point.
+        """
+        if not self.vectors:
+            return
+        limit = max_chord * max_chord
+        x, y, z = vector
+        vectors = self.vectors
+        queue = [(0.0, 0, True)]
+        while queue:
+            distance, item, is_node = heapq.heappop(queue)
+            if distance > limit:
+                return
+            if not is_node:
+                yield math.sqrt(distance), item
+                continue
+            children = self._children[item]
+            if children is None:
+                for point in self.order[self._start[item]:self._end[item]]:
+                    px, py, pz = vectors[point]
+                    point_distance = (px - x) * (px - x) + (py - y) * (py - y) + (pz - z) * (pz - z)
+                    if point_distance <= limit:
+                        heapq.heappush(queue, (point_distance, point, False))
+                continue
+            # The child on the query's side of the plane is as near as its parent; the other one
+            # is at least as far as the plane.
+            offset = vector[self._axis[item]] - self._split[item]
+            near, far = (children[1], children[0]) if offset >= 0 else children
+            heapq.heappush(queue, (distance, near, True))
+            far_distance = max(distance, offset * offset)
+            if far_distance <= limit:
+                heapq.heappush(queue, (far_distance, far, True))
+
+    def within(self, lat, lon, radius_km):
+        """
+        Finds the results within a distance of a location.
+
+        Args:
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+            radius_km (float): The distance in kilometres.
+
+        Returns:
+            list: (distance_km, data) pairs, nearest first.
+        """
+        return [
+            (chord_to_km(chord), data)
+            for chord, point in self._nearest_points(to_vector(lat, lon), km_to_chord(radius_km))
+            for data in self.records[point]
+        ]
+
+    def nearest(self, lat, lon, k, radius_km=None):
+        """
+        Finds the results nearest to a location.
+
+        Args:
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+            k (int): The number of results to return.
+            radius_km (float, optional): Only consider results within this distance. Defaults to None.
+
+        Returns:
+            list: Up to k (distance_km, data) pairs, nearest first.
+        """
+        max_chord = km_to_chord(radius_km) if radius_km is not None else 2.0
+        found = []
+        for chord, point in self._nearest_points(to_vector(lat, lon), max_chord):
+            distance = chord_to_km(chord)
+            found.extend((distance, data) for data in self.records[point][:k - len(found)])
+            if len(found) >= k:
+                break
+        return found
+
+    def clusters(self, radius_km):
+        """
+        Groups the results by location.
+
+        The location with the most results that is not in a cluster yet starts a new cluster, which
+        takes every location within radius_km of it that is not in a cluster yet. Clusters are
+        therefore centred on the busiest places and are at most twice radius_km across.
+
+        Args:
+            radius_km (float): The radius of a cluster in kilometres.
+
+        Returns:
+            list: One dictionary per cluster, the largest first, with 'cluster' (its number), 'size'
+                  (the number of results), 'locations', 'lat' and 'lon' (its weighted centre), 'radius_km'
+                  (the distance from the centre to its farthest location), 'country', 'city' and 'ips'.
+        """
+        max_chord = km_to_chord(radius_km)
+        assigned = [False] * len(self.locations)
+        clusters = []
+        for seed in sorted(range(len(self.locations)), key=lambda p: len(self.records[p]), reverse=True):
+            if assigned[seed]:
+                continue
+            members = []
+            for _, point in self._nearest_points(self.vectors[seed], max_chord):
+                if not assigned[point]:
+                    assigned[point] = True
+                    members.append(point)
+            clusters.append(self._describe(members))
+
+        clusters.sort(key=lambda cluster: cluster["size"], reverse=True)
+        for number, cluster in enumerate(clusters, 1):
+            cluster["cluster"] = number
+        return clusters
+
+    def _describe(self, points):
+        """Returns the summary of a cluster of points, as listed by clusters()."""
+        size = sum(len(self.records[p]) for p in points)
+        # The centre is the normalized mean of the unit vectors, weighted by the results at each point.
+        x, y, z = (sum(self.vectors[p][axis] * len(self.records[p]) for p in points) for axis in range(3))
+        norm = math.sqrt(x * x + y * y + z * z) or 1.0
+        centre = (x / norm, y / norm, z / norm)
+        lat = math.degrees(math.asin(max(-1.0, min(1.0, centre[2]))))
+        lon = math.degrees(math.atan2(centre[1], centre[0]))
+        spread = max(
+            chord_to_km(math.sqrt(sum((a - b) ** 2 for a, b in zip(self.vectors[p], centre))))
+            for p in points
+        )
+        busiest = self.records[points[0]][0]
+        return {
+            "cluster": 0,
+            "size": size,
+            "locations": len(points),
+            "lat": round(lat, 4),
+            "lon": round(lon, 4),
+            "radius_km": round(spread, 1),
+            "country": busiest.get("country", ""),
+            "city": busiest.get("city", ""),
+            "ips": [data.get("query") or data.get("display_ip", "") for p in points for data in self.records[p]],
+        }
+
+def render_clusters(clusters, total, config):
+    """
+    Builds a table of clusters.
+
+    Args:
+        clusters (list): The clusters to show, as returned by GeoIndex.clusters.
+        total (int): The number of clusters found, including those not shown.
+        config (dict): The configuration dictionary.
+
+    Returns:
+        Table: The rich table.
+    """
+    from rich.box import ROUNDED
+    from rich.table import Table
+    from config import BASE_DEFAULT_CONFIG
+
+    style = config.get("style", BASE_DEFAULT_CONFIG["style"])
+    caption = f"{total} clusters" if len(clusters) == total else f"The {len(clusters)} largest of {total} clusters"
+    table = Table(box=ROUNDED, caption=caption, header_style=style.get("header", "bold white on blue"))
+    table.add_column("#", style="bold", justify="right")
+    for header in ("Size", "Lat", "Lon", "Radius km"):
+        table.add_column(header, justify="right", style=style.get("field_value", "white"))
+    for header in ("Country", "City", "IPs"):
+        table.add_column(header, style=style.get("field_value", "white"))
+    for cluster in clusters:
+        ips = cluster["ips"]
+        sample = ips[0] + (f" +{len(ips) - 1}" if len(ips) > 1 else "")
+        table.add_row(*(str(cluster[field]) for field in ("cluster", "size", "lat", "lon", "radius_km", "country", "city")), sample)
+    return table
+
+def _saved_record(item):
+    """Returns a saved result as an IPRecord with its status and 'display_ip' restored."""
+    from records import IPRecord
+
+    record = IPRecord(item, status="success")
+    if "display_ip" not in record:
+        record["display_ip"] = record.get("query", "N/A")
+    return record
+
+def read_records(path):
+    """
+    Reads saved lookup results: NDJSON from --ndjson or -o results.ndjson, a JSON file from -o, or CSV/TSV.
+
+    Deferred fields written as 'patch' records are merged into their record; failed lookups are skipped.
+
+    Args:
+        path (str): The file to read.
+
+    Yields:
+        IPRecord: The successful results.
+    """
+    import csv
+    import json
+    import os
+
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="" if ext in (".csv", ".tsv") else None) as f:
+        if ext in (".csv", ".tsv"):
+            for row in csv.DictReader(f, delimiter="\t" if ext == ".tsv" else ","):
+                yield _saved_record({key: value for key, value in row.items() if value != ""})
+            return
+        if ext == ".json":
+            data = json.load(f)
+            for item in (data if isinstance(data, list) else [data]):
+                if item.get("status", "success") == "success":
+                    yield _saved_record(item)
+            return
+
+        # A patch follows its record closely, so only the latest records are held back for one.
+        waiting = {}
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            status = item.get("status", "success")
+            if status == "patch":
+                record = waiting.get(item.get("query"))
+                if record is not None:
+                    record.update((key, value) for key, value in item.items() if key not in ("status", "query"))
+            elif status == "success":
+                record = _saved_record(item)
+                previous = waiting.pop(record["display_ip"], None)
+                if previous is not None:
+                    yield previous
+                waiting[record["display_ip"]] = record
+                if len(waiting) > PATCH_WINDOW:
+                    yield waiting.pop(next(iter(waiting)))
+        yield from waiting.values()
@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import io
+from rich.console import Console
+
+# Add the parent directory to the path so that we can import the aggregate and writers modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregate import Aggregator, ReportDisplay
+from display import DisplayManager
+from writers import write_summary
+from config import BASE_DEFAULT_CONFIG
+
+RESULTS = [
+    {"status": "success", "country": "United States", "proxy": True, "hosting": True, "mobile": False},
+    {"status": "success", "country": "Germany", "proxy": False, "hosting": True, "mobile": False, "hits": 3},
+    {"status": "success", "country": "United States", "proxy": False, "hosting": False, "mobile": True},
+    {"status": "success", "country": "France", "proxy": False, "hosting": False, "mobile": False},
+    {"status": "success", "proxy": False, "hosting": False, "mobile": False},
+    {"status": "fail", "message": "private range"},
+]
+
+class TestAggregator(unittest.TestCase):
+    """Test cases for the Aggregator class."""
+
+    def summarize(self, top=None):
+        aggregator = Aggregator("country")
+        for data in RESULTS:
+            aggregator.add(data)
+        aggregator.add_error("8.8.8.8", "timed out")
+        return aggregator.summarize(top)
+
+    def test_summary(self):
+        """Test that groups are weighted by hits, ordered by size and carry their flag shares."""
+        summary = self.summarize()
+        self.assertEqual((summary["total"], summary["failed"], summary["groups"]), (7, 2, 4))
+        self.assertEqual([(row["country"], row["count"]) for row in summary["rows"]],
+                         [("Germany", 3), ("United States", 2), ("France", 1), ("Unknown", 1)])
+        self.assertEqual(summary["rows"][1], {"country": "United States", "count": 2, "percent": 28.6, "proxy": 50.0, "hosting": 50.0, "mobile": 50.0})
+        self.assertEqual((summary["proxy"], summary["hosting"], summary["mobile"]), (14.3, 57.1, 14.3))
+
+    def test_top_groups_and_other(self):
+        """Test that groups past the top ones are combined into 'Other'."""
+        rows = self.summarize(top=1)["rows"]
+        self.assertEqual([(row["country"], row["count"]) for row in rows], [("Germany", 3), ("Other", 4)])
+        self.assertEqual(rows[1]["hosting"], 25.0)
+
+    def test_python_totals_match_numpy(self):
+        """Test that the totals without NumPy are the same as with it."""
+        with patch.dict(sys.modules, {"numpy": None}):
+            summary = self.summarize()
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+        self.assertEqual(self.summarize(), summary)
+
+class TestReportDisplay(unittest.TestCase):
+    """Test cases for the report theme and --summary output."""
+
+    def test_report_theme(self):
+        """Test that the report theme prints one table with the requested flag columns."""
+        output = io.StringIO()
+        console = Console(file=output, width=120)
+        config = dict(BASE_DEFAULT_CONFIG, theme="report")
+
+        with DisplayManager(console).open_stream(config, ["country", "proxy"]) as stream:
+            self.assertIsInstance(stream, ReportDisplay)
+            for data in RESULTS:
+                stream.add(data)
+
+        text = output.getvalue()
+        self.assertIn("Summary by Country", text)
+        self.assertIn("Proxy %", text)
+        self.assertNotIn("Mobile %", text)
+        self.assertIn("│ Germany       │     3 │ 42.9 │     0.0 │", text)
+
+    def test_write_summary_csv(self):
+        """Test that a summary is written as one CSV row per group."""
+        aggregator = Aggregator("country")
+        for data in RESULTS[:3]:
+            aggregator.add(data)
+        stream = io.StringIO()
+        write_summary("summary.csv", stream, aggregator.summarize())
+        self.assertEqual(stream.getvalue().splitlines(), [
+            "country,count,percent,proxy,hosting,mobile",
+            "Germany,3,60.0,0.0,100.0,0.0",
+            "United States,2,40.0,50.0,50.0,50.0",
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
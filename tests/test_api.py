@@ -2,16 +2,19 @@ import unittest
 from unittest.mock import patch, Mock
 import sys
 import os
+import threading
+import requests
 
 # Add the parent directory to the path so that we can import the api module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api import IPInfoProvider
+from api import IPInfoProvider, PrefixCache
+from ratelimit import RateLimiter
 
 class TestIPInfoProvider(unittest.TestCase):
     """Test cases for the IPInfoProvider class."""
 
-    @patch('api.requests.get')
+    @patch('api.requests.Session.get')
     def test_get_ip_info_success(self, mock_get):
         """Test that get_ip_info returns the correct data on a successful request."""
         mock_response = Mock()
@@ -41,7 +44,7 @@ class TestIPInfoProvider(unittest.TestCase):
 
         self.assertEqual(ip_info, expected_data)
 
-    @patch('api.requests.get')
+    @patch('api.requests.Session.get')
     def test_get_ip_info_failure(self, mock_get):
         """Test that get_ip_info returns an error message on a failed request."""
         mock_get.side_effect = Exception("Test error")
@@ -50,6 +53,188 @@ class TestIPInfoProvider(unittest.TestCase):
         with self.assertRaises(Exception):
             ip_info_provider.get_ip_info("8.8.8.8")
 
+    @patch('api.requests.Session.post')
+    def test_get_ip_infos_batches(self, mock_post):
+        """Test that get_ip_infos splits the addresses into batches and keeps their order."""
+        def fake_post(url, json=None, params=None, timeout=None):
+            response = Mock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = [{"status": "success", "query": ip} for ip in json]
+            return response
+        mock_post.side_effect = fake_post
+
+        ips = [f"10.0.{i // 256}.{i % 256}" for i in range(250)]
+        ip_info_provider = IPInfoProvider()
+        ip_infos = ip_info_provider.get_ip_infos(ips, ["country", "query"])
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual([len(call.kwargs["json"]) for call in mock_post.call_args_list], [100, 100, 50])
+        self.assertEqual(mock_post.call_args.kwargs["params"], {"fields": "57345"})
+        self.assertEqual([info["display_ip"] for info in ip_infos], ips)
+
+    @patch('api.requests.Session.get')
+    def test_iter_ip_infos_concurrent_keeps_order_and_isolates_errors(self, mock_get):
+        """Test that concurrent lookups are yielded in input order and failures stay per IP."""
+        def fake_get(url, params=None, timeout=None):
+            ip = url.rsplit("/", 1)[-1]
+            if ip == "10.0.0.3":
+                raise requests.exceptions.Timeout()
+            response = Mock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = {"status": "success", "query": ip}
+            return response
+        mock_get.side_effect = fake_get
+
+        ips = [f"10.0.0.{i}" for i in range(20)]
+        ip_info_provider = IPInfoProvider()
+        outcomes = list(ip_info_provider.iter_ip_infos(ips, ["query"], workers=4))
+
+        self.assertEqual([ip for ip, _, _ in outcomes], ips)
+        self.assertIsInstance(outcomes[3][2], requests.exceptions.Timeout)
+        self.assertIsNone(outcomes[3][1])
+        self.assertTrue(all(data["query"] == ip for ip, data, error in outcomes if error is None))
+
+    @patch('api.requests.Session.get')
+    @patch('api.requests.Session.post')
+    def test_iter_ip_infos_does_not_wait_for_slow_input(self, mock_post, mock_get):
+        """Test that addresses read so far are looked up while the input stalls, in both lookup modes."""
+        def respond(payload):
+            response = Mock(status_code=200, headers={})
+            response.raise_for_status.return_value = None
+            response.json.return_value = payload
+            return response
+        mock_post.side_effect = lambda url, json=None, params=None, timeout=None: respond([{"status": "success", "query": ip} for ip in json])
+        mock_get.side_effect = lambda url, params=None, timeout=None: respond({"status": "success", "query": url.rsplit("/", 1)[-1]})
+
+        for workers in (1, 4):
+            release = threading.Event()
+            timed_out = []
+
+            def trickle():
+                yield "8.8.8.8"
+                yield "1.1.1.1"
+                # Like 'tail -f': the next line only comes once the first results were shown.
+                timed_out.append(not release.wait(5))
+                yield "9.9.9.9"
+
+            results = IPInfoProvider().iter_ip_infos(trickle(), ["query"], workers=workers)
+            first = [next(results)[0], next(results)[0]]
+            release.set()
+            self.assertEqual(first + [ip for ip, _, _ in results], ["8.8.8.8", "1.1.1.1", "9.9.9.9"])
+            self.assertEqual(timed_out, [False])
+        self.assertEqual(mock_post.call_args_list[0].kwargs["json"], ["8.8.8.8", "1.1.1.1"])
+
+    @patch('api.requests.Session.get')
+    def test_get_ip_info_waits_and_retries_after_429(self, mock_get):
+        """Test that an HTTP 429 response makes the provider wait for the window reset and retry."""
+        throttled = Mock(status_code=429, headers={"X-Rl": "0", "X-Ttl": "7"})
+        success = Mock(status_code=200, headers={"X-Rl": "44", "X-Ttl": "60"})
+        success.raise_for_status.return_value = None
+        success.json.return_value = {"status": "success", "query": "8.8.8.8"}
+        mock_get.side_effect = [throttled, success]
+
+        now = [0.0]
+        sleeps = []
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        ip_info_provider = IPInfoProvider()
+        ip_info_provider.rate_limiter = RateLimiter(clock=lambda: now[0], sleep=fake_sleep)
+        ip_info = ip_info_provider.get_ip_info("8.8.8.8")
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(sleeps, [7.0])
+        self.assertEqual(ip_info["query"], "8.8.8.8")
+        self.assertEqual(ip_info_provider.quota["single"]["remaining"], 44)
+
+    def test_session_is_pooled_and_closed(self):
+        """Test that the provider reuses one pooled session and closes it on exit."""
+        with IPInfoProvider(pool_size=4, retries=2) as ip_info_provider:
+            session = ip_info_provider.session
+            self.assertIs(ip_info_provider.session, session)
+            adapter = session.get_adapter("http://ip-api.com/json/")
+            self.assertEqual(adapter._pool_maxsize, 4)
+            self.assertEqual(adapter.max_retries.total, 2)
+
+        self.assertIsNone(ip_info_provider._session)
+
+    @patch('api.requests.Session.post')
+    def test_get_ip_infos_reuses_prefix_results(self, mock_post):
+        """Test that one address per prefix is requested and duplicates collapse into one lookup."""
+        def fake_post(url, json=None, params=None, timeout=None):
+            response = Mock(status_code=200, headers={})
+            response.raise_for_status.return_value = None
+            response.json.return_value = [{"status": "success", "query": ip, "country": "Testland", "isp": ip.rsplit(".", 1)[0]} for ip in json]
+            return response
+        mock_post.side_effect = fake_post
+
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.1.1", "10.0.0.1", "2001:db8::1", "2001:db8::2"]
+        ip_info_provider = IPInfoProvider(prefix_cache=PrefixCache())
+        ip_infos = ip_info_provider.get_ip_infos(ips, ["country", "isp", "query"])
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(mock_post.call_args.kwargs["json"], ["10.0.0.1", "10.0.1.1", "2001:db8::1"])
+        self.assertEqual([info["query"] for info in ip_infos], ips)
+        self.assertEqual(ip_infos[1]["isp"], "10.0.0")
+        self.assertEqual(ip_infos[2]["isp"], "10.0.1")
+
+    @patch('api.requests.Session.get')
+    def test_get_ip_info_fetches_only_host_fields_for_known_prefix(self, mock_get):
+        """Test that a known prefix only needs the per-host fields to be fetched."""
+        def fake_get(url, params=None, timeout=None):
+            ip = url.rsplit("/", 1)[-1]
+            response = Mock(status_code=200, headers={})
+            response.raise_for_status.return_value = None
+            response.json.return_value = {"status": "success", "country": "Testland", "reverse": f"host-{ip}", "query": ip}
+            return response
+        mock_get.side_effect = fake_get
+
+        ip_info_provider = IPInfoProvider(prefix_cache=PrefixCache())
+        ip_info_provider.get_ip_info("10.0.0.1", ["country", "reverse", "query"])
+        ip_info = ip_info_provider.get_ip_info("10.0.0.2", ["country", "reverse", "query"])
+
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"fields": "53248"})
+        self.assertEqual(ip_info["reverse"], "host-10.0.0.2")
+        self.assertEqual(ip_info["query"], "10.0.0.2")
+        self.assertEqual(ip_info["country"], "Testland")
+
+    @patch('api.requests.Session.post')
+    def test_flags_are_not_shared_across_a_prefix(self, mock_post):
+        """Test that proxy, hosting and mobile are looked up for each address instead of copied from a neighbour."""
+        def fake_post(url, json=None, params=None, timeout=None):
+            response = Mock(status_code=200, headers={})
+            response.raise_for_status.return_value = None
+            response.json.return_value = [{"status": "success", "query": ip, "country": "Testland", "proxy": ip.endswith(".2"),
+                                           "hosting": False, "mobile": False} for ip in json]
+            return response
+        mock_post.side_effect = fake_post
+
+        prefix_cache = PrefixCache()
+        ip_info_provider = IPInfoProvider(prefix_cache=prefix_cache)
+        ip_infos = ip_info_provider.get_ip_infos(["10.0.0.1", "10.0.0.2"], ["country", "proxy"])
+
+        self.assertEqual(mock_post.call_args.kwargs["json"], ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual([info["proxy"] for info in ip_infos], [False, True])
+        data, missing_host_fields = prefix_cache.get("10.0.0.3", ["country", "proxy", "hosting", "mobile"])
+        self.assertEqual(data, {"status": "success", "country": "Testland"})
+        self.assertEqual(missing_host_fields, ["proxy", "hosting", "mobile"])
+
+        # A fresh lookup replaces the flags remembered for an address.
+        prefix_cache.set("10.0.0.2", {"status": "success", "query": "10.0.0.2", "proxy": False})
+        data, missing_host_fields = prefix_cache.get("10.0.0.2", ["country", "proxy"])
+        self.assertEqual((data["proxy"], missing_host_fields), (False, []))
+
+    def test_default_fields_are_fetched_in_one_batch(self):
+        """Test that without a field list, addresses of one prefix go in one batch instead of a round each."""
+        ips = [f"8.8.8.{i}" for i in range(1, 6)]
+        ip_info_provider = IPInfoProvider(prefix_cache=PrefixCache())
+        with patch.object(IPInfoProvider, '_fetch_batch', side_effect=lambda chunk, fields: [{"status": "success", "query": ip} for ip in chunk]) as mock_fetch:
+            ip_infos = ip_info_provider.get_ip_infos(ips)
+
+        self.assertEqual([call.args[0] for call in mock_fetch.call_args_list], [ips])
+        self.assertEqual([info["query"] for info in ip_infos], ips)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+
+# Add the parent and benchmarks directories to the path so that we can import the benchmark modules
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+from api import IPInfoProvider
+from run import bench_lookups
+from stub_server import StubServer, fake_record, project
+
+class TestStubServer(unittest.TestCase):
+    """Test cases for the stub ip-api server."""
+
+    def test_project_reads_names_and_masks(self):
+        """Test that 'fields' is understood both as field names and as the numeric bitmask the provider sends."""
+        record = fake_record("8.8.8.8")
+        expected = {"status": "success", "country": record["country"], "query": "8.8.8.8"}
+        self.assertEqual(project(record, "country,query"), expected)
+        self.assertEqual(project(record, str(1 + 8192 + 16384 + 32768)), expected)
+        self.assertEqual(project(record, ""), record)
+
+    def test_provider_gets_the_requested_fields(self):
+        """Test that single and batch lookups against the stub only return the requested fields."""
+        with StubServer() as server:
+            with IPInfoProvider(base_url=server.base_url, batch_url=server.batch_url) as ip_info_provider:
+                single = ip_info_provider.get_ip_info("8.8.8.8", ["country", "reverse"])
+                batch = ip_info_provider.get_ip_infos(["8.8.8.8", "1.1.1.1"], ["city"])
+
+        self.assertEqual(set(single) - {"display_ip"}, {"status", "country", "reverse"})
+        self.assertEqual([set(data) - {"display_ip"} for data in batch], [{"status", "city"}] * 2)
+
+class TestLookupBenchmark(unittest.TestCase):
+    """Test cases for the lookup benchmarks."""
+
+    def test_every_path_reports_percentiles(self):
+        """Test that the single, concurrent and batch paths all report latency percentiles."""
+        with StubServer() as server:
+            results = bench_lookups(server, count=20, workers=4)
+
+        for path in ("single", "concurrent", "batch"):
+            self.assertIsNotNone(results[path]["p50_ms"], path)
+            self.assertIsNotNone(results[path]["p99_ms"], path)
+            self.assertLessEqual(results[path]["p50_ms"], results[path]["p99_ms"])
+        self.assertEqual(results["concurrent"]["errors"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+import tempfile
+import sqlite3
+import threading
+
+# Add the parent directory to the path so that we can import the cache and api modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LookupCache
+from api import IPInfoProvider
+
+class TestLookupCache(unittest.TestCase):
+    """Test cases for the LookupCache class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_returns_stored_payload(self):
+        """Test that a stored payload is returned for the same IP and field set."""
+        cache = LookupCache(self.path)
+        payload = {"status": "success", "country": "United States", "query": "8.8.8.8"}
+        cache.set("8.8.8.8", ["query", "country"], payload)
+
+        self.assertEqual(cache.get("8.8.8.8", ["country", "query"]), payload)
+        self.assertIsNone(cache.get("8.8.8.8", ["country"]))
+        cache.close()
+
+        cache = LookupCache(self.path)
+        self.assertEqual(cache.get("8.8.8.8", ["country", "query"]), payload)
+        cache.close()
+
+    def test_expired_entries_are_ignored(self):
+        """Test that entries older than the TTL are not returned."""
+        cache = LookupCache(self.path, ttl=60)
+        with patch('cache.time.time', return_value=1000.0):
+            cache.set("8.8.8.8", None, {"status": "success"})
+        with patch('cache.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get("8.8.8.8"))
+        cache.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """Test that the cache stays under its size cap by evicting the least recently used entries."""
+        cache = LookupCache(self.path, max_entries=10)
+        for i in range(10):
+            with patch('cache.time.time', return_value=1000.0 + i):
+                cache.set(f"10.0.0.{i}", None, {"status": "success"})
+        with patch('cache.time.time', return_value=2000.0):
+            cache.get("10.0.0.0")
+            cache.set("10.0.0.10", None, {"status": "success"})
+
+            self.assertIsNotNone(cache.get("10.0.0.0"))
+            self.assertIsNone(cache.get("10.0.0.1"))
+            self.assertIsNotNone(cache.get("10.0.0.10"))
+        cache.close()
+
+    def test_processes_share_the_database(self):
+        """Test that no transaction is left open between writes, and a locked database only skips writes."""
+        payload = {"status": "success", "query": "8.8.8.8"}
+        first = LookupCache(self.path)
+        second = LookupCache(self.path, busy_timeout=0.05)
+        first.set("8.8.8.8", None, payload)
+        second.set("1.1.1.1", None, payload)
+        self.assertEqual(first.get("1.1.1.1"), payload)
+        self.assertEqual(second.get("8.8.8.8"), payload)
+
+        with first.batch():
+            first.set("9.9.9.9", None, payload)
+            # The first cache holds the write lock, so the second one skips its write instead of raising.
+            second.set("4.4.4.4", None, payload)
+            self.assertEqual(second.get("8.8.8.8"), payload)
+            self.assertIsNone(second.get("9.9.9.9"))
+        self.assertEqual(second.get("9.9.9.9"), payload)
+        self.assertIsNone(first.get("4.4.4.4"))
+        first.close()
+        second.close()
+
+    def test_batch_belongs_to_its_thread(self):
+        """Test that another thread's set() waits for an open batch instead of joining its transaction."""
+        payload = {"status": "success"}
+        cache = LookupCache(self.path)
+        other = threading.Thread(target=cache.set, args=("1.1.1.1", None, payload))
+        with cache.batch():
+            cache.set("8.8.8.8", None, payload)
+            other.start()
+            other.join(0.1)
+            self.assertTrue(other.is_alive())
+            # Only this thread's write is in the batch so far.
+            self.assertEqual(cache._count, 1)
+        other.join(5)
+
+        self.assertEqual(cache.get("8.8.8.8"), payload)
+        self.assertEqual(cache.get("1.1.1.1"), payload)
+        cache.close()
+
+    def test_database_errors_are_misses(self):
+        """Test that get() and set() treat a broken database as a cache miss."""
+        cache = LookupCache(self.path)
+        cache.set("8.8.8.8", None, {"status": "success"})
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP TABLE lookups")
+        connection.close()
+
+        self.assertIsNone(cache.get("8.8.8.8"))
+        cache.set("8.8.8.8", None, {"status": "success"})
+        self.assertIsNone(cache.get("8.8.8.8"))
+        cache.close()
+
+    @patch('api.requests.Session.get')
+    def test_provider_serves_hits_without_requests(self, mock_get):
+        """Test that IPInfoProvider answers cached lookups without calling the API."""
+        mock_response = Mock()
+        mock_response.json.return_value = {"status": "success", "query": "8.8.8.8"}
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        cache = LookupCache(self.path)
+        ip_info_provider = IPInfoProvider(cache=cache)
+        ip_info_provider.get_ip_info("8.8.8.8", ["query"])
+        ip_info = ip_info_provider.get_ip_info("8.8.8.8", ["query"])
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(ip_info["display_ip"], "8.8.8.8")
+        cache.close()
+
+    @patch('api.requests.Session.get')
+    def test_failed_lookups_are_cached_briefly(self, mock_get):
+        """Test that failed lookups are cached for negative_ttl seconds only."""
+        mock_response = Mock()
+        mock_response.json.return_value = {"status": "fail", "message": "invalid query", "query": "exampel.invalid"}
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        cache = LookupCache(self.path, ttl=3600, negative_ttl=60)
+        ip_info_provider = IPInfoProvider(cache=cache)
+        with patch('cache.time.time', return_value=1000.0):
+            ip_info_provider.get_ip_info("exampel.invalid", ["query"])
+        with patch('cache.time.time', return_value=1059.0):
+            ip_info = ip_info_provider.get_ip_info("exampel.invalid", ["query"])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(ip_info["message"], "invalid query")
+        with patch('cache.time.time', return_value=1061.0):
+            ip_info_provider.get_ip_info("exampel.invalid", ["query"])
+        self.assertEqual(mock_get.call_count, 2)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
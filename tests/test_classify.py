@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add the parent directory to the path so that we can import the classify and api modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classify import classify
+from api import IPInfoProvider
+
+class TestClassify(unittest.TestCase):
+    """Test cases for the local classification of addresses."""
+
+    def test_classify(self):
+        """Test that private, reserved and malformed addresses are recognized and others are left alone."""
+        cases = {
+            "10.1.2.3": "private range",
+            "172.31.255.255": "private range",
+            "192.168.0.1": "private range",
+            "fd12::1": "private range",
+            "127.0.0.1": "reserved range",
+            "169.254.1.1": "reserved range",
+            "100.64.0.1": "reserved range",
+            "224.0.0.251": "reserved range",
+            "255.255.255.255": "reserved range",
+            "203.0.113.5": "reserved range",
+            "::1": "reserved range",
+            "fe80::1": "reserved range",
+            "2001:db8::1": "reserved range",
+            "8.8.8": "invalid query",
+            "999.1.1.1": "invalid query",
+            "2001:db8::g": "invalid query",
+            "8.8.8.8": None,
+            "172.32.0.1": None,
+            "100.128.0.1": None,
+            "2606:4700:4700::1111": None,
+            "example.com": None,
+            "": None,
+        }
+        for ip_address, message in cases.items():
+            with self.subTest(ip_address=ip_address):
+                self.assertEqual(classify(ip_address), message)
+
+    @patch('api.requests.Session.post')
+    @patch('api.requests.Session.get')
+    def test_provider_answers_locally(self, mock_get, mock_post):
+        """Test that classified addresses get ip-api's failure without a request, alone or in a batch."""
+        mock_post.return_value = Mock(status_code=200, headers={})
+        mock_post.return_value.json.return_value = [{"status": "success", "country": "Example", "query": "93.184.216.34"}]
+        ip_info_provider = IPInfoProvider(local_classification=True)
+
+        ip_info = ip_info_provider.get_ip_info("192.168.1.1", ["country", "query"])
+        ip_infos = ip_info_provider.get_ip_infos(["10.0.0.1", "example.com", "127.0.0.1"], ["country", "query"])
+
+        self.assertEqual(ip_info, {"status": "fail", "message": "private range", "query": "192.168.1.1", "display_ip": "192.168.1.1"})
+        self.assertEqual([data.get("message") for data in ip_infos], ["private range", None, "reserved range"])
+        mock_get.assert_not_called()
+        self.assertEqual(mock_post.call_args.kwargs["json"], ["example.com"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import socket
+import sys
+import os
+import tempfile
+import threading
+import argparse
+
+# Add the parent directory to the path so that we can import the daemon module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import Provider
+from daemon import DaemonError, DaemonProvider, DaemonServer, ResultCache, parse_address
+from main import add_provider_arguments
+
+class FakeProvider(Provider):
+    """Answers every address except 'bad' and counts the lookups it performs."""
+
+    def __init__(self):
+        self.looked_up = []
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def get_ip_info(self, ip_address, fields_to_request=None):
+        self.looked_up.append(ip_address)
+        data = {"status": "success", "query": ip_address, "country": "Testland", "display_ip": ip_address}
+        return {k: v for k, v in data.items() if not fields_to_request or k in fields_to_request or k in ("status", "display_ip")}
+
+    def iter_ip_infos(self, ip_addresses, fields_to_request=None, workers=1):
+        for ip_address in ip_addresses:
+            if ip_address == "bad":
+                yield ip_address, None, Exception("lookup failed")
+            else:
+                yield ip_address, self.get_ip_info(ip_address, fields_to_request), None
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the ResultCache class."""
+
+    def test_lru_eviction_and_ttl(self):
+        """Test that the least recently used entry is evicted and expired entries are dropped."""
+        clock = FakeClock()
+        cache = ResultCache(max_entries=2, ttl=10, clock=clock)
+        for ip_address in ("1.1.1.1", "8.8.8.8"):
+            cache.set(ip_address, ["country"], {"status": "success", "query": ip_address})
+        cache.get("1.1.1.1", ["country"])
+        cache.set("9.9.9.9", ["country"], {"status": "success", "query": "9.9.9.9"})
+
+        self.assertIsNone(cache.get("8.8.8.8", ["country"]))
+        self.assertIsNotNone(cache.get("1.1.1.1", ["country"]))
+        self.assertIsNone(cache.get("1.1.1.1", ["city"]))
+
+        clock.now = 11
+        self.assertIsNone(cache.get("1.1.1.1", ["country"]))
+
+    def test_failures_and_own_ip_are_not_cached(self):
+        """Test that failed lookups and the caller's own IP are never stored."""
+        cache = ResultCache()
+        cache.set("10.0.0.1", None, {"status": "fail", "message": "private range"})
+        cache.set("", None, {"status": "success", "query": "203.0.113.5"})
+        self.assertEqual(len(cache), 0)
+
+class TestDaemon(unittest.TestCase):
+    """Test cases for DaemonServer and DaemonProvider talking to each other."""
+
+    def start(self, address):
+        self.provider = FakeProvider()
+        self.server = DaemonServer(self.provider, address)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.close)
+        self.addCleanup(self.server.httpd.shutdown)
+
+    def test_parse_address(self):
+        """Test that host:port and socket paths are told apart."""
+        self.assertEqual(parse_address("127.0.0.1:8765"), ("tcp", ("127.0.0.1", 8765)))
+        self.assertEqual(parse_address("[::1]:8765"), ("tcp", ("::1", 8765)))
+        self.assertEqual(parse_address("/run/whatsip.sock"), ("unix", "/run/whatsip.sock"))
+        with self.assertRaises(ValueError):
+            parse_address("localhost")
+
+    def test_lookups_over_tcp_are_cached(self):
+        """Test that repeated lookups are answered from the daemon's memory in input order."""
+        self.start("127.0.0.1:0")
+        client = DaemonProvider(f"127.0.0.1:{self.server.httpd.server_address[1]}")
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.get_ip_info("8.8.8.8", ["country"])["country"], "Testland")
+        results = list(client.iter_ip_infos(["1.1.1.1", "bad", "8.8.8.8"], ["country"]))
+
+        self.assertEqual([ip for ip, _, _ in results], ["1.1.1.1", "bad", "8.8.8.8"])
+        self.assertEqual(results[0][1]["country"], "Testland")
+        self.assertIsInstance(results[1][2], DaemonError)
+        self.assertEqual(str(results[1][2]), "lookup failed")
+        self.assertEqual(self.provider.looked_up, ["8.8.8.8", "1.1.1.1"])
+        self.assertEqual(self.server.health()["cache_hits"], 1)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not available")
+    def test_lookups_over_unix_socket(self):
+        """Test that the daemon serves a Unix socket and removes it when closed."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        socket_path = os.path.join(temp_dir.name, "whatsip.sock")
+        self.start(socket_path)
+
+        with DaemonProvider(socket_path) as client:
+            self.assertEqual(client.get_ip_info("9.9.9.9")["query"], "9.9.9.9")
+
+        self.server.httpd.shutdown()
+        self.server.close()
+        self.assertFalse(os.path.exists(socket_path))
+        self.assertTrue(self.provider.closed)
+
+    def test_unreachable_daemon_fails_each_lookup(self):
+        """Test that a missing daemon turns into per-address errors instead of a crash."""
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        client = DaemonProvider(f"127.0.0.1:{port}")
+
+        results = list(client.iter_ip_infos(["8.8.8.8", "1.1.1.1"]))
+
+        self.assertEqual(len(results), 2)
+        for _, data, error in results:
+            self.assertIsNone(data)
+            self.assertIsInstance(error, DaemonError)
+
+class TestViaDaemonArguments(unittest.TestCase):
+    """Test cases for the options that send lookups to a daemon."""
+
+    def test_via_daemon_leaves_addresses_alone(self):
+        """Test that an address after --via-daemon is looked up, not taken as the daemon's address."""
+        parser = argparse.ArgumentParser()
+        parser.add_argument('ip', nargs='*', default=[])
+        add_provider_arguments(parser)
+
+        args = parser.parse_args(["--via-daemon", "8.8.8.8"])
+        self.assertEqual((args.via_daemon, args.daemon_address, args.ip), (True, None, ["8.8.8.8"]))
+        args = parser.parse_args(["8.8.8.8", "--daemon-address", "/tmp/whatsip.sock", "--via-daemon"])
+        self.assertEqual((args.via_daemon, args.daemon_address, args.ip), (True, "/tmp/whatsip.sock", ["8.8.8.8"]))
+
+if __name__ == '__main__':
+    unittest.main()
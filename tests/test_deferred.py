@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+import socket
+import sys
+import os
+import threading
+import requests
+
+# Add the parent directory to the path so that we can import the deferred module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import Provider
+from deferred import DeferredLookups, resolve_reverse
+
+class SlowReverseProvider(Provider):
+    """Answers 'reverse' lookups once released, and fails them for 'bad'."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.looked_up = []
+
+    def get_ip_info(self, ip_address, fields_to_request=None):
+        self.looked_up.append((ip_address, fields_to_request))
+        self.release.wait(5)
+        if ip_address == "bad":
+            raise requests.exceptions.ConnectionError("down")
+        return {"status": "success", "reverse": f"host-{ip_address}", "display_ip": ip_address}
+
+class TestDeferredLookups(unittest.TestCase):
+    """Test cases for the DeferredLookups class."""
+
+    def test_patches_are_merged_and_saved_in_order(self):
+        """Test that deferred fields are merged into their records and completed() keeps submission order."""
+        provider = SlowReverseProvider()
+        records = [{"status": "success", "country": "A", "display_ip": "1.1.1.1"},
+                   {"status": "success", "country": "B", "display_ip": "bad"},
+                   {"status": "success", "country": "C", "display_ip": "8.8.8.8"}]
+
+        with DeferredLookups(provider, ["reverse"], keep_order=True) as deferred:
+            deferred.submit(records[0], "1.1.1.1")
+            deferred.submit(records[1], "bad")
+            deferred.add_complete({"status": "success", "country": "D", "reverse": "cached"})
+            deferred.submit(records[2], "8.8.8.8")
+            # Duplicate results that share a record are looked up once.
+            deferred.submit(records[2], "8.8.8.8")
+            self.assertEqual(list(deferred.ready()), [])
+            self.assertEqual(deferred.completed(), [])
+
+            provider.release.set()
+            patches = {record["country"]: patch for record, patch in deferred.drain()}
+
+        self.assertEqual(patches, {"A": {"reverse": "host-1.1.1.1"}, "B": {}, "C": {"reverse": "host-8.8.8.8"}})
+        self.assertEqual(records[0]["reverse"], "host-1.1.1.1")
+        self.assertNotIn("reverse", records[1])
+        self.assertEqual([r["country"] for r in deferred.completed()], ["A", "B", "D", "C", "C"])
+        self.assertEqual(sorted(provider.looked_up), [("1.1.1.1", ["reverse"]), ("8.8.8.8", ["reverse"]), ("bad", ["reverse"])])
+
+    def test_submit_waits_for_room(self):
+        """Test that submit() waits while max_pending lookups are unfinished, and keeps what finished meanwhile."""
+        provider = SlowReverseProvider()
+        records = [{"status": "success", "display_ip": ip} for ip in ("1.1.1.1", "8.8.8.8", "9.9.9.9")]
+
+        with DeferredLookups(provider, ["reverse"], workers=1, max_pending=2, keep_order=True) as deferred:
+            deferred.submit(records[0], "1.1.1.1")
+            deferred.submit(records[1], "8.8.8.8")
+            self.assertEqual(deferred.held_back, 2)
+            timer = threading.Timer(0.05, provider.release.set)
+            timer.start()
+            deferred.submit(records[2], "9.9.9.9")
+            timer.join()
+            self.assertTrue(deferred.pending)
+            self.assertEqual(next(deferred.wait()), (records[0], {"reverse": "host-1.1.1.1"}))
+            self.assertEqual([record for record, _ in deferred.drain()], records[1:])
+
+        self.assertFalse(deferred.pending)
+        self.assertEqual(deferred.completed(), records)
+
+    @patch('deferred.socket.gethostbyaddr')
+    def test_local_resolver(self, mock_gethostbyaddr):
+        """Test that 'reverse' can be resolved on this machine instead of by the provider."""
+        def fake_gethostbyaddr(ip_address):
+            if ip_address != "8.8.8.8":
+                raise socket.herror(1, "Unknown host")
+            return "dns.google", [], [ip_address]
+        mock_gethostbyaddr.side_effect = fake_gethostbyaddr
+        provider = SlowReverseProvider()
+        record = {"status": "success", "display_ip": "8.8.8.8"}
+
+        with DeferredLookups(provider, ["reverse"], resolver="local") as deferred:
+            deferred.submit(record, "8.8.8.8")
+            self.assertEqual(list(deferred.drain()), [(record, {"reverse": "dns.google"})])
+
+        self.assertEqual(provider.looked_up, [])
+        self.assertEqual(resolve_reverse("192.0.2.1"), "")
+
+if __name__ == '__main__':
+    unittest.main()
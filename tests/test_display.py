@@ -2,12 +2,14 @@ import unittest
 from unittest.mock import Mock, patch
 import sys
 import os
+import io
 from rich.console import Console
 
 # Add the parent directory to the path so that we can import the display and config modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from display import DisplayManager, SleekDisplay
+from display import DisplayManager, RecordStream, SleekDisplay
+from live_display import LiveTableDisplay
 from config import BASE_DEFAULT_CONFIG
 
 class TestDisplayManager(unittest.TestCase):
@@ -47,5 +49,114 @@ class TestSleekDisplay(unittest.TestCase):
 
         console.print.assert_called_once()
 
+class TestLiveTableDisplay(unittest.TestCase):
+    """Test cases for the multi-record LiveTableDisplay class."""
+
+    def test_rows_switch_to_plain_lines_past_threshold(self):
+        """Test that results become table rows and later plain lines once the threshold is passed."""
+        output = io.StringIO()
+        console = Console(file=output, width=120)
+        config = dict(BASE_DEFAULT_CONFIG, theme="table", live_table_max_rows=2)
+        display_manager = DisplayManager(console)
+
+        with display_manager.open_stream(config, ["country", "query"]) as stream:
+            self.assertIsInstance(stream, LiveTableDisplay)
+            for i in range(4):
+                stream.add({"status": "success", "country": f"Country{i}", "query": f"10.0.0.{i}", "display_ip": f"10.0.0.{i}"})
+            stream.add_error("10.0.0.9", "timed out")
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(stream.row_count, 5)
+        self.assertIn("Country", lines[1])
+        self.assertIn("│ 10.0.0.2 │ Country2 │", lines)
+        self.assertTrue(any("Error: timed out" in line for line in lines))
+
+    def test_deferred_fields_are_filled_in(self):
+        """Test that rows show deferred fields as pending until update() brings them."""
+        output = io.StringIO()
+        console = Console(file=output, width=120)
+        config = dict(BASE_DEFAULT_CONFIG, theme="table")
+
+        with DisplayManager(console).open_stream(config, ["country", "reverse"]) as stream:
+            stream.add({"status": "success", "country": "United States", "display_ip": "8.8.8.8"})
+            stream.add({"status": "success", "country": "Australia", "display_ip": "1.1.1.1"})
+            stream.update("8.8.8.8", {"reverse": "dns.google"})
+            stream.update("1.1.1.1", {})
+
+        lines = output.getvalue().splitlines()
+        self.assertIn("│ 8.8.8.8 │ United States │ dns.google │", lines)
+        self.assertIn("│ 1.1.1.1 │ Australia     │            │", lines)
+
+    def test_per_record_themes_use_record_stream(self):
+        """Test that per-record themes are wrapped in a RecordStream."""
+        console = Mock(spec=Console)
+        display_manager = DisplayManager(console)
+
+        with display_manager.open_stream(BASE_DEFAULT_CONFIG, ["country"]) as stream:
+            self.assertIsInstance(stream, RecordStream)
+            stream.add({"status": "success", "country": "United States", "display_ip": "8.8.8.8"})
+            stream.add({"status": "success", "country": "Australia", "display_ip": "1.1.1.1"})
+
+        self.assertEqual(console.print.call_count, 3)
+
+    def test_record_stream_redraws_deferred_fields(self):
+        """Test that the last record is redrawn with its deferred fields and earlier ones get a line below."""
+        output = io.StringIO()
+        console = Console(file=output, width=120)
+        config = dict(BASE_DEFAULT_CONFIG, theme="compact")
+
+        with DisplayManager(console).open_stream(config, ["country", "reverse"]) as stream:
+            stream.add({"status": "success", "country": "United States", "display_ip": "8.8.8.8"})
+            stream.add({"status": "success", "country": "Australia", "display_ip": "1.1.1.1"})
+            stream.update("1.1.1.1", {"reverse": "one.one.one.one"})
+            stream.update("8.8.8.8", {"reverse": "dns.google"})
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            "IP: 8.8.8.8 | Country: United States | Reverse: …",
+            "",
+            "IP: 1.1.1.1 | Country: Australia | Reverse: one.one.one.one",
+            "Reverse for 8.8.8.8: dns.google",
+        ])
+
+class TestPlainDisplay(unittest.TestCase):
+    """Test cases for the plain themes used with --plain and when stdout is not a terminal."""
+
+    def test_records_wait_for_deferred_fields_in_order(self):
+        """Test that plain records are written once complete, in the order they were added."""
+        output = io.StringIO()
+        console = Mock(spec=Console, file=output)
+        config = dict(BASE_DEFAULT_CONFIG, theme="compact")
+
+        with DisplayManager(console, plain=True).open_stream(config, ["country", "reverse"]) as stream:
+            stream.add({"status": "success", "country": "United States", "display_ip": "8.8.8.8"})
+            stream.add({"status": "success", "country": "Australia", "display_ip": "1.1.1.1"})
+            stream.add_error("10.0.0.1", "timed out")
+            stream.update("1.1.1.1", {"reverse": "one.one.one.one"})
+            self.assertEqual(output.getvalue(), "")
+            stream.update("8.8.8.8", {})
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            "IP: 8.8.8.8 | Country: United States",
+            "",
+            "IP: 1.1.1.1 | Country: Australia | Reverse: one.one.one.one",
+            "",
+            "Error for 10.0.0.1: timed out",
+        ])
+        console.print.assert_not_called()
+
+    def test_table_is_tab_separated(self):
+        """Test that the plain table theme writes a header and one tab-separated row per result."""
+        output = io.StringIO()
+        console = Mock(spec=Console, file=output)
+        config = dict(BASE_DEFAULT_CONFIG, theme="table", deferred_fields=[])
+
+        display_manager = DisplayManager(console, plain=True)
+        with display_manager.open_stream(config, ["country", "city"]) as stream:
+            stream.add({"status": "success", "country": "United States", "city": "Mountain\tView", "display_ip": "8.8.8.8"})
+            stream.add({"status": "fail", "message": "private range", "display_ip": "10.0.0.1"})
+
+        self.assertEqual(output.getvalue(), "IP\tCountry\tCity\n8.8.8.8\tUnited States\tMountain View\n10.0.0.1\tError: private range\n")
+
+
 if __name__ == '__main__':
     unittest.main()
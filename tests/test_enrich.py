@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+import io
+
+# Add the parent directory to the path so that we can import the enrich module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enrich import Enricher, delimiter_for, open_rows, resolve_column
+
+class FakeLookup:
+    """Answers lookups like Provider.iter_ip_infos and records the addresses of each call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ip_addresses):
+        ip_addresses = list(ip_addresses)
+        self.calls.append(ip_addresses)
+        for ip in ip_addresses:
+            if ip.startswith("10."):
+                yield ip, {"status": "fail", "message": "private range", "query": ip}, None
+            elif ip == "timeout":
+                yield ip, None, TimeoutError("timed out")
+            else:
+                yield ip, {"status": "success", "country": f"C-{ip}", "as": "AS15169", "query": ip}, None
+
+class TestEnricher(unittest.TestCase):
+    """Test cases for the Enricher class."""
+
+    def test_rows_keep_their_order_and_get_fields(self):
+        """Test that each row gets its address's fields, and empty cells without an address or a result."""
+        lookup = FakeLookup()
+        enricher = Enricher(lookup, 1, ["country", "as"], chunk_rows=3)
+        rows = [["1", "8.8.8.8"], ["2", "1.1.1.1"], ["3", "8.8.8.8"], ["4", " 8.8.8.8 "], ["5"], ["6", "10.0.0.1"], ["7", "timeout"]]
+
+        self.assertEqual(list(enricher.enrich(rows)), [
+            ["1", "8.8.8.8", "C-8.8.8.8", "AS15169"],
+            ["2", "1.1.1.1", "C-1.1.1.1", "AS15169"],
+            ["3", "8.8.8.8", "C-8.8.8.8", "AS15169"],
+            ["4", " 8.8.8.8 ", "C-8.8.8.8", "AS15169"],
+            ["5", "", ""],
+            ["6", "10.0.0.1", "", ""],
+            ["7", "timeout", "", ""],
+        ])
+        # Each chunk looks up its distinct addresses, and addresses from earlier chunks are remembered.
+        self.assertEqual(lookup.calls, [["8.8.8.8", "1.1.1.1"], ["10.0.0.1"], ["timeout"]])
+        self.assertEqual((enricher.rows, enricher.lookups, enricher.failed), (7, 4, 2))
+        self.assertEqual(enricher.header(["time", "ip"]), ["time", "ip", "country", "as"])
+
+    def test_memo_is_bounded(self):
+        """Test that only the most recently used results are kept across chunks, and errors are not kept."""
+        lookup = FakeLookup()
+        enricher = Enricher(lookup, 0, ["country"], chunk_rows=1, memo_entries=1)
+        list(enricher.enrich([["1.1.1.1"], ["2.2.2.2"], ["2.2.2.2"], ["1.1.1.1"], ["timeout"], ["timeout"]]))
+        self.assertEqual(lookup.calls, [["1.1.1.1"], ["2.2.2.2"], ["1.1.1.1"], ["timeout"], ["timeout"]])
+
+class TestEnrichInput(unittest.TestCase):
+    """Test cases for reading the file to enrich."""
+
+    def test_delimiter_and_column(self):
+        """Test that the delimiter follows the extension or the first line, and columns are found by name or number."""
+        self.assertEqual(delimiter_for("export.tsv", "a,b"), "\t")
+        self.assertEqual(delimiter_for("export.txt", "time;ip;user\r\n"), ";")
+        self.assertEqual(delimiter_for("-", "ip\n"), ",")
+
+        self.assertEqual(resolve_column("ip", ["time", "ip"]), 1)
+        self.assertEqual(resolve_column("1", ["time", "ip"]), 0)
+        self.assertEqual(resolve_column("2", None), 1)
+        self.assertRaises(ValueError, resolve_column, "host", ["time", "ip"])
+        self.assertRaises(ValueError, resolve_column, "ip", None)
+
+    def test_open_rows_keeps_the_first_line(self):
+        """Test that the line used to choose the delimiter is still read as the first row."""
+        delimiter, rows = open_rows(io.StringIO('time\tip\n1\t"8.8.8.8"\n'), "-")
+        self.assertEqual(delimiter, "\t")
+        self.assertEqual(list(rows), [["time", "ip"], ["1", "8.8.8.8"]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+import threading
+import time
+import requests
+
+# Add the parent directory to the path so that we can import the failover module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import IPInfoProvider
+from failover import CircuitBreaker, Endpoint, LatencyWindow, endpoints_from_config
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def ok_response(payload):
+    response = Mock(status_code=200, headers={})
+    response.raise_for_status.return_value = None
+    response.json.return_value = payload
+    return response
+
+class TestFailoverParts(unittest.TestCase):
+    """Test cases for the circuit breaker, latency window and endpoints."""
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        """Test that the breaker opens after repeated failures and lets one trial through after the cooldown."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failures=2, cooldown=10, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_latency_window_percentile(self):
+        """Test that percentiles need enough samples and follow the recent ones."""
+        window = LatencyWindow(size=10, min_samples=5)
+        for seconds in (0.1, 0.2, 0.3, 0.4):
+            window.add(seconds)
+        self.assertIsNone(window.percentile(95))
+        window.add(0.5)
+        self.assertEqual(window.percentile(50), 0.3)
+        self.assertEqual(window.percentile(95), 0.5)
+
+    def test_endpoint_adapts_field_names(self):
+        """Test that a mirror's fields are renamed to ip-api's and a status is added."""
+        endpoint = Endpoint("mirror", "http://mirror/json/", field_map={"country_name": "country", "ip": "query"})
+        record = endpoint.adapt({"country_name": "Germany", "ip": "1.2.3.4"})
+        self.assertEqual(record, {"country": "Germany", "query": "1.2.3.4", "status": "success"})
+
+    def test_endpoints_from_config(self):
+        """Test that configured endpoints replace the default one and are validated."""
+        default = endpoints_from_config({}, "http://ip-api.com/json/", "http://ip-api.com/batch")
+        self.assertEqual([e.base_url for e in default], ["http://ip-api.com/json/"])
+
+        config = {"endpoints": [{"name": "pro", "url": "https://pro/json/", "params": {"key": "k"}}, {"url": "http://mirror/"}]}
+        endpoints = endpoints_from_config(config, "http://ip-api.com/json/", "http://ip-api.com/batch")
+        self.assertEqual([e.name for e in endpoints], ["pro", "http://mirror/"])
+        self.assertEqual(endpoints[0].params, {"key": "k"})
+        self.assertIsNone(endpoints[1].batch_url)
+
+        with self.assertRaises(ValueError):
+            endpoints_from_config({"endpoints": [{"name": "no url"}]}, "", "")
+
+class TestIPInfoProviderFailover(unittest.TestCase):
+    """Test cases for failover and hedging across several endpoints."""
+
+    def make_provider(self, **kwargs):
+        self.primary = Endpoint("primary", "http://primary/json/", "http://primary/batch", breaker_failures=2)
+        self.secondary = Endpoint("secondary", "http://secondary/json/", field_map={"country_name": "country"})
+        provider = IPInfoProvider(endpoints=[self.primary, self.secondary], **kwargs)
+        self.addCleanup(provider.close)
+        return provider
+
+    @patch('api.requests.Session.get')
+    def test_failover_to_next_endpoint(self, mock_get):
+        """Test that a failing endpoint is skipped for the next one, and dropped once its breaker opens."""
+        calls = []
+
+        def fake_get(url, params=None, timeout=None):
+            calls.append(url.split("/")[2])
+            if url.startswith("http://primary"):
+                raise requests.exceptions.ConnectionError("down")
+            return ok_response({"status": "success", "country_name": "Germany", "query": url.rsplit("/", 1)[1]})
+        mock_get.side_effect = fake_get
+
+        ip_info_provider = self.make_provider(hedge_percentile=0)
+        for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+            self.assertEqual(ip_info_provider.get_ip_info(ip, ["country"])["country"], "Germany")
+
+        self.assertEqual(calls, ["primary", "secondary", "primary", "secondary", "secondary"])
+        self.assertEqual(self.primary.breaker.state, "open")
+
+    @patch('api.requests.Session.get')
+    def test_all_endpoints_failing_raises(self, mock_get):
+        """Test that the first error is raised when every endpoint fails."""
+        mock_get.side_effect = requests.exceptions.Timeout("slow")
+
+        ip_info_provider = self.make_provider()
+        with self.assertRaises(requests.exceptions.Timeout):
+            ip_info_provider.get_ip_info("1.1.1.1")
+
+    @patch('api.DEFAULT_HEDGE_DELAY', 0.05)
+    @patch('api.requests.Session.get')
+    def test_slow_request_is_hedged(self, mock_get):
+        """Test that a stalled request is also sent to the next endpoint and the first answer wins."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def fake_get(url, params=None, timeout=None):
+            if url.startswith("http://primary"):
+                release.wait(5)
+                return ok_response({"status": "success", "country": "Stale"})
+            return ok_response({"status": "success", "country_name": "Fresh"})
+        mock_get.side_effect = fake_get
+
+        ip_info_provider = self.make_provider()
+        start = time.monotonic()
+        ip_info = ip_info_provider.get_ip_info("1.1.1.1", ["country"])
+
+        self.assertEqual(ip_info["country"], "Fresh")
+        self.assertLess(time.monotonic() - start, 2)
+
+    @patch('api.requests.Session.post')
+    def test_batch_uses_endpoints_with_batch_url(self, mock_post):
+        """Test that batch lookups only go to endpoints that have a batch URL."""
+        def fake_post(url, json=None, params=None, timeout=None):
+            return ok_response([{"status": "success", "query": ip} for ip in json])
+        mock_post.side_effect = fake_post
+
+        ip_info_provider = self.make_provider()
+        ip_infos = ip_info_provider.get_ip_infos(["1.1.1.1", "8.8.8.8"], ["query"])
+
+        self.assertEqual([i["query"] for i in ip_infos], ["1.1.1.1", "8.8.8.8"])
+        self.assertEqual(mock_post.call_args[0][0], "http://primary/batch")
+
+if __name__ == '__main__':
+    unittest.main()
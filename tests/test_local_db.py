@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the local_db module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_db import LocalDBProvider
+
+CSV_DATA = """start,end,country,countryCode,city,lat,lon,as,proxy
+8.8.8.0,8.8.8.255,United States,US,Mountain View,37.422,-122.084,AS15169 Google LLC,false
+1.1.1.0,1.1.1.255,Australia,AU,Sydney,-33.8688,151.209,AS13335 Cloudflare,false
+16843264,16843519,China,CN,Fuzhou,26.06,119.3,AS4134 Chinanet,true
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,United States,US,Mountain View,37.422,-122.084,AS15169 Google LLC,false
+2606:4700::,2606:4700::ffff,United States,US,San Francisco,37.7749,-122.4194,AS13335 Cloudflare,false
+"""
+
+class TestLocalDBProvider(unittest.TestCase):
+    """Test cases for the LocalDBProvider class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "ranges.csv")
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(CSV_DATA)
+        self.provider = LocalDBProvider(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_ipv4_lookup(self):
+        """Test that IPv4 addresses are found in their range with typed fields."""
+        ip_info = self.provider.get_ip_info("8.8.8.8")
+
+        self.assertEqual(ip_info["status"], "success")
+        self.assertEqual(ip_info["city"], "Mountain View")
+        self.assertEqual(ip_info["lat"], 37.422)
+        self.assertIs(ip_info["proxy"], False)
+        self.assertEqual(ip_info["query"], "8.8.8.8")
+        self.assertEqual(self.provider.get_ip_info("1.1.2.1")["city"], "Fuzhou")
+        self.assertIs(self.provider.get_ip_info("1.1.2.1")["proxy"], True)
+
+    def test_ipv6_lookup(self):
+        """Test that IPv6 addresses are found in their range."""
+        self.assertEqual(self.provider.get_ip_info("2001:4860:4860::8888")["as"], "AS15169 Google LLC")
+        self.assertEqual(self.provider.get_ip_info("2606:4700::1111")["city"], "San Francisco")
+        self.assertEqual(self.provider.get_ip_info("2606:4700::1:0")["status"], "fail")
+
+    def test_requested_fields_only(self):
+        """Test that only the requested fields are returned."""
+        ip_info = self.provider.get_ip_info("1.1.1.1", ["country", "query"])
+
+        self.assertEqual(ip_info, {"status": "success", "country": "Australia", "query": "1.1.1.1", "display_ip": "1.1.1.1"})
+
+    def test_unknown_and_invalid_addresses(self):
+        """Test that addresses outside every range and invalid input return fail records."""
+        self.assertEqual(self.provider.get_ip_info("9.9.9.9")["message"], "not found")
+        self.assertEqual(self.provider.get_ip_info("not-an-ip")["message"], "invalid query")
+
+    def test_shared_records(self):
+        """Test that ranges with identical fields share one record."""
+        self.assertEqual(len(self.provider.records), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import tempfile
+import json
+
+# Add the parent directory to the path so that we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+class TestArguments(unittest.TestCase):
+    """Test cases for parsing the command line."""
+
+    def parse(self, argv):
+        """Parses a whatsip command line and returns the arguments the command would run with."""
+        with patch.object(sys, 'argv', ['whatsip'] + argv), patch('main.run_with_timings') as mock_run:
+            main.main()
+        return mock_run.call_args.args[1]
+
+    def test_timings_leaves_addresses_alone(self):
+        """Test that an address after --timings is looked up, not taken as the format."""
+        args = self.parse(["--timings", "8.8.8.8"])
+        self.assertEqual((args.timings, args.timings_format, args.ip), (True, "table", ["8.8.8.8"]))
+        args = self.parse(["8.8.8.8", "--timings-format", "json", "--timings"])
+        self.assertEqual((args.timings, args.timings_format, args.ip), (True, "json", ["8.8.8.8"]))
+        self.assertFalse(self.parse([]).timings)
+
+class TestDeferredFields(unittest.TestCase):
+    """Test cases for choosing between deferred fields and fetching every field in the batch."""
+
+    def plan(self, addresses, tty=True, **config):
+        """Returns the plan of a run with -f country,reverse and the given config overrides."""
+        args = main.argparse.Namespace(ndjson=False, plain=False, config="config.json", theme=None, summary=None,
+                                       all=False, fields="country,reverse")
+        with patch('main.load_config', return_value=dict(main.BASE_DEFAULT_CONFIG, **config)), \
+             patch.object(sys.stdout, 'isatty', return_value=tty):
+            return main.prepare_output(args, main.Timings(), addresses=addresses)[2]
+
+    def test_small_terminal_runs_defer(self):
+        """Test that a few addresses shown on a terminal get 'reverse' in the background."""
+        for addresses in (1, main.DEFER_MAX_ADDRESSES):
+            plan = self.plan(addresses)
+            self.assertEqual(plan.deferred_fields, ["reverse"])
+            self.assertEqual(plan.fast_fields, ["country"])
+
+    def test_other_runs_request_everything_in_the_batch(self):
+        """Test that input files, many addresses and output that isn't a terminal request 'reverse' with the rest."""
+        for plan in (self.plan(None), self.plan(main.DEFER_MAX_ADDRESSES + 1), self.plan(1, tty=False)):
+            self.assertEqual(plan.deferred_fields, [])
+            self.assertEqual(plan.fast_fields, ["country", "reverse"])
+
+    def test_local_reverse_dns_stays_deferred(self):
+        """Test that PTR records resolved on this machine are still deferred, since they cost no requests."""
+        for plan in (self.plan(None, reverse_dns="local"), self.plan(1, tty=False, reverse_dns="local")):
+            self.assertEqual(plan.deferred_fields, ["reverse"])
+            self.assertEqual(plan.fast_fields, ["country"])
+
+    @patch('main.prepare_lookups', return_value=None)
+    def test_run_counts_the_addresses(self, mock_prepare_lookups):
+        """Test that runs pass the number of addresses given on the command line, and None for --input."""
+        for input_path, ip, expected in ((None, [], 1), (None, ["8.8.8.8", "1.1.1.1"], 2), ("ips.txt", ["8.8.8.8"], None)):
+            main.run(main.argparse.Namespace(input=input_path, ip=ip, workers=1), "config", main.Timings())
+            self.assertEqual(mock_prepare_lookups.call_args.kwargs["addresses"], expected)
+
+class TestCreateProvider(unittest.TestCase):
+    """Test cases for creating the provider."""
+
+    def test_quota_ledger_is_closed_with_the_provider(self):
+        """Test that the shared quota ledger is owned by the provider and closed with it."""
+        args = main.argparse.Namespace(via_daemon=False, provider=None, db=None, no_cache=True, refresh=False, workers=1)
+        config = dict(main.BASE_DEFAULT_CONFIG, shared_quota=True)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with main.create_provider(args, config, temp_dir, MagicMock()) as ip_info_provider:
+                ledger = ip_info_provider.quota_ledger
+                self.assertIs(ip_info_provider.rate_limiter.ledger, ledger)
+                self.assertFalse(ledger._file.closed)
+            self.assertTrue(ledger._file.closed)
+
+class TestRun(unittest.TestCase):
+    """Test cases for the lookup command."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.provider = MagicMock()
+        self.console = MagicMock()
+        patcher = patch('main.prepare_lookups', return_value=(self.console, {}, self.provider, MagicMock()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_missing_input_closes_the_provider(self):
+        """Test that the provider is closed when the input file can't be opened."""
+        args = main.argparse.Namespace(input=os.path.join(self.temp_dir.name, "missing.txt"), ip=[], workers=1)
+        main.run(args, self.temp_dir.name, main.Timings())
+        self.provider.__exit__.assert_called_once()
+        self.console.print.assert_called_once()
+
+    @patch('main.show_results', side_effect=RuntimeError("render failed"))
+    def test_input_is_closed_when_the_run_fails(self, mock_show_results):
+        """Test that the input file is closed even if showing the results raises."""
+        input_path = os.path.join(self.temp_dir.name, "ips.txt")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("8.8.8.8\n")
+        streams = []
+        args = main.argparse.Namespace(input=input_path, ip=[], workers=1)
+        with patch('main.read_ips', side_effect=lambda stream: streams.append(stream) or iter([])):
+            with self.assertRaises(RuntimeError):
+                main.run(args, self.temp_dir.name, main.Timings())
+        self.assertTrue(streams[0].closed)
+        self.provider.__exit__.assert_called_once()
+
+class TestShowResults(unittest.TestCase):
+    """Test cases for showing and saving results."""
+
+    def test_interrupted_run_saves_a_complete_file(self):
+        """Test that -o gets a complete file when the run is interrupted, and no file when nothing was saved."""
+        def interrupted():
+            yield "8.8.8.8", {"status": "success", "country": "United States", "display_ip": "8.8.8.8"}, None
+            yield "1.1.1.1", {"status": "success", "country": "Australia", "display_ip": "1.1.1.1"}, None
+            raise KeyboardInterrupt()
+
+        config = main.BASE_DEFAULT_CONFIG
+        plan = main.ProjectionPlan(config, ["country"])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "out.json")
+            args = main.argparse.Namespace(summary=None, ndjson=False, output=path, plain=True, workers=1)
+            with self.assertRaises(KeyboardInterrupt):
+                main.show_results(interrupted(), args, config, plan, None, MagicMock(), main.Timings())
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), [{"country": "United States"}, {"country": "Australia"}])
+
+            failed = [("10.0.0.1", {"status": "fail", "message": "private range", "display_ip": "10.0.0.1"}, None)]
+            main.show_results(iter(failed), args, config, plan, None, MagicMock(), main.Timings())
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)), 2)
+
+class TestEnrichCommand(unittest.TestCase):
+    """Test cases for 'whatsip enrich'."""
+
+    def test_timings_leaves_the_input_alone(self):
+        """Test that the file after --timings is enriched, not taken as the format."""
+        with patch('main.run_with_timings') as mock_run:
+            main.enrich(["--timings", "x.csv", "--column", "ip"], "config")
+        args = mock_run.call_args.args[1]
+        self.assertEqual((args.timings, args.timings_format, args.input), (True, "table", "x.csv"))
+
+    @patch('main.create_provider')
+    def test_unwritable_output_creates_no_provider(self, mock_create_provider):
+        """Test that an output file that can't be opened stops the run before a provider is created."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, "in.csv")
+            with open(input_path, "w", encoding="utf-8") as f:
+                f.write("ip\n8.8.8.8\n")
+            args = main.argparse.Namespace(config=os.path.join(temp_dir, "config.json"), all=False, fields="country",
+                                           input=input_path, delimiter=None, no_header=False, column="ip",
+                                           output=os.path.join(temp_dir, "missing", "out.csv"), workers=1, chunk_rows=10)
+            with patch('rich.console.Console.print'):
+                main.run_enrich(args, temp_dir, main.Timings())
+        mock_create_provider.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add the parent directory to the path so that we can import the projection module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import IPInfoProvider
+from config import BASE_DEFAULT_CONFIG
+from failover import Endpoint
+from projection import ProjectionPlan, field_mask
+
+class TestProjectionPlan(unittest.TestCase):
+    """Test cases for ProjectionPlan and the numeric field mask."""
+
+    def test_field_mask(self):
+        """Test that fields are encoded as ip-api's bitmask, always including status and message."""
+        self.assertEqual(field_mask(("country", "query")), 1 + 8192 + 16384 + 32768)
+        self.assertEqual(field_mask(tuple(BASE_DEFAULT_CONFIG["_all_possible_fields"])), 66846719)
+        self.assertIsNone(field_mask(("country", "unknown")))
+
+    def test_default_fields_come_from_config(self):
+        """Test that an empty field list uses the config's default fields."""
+        plan = ProjectionPlan({"default_fields": ["city", "isp"]}, [])
+        self.assertEqual(plan.display_fields, ["city", "isp"])
+        self.assertEqual(plan.request_fields, ["city", "isp"])
+        self.assertEqual(plan.project({"status": "success", "city": "Sydney", "org": "x"}), {"city": "Sydney"})
+
+    def test_all_fields(self):
+        """Test that 'all' requests every field and shows every key of a record."""
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ['all'])
+        self.assertIsNone(plan.display_fields)
+        self.assertEqual(plan.request_fields, BASE_DEFAULT_CONFIG["_all_possible_fields"])
+        self.assertEqual(plan.fields_for({"status": "success", "city": "Sydney", "query": "1.1.1.1"}), ["city", "query"])
+
+    def test_slow_fields_are_deferred(self):
+        """Test that 'reverse' is requested after the other fields, unless nothing else would be shown first."""
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ['all'])
+        self.assertEqual(plan.deferred_fields, ["reverse"])
+        self.assertNotIn("reverse", plan.fast_fields)
+        self.assertIn("reverse", plan.request_fields)
+
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ["reverse", "query"])
+        self.assertEqual(plan.deferred_fields, [])
+        self.assertEqual(plan.fast_fields, ["reverse", "query"])
+
+        plan = ProjectionPlan(dict(BASE_DEFAULT_CONFIG, deferred_fields=[]), ['all'])
+        self.assertEqual(plan.fast_fields, plan.request_fields)
+
+    def test_groups_follow_category_order(self):
+        """Test that fields are grouped in category order, with the rest under 'other'."""
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ["isp", "city", "country", "mobile", "custom", "query"])
+        categories, other_fields = plan.groups(plan.display_fields)
+        self.assertEqual(categories, [("Location", ["country", "city"]), ("Network", ["isp"]), ("Details", ["mobile"])])
+        self.assertEqual(other_fields, ["custom"])
+        self.assertIs(plan.groups(plan.display_fields), plan.groups(list(plan.display_fields)))
+
+    def test_of_reuses_a_plan(self):
+        """Test that an existing plan is passed through instead of being rebuilt."""
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ["city"])
+        self.assertIs(ProjectionPlan.of(BASE_DEFAULT_CONFIG, plan), plan)
+        self.assertEqual(ProjectionPlan.of(BASE_DEFAULT_CONFIG, ["city"]).display_fields, ["city"])
+
+    @patch('api.requests.Session.get')
+    def test_field_names_are_sent_when_the_mask_cannot_be_used(self, mock_get):
+        """Test that unknown fields and endpoints without numeric support fall back to field names."""
+        mock_response = Mock(status_code=200, headers={})
+        mock_response.json.return_value = {"status": "success"}
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        IPInfoProvider().get_ip_info("8.8.8.8", ["country", "unknown"])
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"fields": "country,unknown"})
+
+        mirror = Endpoint("mirror", "http://mirror/json/", field_map={"country_name": "country"})
+        IPInfoProvider(endpoints=[mirror]).get_ip_info("8.8.8.8", ["country"])
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"fields": "country"})
+
+if __name__ == '__main__':
+    unittest.main()
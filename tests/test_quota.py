@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the quota module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quota import QuotaLedger, SharedRateLimiter
+
+class FakeClock:
+    """A manually advanced clock whose sleep moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class StopWaiting(Exception):
+    """Raised by a fake sleep to end an acquire() that would wait."""
+
+class TestSharedRateLimiter(unittest.TestCase):
+    """Test cases for the SharedRateLimiter class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "whatsip", "quota.json")
+        self.clock = FakeClock()
+        # Two ledgers on one file stand for two processes.
+        self.ledgers = [QuotaLedger(self.path, clock=self.clock.time) for _ in range(2)]
+
+    def tearDown(self):
+        for ledger in self.ledgers:
+            ledger.close()
+        self.temp_dir.cleanup()
+
+    def test_processes_share_the_quota(self):
+        """Test that quota reported to one process is used up by requests from both."""
+        first = SharedRateLimiter(self.ledgers[0], "http://ip-api.com/json/", sleep=self.clock.sleep)
+        second = SharedRateLimiter(self.ledgers[1], "http://ip-api.com/json/", sleep=self.clock.sleep)
+        other_endpoint = SharedRateLimiter(self.ledgers[1], "http://ip-api.com/batch", sleep=self.clock.sleep)
+
+        first.update({"X-Rl": "3", "X-Ttl": "30"})
+        first.acquire()
+        second.acquire()
+        second.acquire()
+        self.assertEqual(first.quota, {"limit": 4, "remaining": 0, "reset_in": 30.0})
+        self.assertEqual(other_endpoint.quota["remaining"], None)
+
+        # A late header from the first process doesn't hand out what the second one reserved.
+        first.update({"X-Rl": "2", "X-Ttl": "29"})
+        self.assertEqual(second.quota["remaining"], 0)
+
+        second.acquire()
+        self.assertEqual(self.clock.sleeps, [1.0] * 29)
+        self.assertEqual(first.quota["remaining"], 3)
+
+    def test_waiters_are_served_in_order(self):
+        """Test that a process that starts waiting later can't take quota from one that waits already."""
+        second = SharedRateLimiter(self.ledgers[1], "url", sleep=self._stop)
+
+        def sleep_then_race(seconds):
+            self.clock.sleep(seconds)
+            if self.clock.now == 10:
+                # The window has reset, and the second process asks before the first one looks again.
+                with self.assertRaises(StopWaiting):
+                    second.acquire()
+
+        first = SharedRateLimiter(self.ledgers[0], "url", sleep=sleep_then_race)
+        first.update({"X-Rl": "0", "X-Ttl": "10"})
+        first.acquire()
+
+        self.assertEqual(self.clock.sleeps, [1.0] * 10)
+        self.assertEqual(first.quota["remaining"], 0)
+        with self.ledgers[0].bucket("url") as bucket:
+            self.assertEqual(list(bucket["waiters"]), ["1"])
+
+        # A waiter that stops looking, e.g. because its process exited, loses its place.
+        self.clock.now = 30
+        first.update({"X-Rl": "1", "X-Ttl": "60"})
+        first.acquire()
+        self.assertEqual(first.quota["remaining"], 0)
+
+    def _stop(self, seconds):
+        raise StopWaiting()
+
+    def test_damaged_ledger_and_exhaust(self):
+        """Test that a damaged ledger is started over and a 429 without headers waits a minute."""
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        rate_limiter = SharedRateLimiter(self.ledgers[0], "url", sleep=self.clock.sleep)
+        self.assertEqual(rate_limiter.quota, {"limit": None, "remaining": None, "reset_in": None})
+
+        rate_limiter.update({"X-Rl": "5", "X-Ttl": "20"})
+        rate_limiter.exhaust()
+        self.assertEqual(rate_limiter.quota["remaining"], 0)
+        rate_limiter.acquire()
+        self.assertEqual(sum(self.clock.sleeps), 20.0)
+
+if __name__ == '__main__':
+    unittest.main()
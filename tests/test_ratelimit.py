@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so that we can import the ratelimit module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import RateLimiter
+
+class FakeClock:
+    """A manually advanced clock whose sleep moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the RateLimiter class."""
+
+    def test_acquire_does_not_wait_while_quota_remains(self):
+        """Test that requests go out immediately while the quota is not used up."""
+        clock = FakeClock()
+        rate_limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+        rate_limiter.acquire()
+        rate_limiter.update({"X-Rl": "2", "X-Ttl": "30"})
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual(rate_limiter.quota["remaining"], 0)
+
+    def test_acquire_sleeps_until_window_resets(self):
+        """Test that an exhausted quota sleeps exactly until the reported reset."""
+        clock = FakeClock()
+        rate_limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+        rate_limiter.update({"X-Rl": "0", "X-Ttl": "42"})
+        clock.now = 2.0
+        rate_limiter.acquire()
+
+        self.assertEqual(clock.sleeps, [40.0])
+        self.assertEqual(rate_limiter.quota, {"limit": 1, "remaining": 0, "reset_in": None})
+
+    def test_in_flight_reservations_are_kept(self):
+        """Test that a late header does not hand out quota already reserved by other requests."""
+        clock = FakeClock()
+        rate_limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+        rate_limiter.update({"X-Rl": "5", "X-Ttl": "60"})
+        for _ in range(3):
+            rate_limiter.acquire()
+        rate_limiter.update({"X-Rl": "4", "X-Ttl": "59"})
+
+        self.assertEqual(rate_limiter.quota["remaining"], 2)
+
+    def test_missing_headers_are_ignored(self):
+        """Test that responses without rate-limit headers leave the quota unknown."""
+        rate_limiter = RateLimiter()
+        rate_limiter.update({})
+
+        self.assertEqual(rate_limiter.quota, {"limit": None, "remaining": None, "reset_in": None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import json
+import pickle
+
+# Add the parent directory to the path so that we can import the records module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import IPRecord
+
+class TestIPRecord(unittest.TestCase):
+    """Test cases for the IPRecord class."""
+
+    def test_behaves_like_a_dict(self):
+        """Test that a record compares equal to the dictionary it was built from and supports its methods."""
+        data = {"query": "8.8.8.8", "status": "success", "country": "United States", "lat": 37.4, "custom": 1}
+        record = IPRecord(data)
+
+        self.assertEqual(record, data)
+        self.assertEqual(data, record)
+        self.assertEqual(list(record), ["status", "country", "lat", "query", "custom"])
+        self.assertEqual(len(record), 5)
+        self.assertIn("custom", record)
+        self.assertNotIn("city", record)
+        self.assertIsNone(record.get("city"))
+        self.assertEqual(record.get("city", "N/A"), "N/A")
+        with self.assertRaises(KeyError):
+            record["city"]
+
+        record.update({"reverse": "dns.google"}, display_ip="8.8.8.8")
+        del record["custom"]
+        self.assertNotIn("custom", record)
+        self.assertEqual(json.loads(json.dumps(record.to_dict())), {
+            "status": "success", "country": "United States", "lat": 37.4, "reverse": "dns.google",
+            "query": "8.8.8.8", "display_ip": "8.8.8.8"
+        })
+
+    def test_compact_storage(self):
+        """Test that records have no instance dictionary and share repeated text."""
+        first = IPRecord(country="".join(["United ", "States"]))
+        second = IPRecord(country="".join(["United ", "States"]))
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertIs(first["country"], second["country"])
+
+    def test_pickle(self):
+        """Test that records survive pickling, e.g. on their way to another process."""
+        record = IPRecord(status="success", country="Germany", hits=3)
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the scan and projection modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scan import chunk_bounds, count_addresses, normalize, scan_files
+from projection import ProjectionPlan
+from config import BASE_DEFAULT_CONFIG
+
+LOG = (
+    b'203.0.113.5 - - [10/Oct/2024:13:55:36 -0700] "GET /a/1.2.3.4 HTTP/1.1" 200 612 "-" "Chrome/120.0.0.0"\n'
+    b'2001:db8::1 - - [10/Oct/2024:13:55:37 -0700] "GET / HTTP/1.1" 200 1 "-" "curl/8.0"\n'
+    b'203.0.113.5 - - [10/Oct/2024:13:55:38 -0700] "GET / HTTP/1.1" 999.1.1.1 1.2.3.4.5 ::ffff:198.51.100.7\n'
+)
+
+class TestScan(unittest.TestCase):
+    """Test cases for scanning files for IP addresses."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".log")
+        with os.fdopen(fd, "wb") as f:
+            f.write(LOG)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_chunk_bounds_end_at_lines(self):
+        """Test that chunks cover the buffer and end right after a newline."""
+        bounds = chunk_bounds(LOG, 10)
+        self.assertEqual(len(bounds), 3)
+        self.assertEqual(bounds[0][0], 0)
+        self.assertEqual(bounds[-1][1], len(LOG))
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(LOG[end - 1:end], b"\n")
+
+    def test_default_scan(self):
+        """Test that addresses are found anywhere in a line, without paths, versions or timestamps."""
+        counts = scan_files([self.path])
+        self.assertEqual(counts, {"203.0.113.5": 2, "2001:db8::1": 1, "198.51.100.7": 1})
+        self.assertEqual(counts.most_common(1), [("203.0.113.5", 2)])
+
+    def test_column_and_regex(self):
+        """Test that --column and --regex limit where addresses are taken from."""
+        self.assertEqual(scan_files([self.path], column=1), {"203.0.113.5": 2, "2001:db8::1": 1})
+        self.assertEqual(normalize(count_addresses(LOG, 0, len(LOG), regex=r"^(?P<ip>\S+) .*curl")), {"2001:db8::1": 1})
+
+    def test_normalize(self):
+        """Test that invalid candidates are dropped and spellings of one address are merged."""
+        counts = normalize({b"10.0.0.1": 1, b"999.1.1.1": 4, b"::ffff:10.0.0.1": 2, b"2001:0db8:0::1": 1, b"[2001:db8::1]": 1})
+        self.assertEqual(counts, {"10.0.0.1": 3, "2001:db8::1": 2})
+
+    def test_parallel_chunks(self):
+        """Test that scanning chunks in worker processes gives the same counts."""
+        self.assertEqual(scan_files([self.path], jobs=2, chunk_size=10), scan_files([self.path], jobs=1))
+
+    def test_hits_column(self):
+        """Test that extra fields are shown after the requested ones but not requested from the API."""
+        plan = ProjectionPlan(BASE_DEFAULT_CONFIG, ["country"], extra_fields=("hits",))
+        self.assertEqual(plan.request_fields, ["country"])
+        self.assertEqual(plan.table_fields, ["country", "hits"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import json
+import math
+import random
+import tempfile
+
+# Add the parent directory to the path so that we can import the spatial module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial import GeoIndex, parse_distance, parse_location, read_records
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Returns the great-circle distance in kilometres, computed directly."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+class TestGeoIndex(unittest.TestCase):
+    """Test cases for the GeoIndex class."""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.records = [
+            {"status": "success", "query": f"20.0.{i // 256}.{i % 256}", "lat": rng.uniform(-89, 89), "lon": rng.uniform(-180, 180)}
+            for i in range(2000)
+        ]
+        # Several results at one location, as with city-level geolocation.
+        self.records += [{"status": "success", "query": f"30.0.0.{i}", "lat": 52.52, "lon": 13.405} for i in range(5)]
+        self.records.append({"status": "success", "query": "40.0.0.1"})
+        self.index = GeoIndex(self.records)
+
+    def test_within_matches_a_linear_scan(self):
+        """Test that radius queries find exactly the results a scan over all of them finds, nearest first."""
+        for lat, lon, radius in ((52.5, 13.4, 800), (0, 179.9, 1500), (89, 0, 2000), (-30, -60, 50)):
+            with self.subTest(lat=lat, lon=lon):
+                found = self.index.within(lat, lon, radius)
+                expected = {data["query"] for data in self.records if "lat" in data and haversine(lat, lon, data["lat"], data["lon"]) <= radius}
+                self.assertEqual({data["query"] for _, data in found}, expected)
+                distances = [distance for distance, _ in found]
+                self.assertEqual(distances, sorted(distances))
+                for distance, data in found:
+                    self.assertAlmostEqual(distance, haversine(lat, lon, data["lat"], data["lon"]), places=6)
+
+    def test_nearest(self):
+        """Test that the k nearest results are returned, counting every result at a shared location."""
+        found = self.index.nearest(52.52, 13.405, 7)
+        self.assertEqual(len(found), 7)
+        self.assertEqual([data["query"] for _, data in found[:5]], [f"30.0.0.{i}" for i in range(5)])
+        expected = sorted(haversine(52.52, 13.405, data["lat"], data["lon"]) for data in self.records if "lat" in data)[:7]
+        for (distance, _), expected_distance in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+        self.assertEqual(self.index.nearest(52.52, 13.405, 7, radius_km=1), found[:5])
+
+    def test_clusters(self):
+        """Test that clusters cover every result once and results at one location stay together."""
+        self.assertEqual(self.index.skipped, 1)
+        clusters = self.index.clusters(300)
+        self.assertEqual(sum(cluster["size"] for cluster in clusters), len(self.index))
+        self.assertEqual(sorted(ip for cluster in clusters for ip in cluster["ips"]), sorted(data["query"] for data in self.records if "lat" in data))
+        berlin = next(cluster for cluster in clusters if "30.0.0.0" in cluster["ips"])
+        self.assertLessEqual({f"30.0.0.{i}" for i in range(5)}, set(berlin["ips"]))
+        self.assertEqual([cluster["size"] for cluster in clusters], sorted((cluster["size"] for cluster in clusters), reverse=True))
+        self.assertEqual([cluster["cluster"] for cluster in clusters], list(range(1, len(clusters) + 1)))
+
+class TestSpatialInput(unittest.TestCase):
+    """Test cases for parsing 'whatsip near' input."""
+
+    def test_parse(self):
+        """Test that distances and locations are parsed and bad ones are rejected."""
+        self.assertEqual(parse_distance("50km"), 50.0)
+        self.assertEqual(parse_distance("500 m"), 0.5)
+        self.assertAlmostEqual(parse_distance("10mi"), 16.09344)
+        self.assertEqual(parse_location("52.52,-13.4"), (52.52, -13.4))
+        for bad in ("-5km", "far"):
+            self.assertRaises(ValueError, parse_distance, bad)
+        for bad in ("52.52", "91,0", "a,b"):
+            self.assertRaises(ValueError, parse_location, bad)
+
+    def test_read_ndjson_with_patches(self):
+        """Test that saved NDJSON results are read with their patches and without failed lookups."""
+        lines = [
+            {"country": "Germany", "lat": 52.52, "lon": 13.405, "query": "8.8.8.8"},
+            {"status": "fail", "message": "private range", "query": "10.0.0.1"},
+            {"status": "patch", "query": "8.8.8.8", "reverse": "dns.google"},
+        ]
+        fd, path = tempfile.mkstemp(suffix=".ndjson")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(line) for line in lines) + "\n")
+        try:
+            records = list(read_records(path))
+        finally:
+            os.remove(path)
+        self.assertEqual(records, [{
+            "status": "success", "country": "Germany", "lat": 52.52, "lon": 13.405,
+            "reverse": "dns.google", "query": "8.8.8.8", "display_ip": "8.8.8.8"
+        }])
+
+if __name__ == '__main__':
+    unittest.main()
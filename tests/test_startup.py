@@ -0,0 +1,90 @@
+import unittest
+import subprocess
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the cache module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LookupCache
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(ROOT_DIR, "main.py")
+
+def imported_modules(args, home, **environ):
+    """
+    Runs main.py with -X importtime and returns the names of the modules it imported.
+
+    Args:
+        args (list): The command line arguments for main.py.
+        home (str): The directory to use as the home directory.
+        **environ: More environment variables, e.g. TTY_COMPATIBLE='1' to have stdout taken for a terminal.
+
+    Returns:
+        set: The imported module names.
+    """
+    env = dict(os.environ, HOME=home, LOCALAPPDATA=home, **environ)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN_PATH] + args,
+        capture_output=True, text=True, env=env, cwd=ROOT_DIR, timeout=60
+    )
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+class TestStartupImports(unittest.TestCase):
+    """Regression tests for the modules loaded at startup."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_help_does_not_import_heavy_modules(self):
+        """Test that --help loads neither requests nor rich."""
+        modules = imported_modules(["--help"], self.temp_dir.name)
+
+        self.assertIn("display", modules)
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("rich.console", modules)
+        self.assertNotIn("sqlite3", modules)
+
+    def _cache_lookup(self):
+        """Caches a lookup of 8.8.8.8 in the temporary home directory."""
+        config_dir = os.path.join(self.temp_dir.name, ".config", "whatsip")
+        os.makedirs(config_dir)
+        if sys.platform == "win32":
+            config_dir = os.path.join(self.temp_dir.name, "whatsip")
+            os.makedirs(config_dir)
+        cache = LookupCache(os.path.join(config_dir, "cache.sqlite3"))
+        cache.set("8.8.8.8", ["country", "query"], {"status": "success", "country": "United States", "query": "8.8.8.8"})
+        cache.close()
+
+    def test_cache_hit_imports_only_the_chosen_theme(self):
+        """Test that a cached lookup loads no HTTP stack and only the rich modules of its theme."""
+        self._cache_lookup()
+        modules = imported_modules(["8.8.8.8", "-f", "country,query"], self.temp_dir.name, TTY_COMPATIBLE="1")
+
+        self.assertIn("rich.table", modules)
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("urllib3", modules)
+        self.assertNotIn("rich.tree", modules)
+        self.assertNotIn("rich.markdown", modules)
+        self.assertNotIn("rich.json", modules)
+
+    def test_piped_output_does_not_render_with_rich(self):
+        """Test that results written to a pipe load no rich renderables."""
+        self._cache_lookup()
+        modules = imported_modules(["8.8.8.8", "-f", "country,query"], self.temp_dir.name)
+
+        self.assertNotIn("rich.table", modules)
+        self.assertNotIn("rich.panel", modules)
+        self.assertNotIn("rich.live", modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
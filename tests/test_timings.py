@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch, Mock
+import datetime
+import sys
+import os
+
+# Add the parent directory to the path so that we can import the timings module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import IPInfoProvider
+from timings import Timings, NULL_TIMINGS, percentile, histogram
+
+class TestTimings(unittest.TestCase):
+    """Test cases for the Timings class."""
+
+    def test_disabled_timings_record_nothing(self):
+        """Test that disabled timings hand out one shared no-op phase and keep no samples."""
+        timings = Timings(enabled=False)
+        self.assertIs(timings.phase("http", "8.8.8.8"), timings.phase("render"))
+        with timings.phase("http", "8.8.8.8"):
+            pass
+        timings.record("json", 0.5, "8.8.8.8")
+
+        self.assertEqual(timings.summary(), {"phases": {}, "per_ip": {}})
+        self.assertFalse(NULL_TIMINGS.enabled)
+
+    def test_summary_aggregates_phases_and_addresses(self):
+        """Test that the summary holds per-phase statistics and per-address totals."""
+        timings = Timings()
+        for milliseconds in (1, 2, 3, 4, 100):
+            timings.record("http", milliseconds / 1000, "8.8.8.8")
+        timings.record("render", 0.010, "1.1.1.1")
+        timings.record("load_config", 0.002)
+        with timings.phase("json", ""):
+            pass
+
+        summary = timings.summary()
+        http = summary["phases"]["http"]
+        self.assertEqual(http["count"], 5)
+        self.assertEqual(http["total_ms"], 110.0)
+        self.assertEqual(http["p50_ms"], 3.0)
+        self.assertEqual(http["p99_ms"], 100.0)
+        self.assertEqual(http["max_ms"], 100.0)
+        self.assertEqual(http["histogram"], {"<=1ms": 1, "<=2ms": 1, "<=4ms": 2, "<=128ms": 1})
+        self.assertEqual(summary["per_ip"]["8.8.8.8"], {"http": 110.0})
+        self.assertEqual(summary["per_ip"]["1.1.1.1"], {"render": 10.0})
+        self.assertIn("json", summary["per_ip"]["(own IP)"])
+        self.assertNotIn(None, summary["per_ip"])
+
+    def test_percentile_and_histogram_of_no_samples(self):
+        """Test the helpers with empty input."""
+        self.assertEqual(percentile([], 0.99), 0.0)
+        self.assertEqual(histogram([]), {})
+
+    @patch('api.requests.Session.get')
+    def test_provider_records_request_phases(self, mock_get):
+        """Test that an enabled provider records the HTTP and JSON phases of a lookup."""
+        mock_response = Mock(status_code=200, headers={}, elapsed=datetime.timedelta(milliseconds=20))
+        mock_response.json.return_value = {"status": "success", "query": "8.8.8.8"}
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        ip_info_provider = IPInfoProvider()
+        ip_info_provider.timings = Timings()
+        ip_info_provider.get_ip_info("8.8.8.8", ["query"])
+
+        summary = ip_info_provider.timings.summary()
+        self.assertEqual(summary["phases"]["http"]["total_ms"], 20.0)
+        for phase in ("rate_limit_wait", "http_body", "json"):
+            self.assertEqual(summary["phases"][phase]["count"], 1)
+        self.assertEqual(set(summary["per_ip"]["8.8.8.8"]), {"rate_limit_wait", "http", "http_body", "json"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+
+# Add the parent directory to the path so that we can import the writers module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from writers import OutputFile, create_writer
+from config import BASE_DEFAULT_CONFIG
+
+RECORDS = [
+    {"status": "success", "country": "United States", "city": "Mountain View", "query": "8.8.8.8", "display_ip": "8.8.8.8"},
+    {"status": "success", "country": "Australia", "city": "Sydney", "query": "1.1.1.1", "display_ip": "1.1.1.1"},
+]
+
+def write_all(filename, records, fields_to_show):
+    """Writes records with the writer chosen for filename and returns the output."""
+    stream = io.StringIO()
+    with create_writer(filename, stream, BASE_DEFAULT_CONFIG, fields_to_show) as writer:
+        for data in records:
+            writer.write(data)
+    return stream.getvalue()
+
+class TestWriters(unittest.TestCase):
+    """Test cases for the streaming output writers."""
+
+    def test_json_array_matches_json_dump(self):
+        """Test that the streamed JSON array is identical to dumping the whole list at once."""
+        output = write_all("out.json", RECORDS, ["country", "query"])
+        expected = json.dumps([{"country": d["country"], "query": d["query"]} for d in RECORDS], indent=4)
+
+        self.assertEqual(output, expected)
+
+    def test_json_single_record_is_an_object(self):
+        """Test that a single record is written as an object, not an array."""
+        output = write_all("out.json", RECORDS[:1], ["country"])
+
+        self.assertEqual(json.loads(output), {"country": "United States"})
+        self.assertEqual(write_all("out.json", [], ["country"]), "[]")
+
+    def test_csv_and_tsv_have_fixed_header(self):
+        """Test that CSV and TSV output has a header row from the resolved fields."""
+        self.assertEqual(
+            write_all("out.csv", RECORDS, ["city", "isp", "query"]),
+            "city,isp,query\nMountain View,,8.8.8.8\nSydney,,1.1.1.1\n"
+        )
+        self.assertEqual(write_all("out.tsv", RECORDS[:1], ["country", "query"]), "country\tquery\nUnited States\t8.8.8.8\n")
+        header = write_all("out.csv", [], ["all"]).strip()
+        self.assertEqual(header.split(","), BASE_DEFAULT_CONFIG["_all_possible_fields"])
+
+    def test_markdown_and_text(self):
+        """Test that Markdown and text output contain one section per record."""
+        markdown = write_all("out.md", RECORDS, ["country"])
+        self.assertEqual(markdown.count("# IP Information for"), 2)
+        self.assertEqual(markdown.count("---\n\n"), 1)
+
+        text = write_all("out.txt", RECORDS, ["country"])
+        self.assertIn("--- IP Information for 1.1.1.1 ---\nCountry: Australia\n", text)
+
+    def test_ndjson(self):
+        """Test that NDJSON output has one JSON object per line, keeping failures."""
+        output = write_all("out.ndjson", RECORDS + [{"status": "fail", "message": "private range", "query": "10.0.0.1", "display_ip": "10.0.0.1"}], ["country"])
+        lines = [json.loads(line) for line in output.splitlines()]
+
+        self.assertEqual(lines[0], {"country": "United States"})
+        self.assertEqual(lines[2], {"status": "fail", "message": "private range", "query": "10.0.0.1"})
+
+    def test_ndjson_patch(self):
+        """Test that deferred fields are written as a follow-up record with status 'patch'."""
+        stream = io.StringIO()
+        writer = create_writer("out.ndjson", stream, BASE_DEFAULT_CONFIG, ["country", "reverse"])
+        writer.write(RECORDS[0])
+        writer.write_patch("8.8.8.8", {"reverse": "dns.google"})
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(lines, [{"country": "United States"}, {"status": "patch", "query": "8.8.8.8", "reverse": "dns.google"}])
+
+
+class TestOutputFile(unittest.TestCase):
+    """Test cases for the -o file."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "out.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_nothing_written_leaves_the_file_alone(self):
+        """Test that an output without records neither creates nor overwrites the file."""
+        with OutputFile(self.path, BASE_DEFAULT_CONFIG, ["country"]):
+            pass
+        self.assertFalse(os.path.exists(self.path))
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("earlier results")
+        with OutputFile(self.path, BASE_DEFAULT_CONFIG, ["country"]) as output:
+            self.assertEqual(output.count, 0)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "earlier results")
+
+    def test_interrupted_output_is_complete(self):
+        """Test that closing the output after an error still finishes the JSON array."""
+        with self.assertRaises(KeyboardInterrupt):
+            with OutputFile(self.path, BASE_DEFAULT_CONFIG, ["country"]) as output:
+                for data in RECORDS:
+                    output.write(data)
+                raise KeyboardInterrupt()
+        output.close()
+
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [{"country": "United States"}, {"country": "Australia"}])
+
+if __name__ == '__main__':
+    unittest.main()
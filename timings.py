@@ -0,0 +1,189 @@
+import json
+import math
+import sys
+import threading
+import time
+
+class _NullPhase:
+    """A phase that records nothing, returned while timings are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+    """Measures the wall time of a with block and records it when the block ends."""
+
+    __slots__ = ("timings", "name", "ip_address", "start")
+
+    def __init__(self, timings, name, ip_address):
+        self.timings = timings
+        self.name = name
+        self.ip_address = ip_address
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings.record(self.name, time.perf_counter() - self.start, self.ip_address)
+        return False
+
+def percentile(samples, fraction):
+    """
+    Returns a percentile of sorted samples using the nearest-rank method.
+
+    Args:
+        samples (list): The samples, sorted in ascending order.
+        fraction (float): The percentile as a fraction between 0 and 1.
+
+    Returns:
+        float: The sample at that rank, or 0.0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(samples)))
+    return samples[rank - 1]
+
+def histogram(samples):
+    """
+    Counts samples in power-of-two millisecond buckets.
+
+    Args:
+        samples (list): Durations in seconds.
+
+    Returns:
+        dict: The number of samples per bucket, keyed by the bucket's upper bound (e.g. "<=4ms").
+    """
+    buckets = {}
+    for seconds in samples:
+        milliseconds = seconds * 1000
+        bound = 1 if milliseconds <= 1 else 2 ** math.ceil(math.log2(milliseconds))
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return {f"<={bound}ms": buckets[bound] for bound in sorted(buckets)}
+
+class Timings:
+    """Collects how long each phase of a run takes, in total and per IP address."""
+
+    def __init__(self, enabled=True):
+        """
+        Initializes the Timings class.
+
+        Args:
+            enabled (bool, optional): Record phases. When False every hook is a no-op. Defaults to True.
+        """
+        self.enabled = enabled
+        self._samples = {}
+        self._per_ip = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name, ip_address=None):
+        """
+        Returns a context manager that records the duration of a phase.
+
+        Args:
+            name (str): The phase name, e.g. "http" or "render".
+            ip_address (str, optional): The IP address the phase belongs to. Defaults to None.
+
+        Returns:
+            A context manager. While disabled, the same no-op object is returned every time.
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, ip_address)
+
+    def record(self, name, seconds, ip_address=None):
+        """
+        Records a measured duration.
+
+        Args:
+            name (str): The phase name.
+            seconds (float): The duration in seconds.
+            ip_address (str, optional): The IP address the phase belongs to. Defaults to None.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+            if ip_address is not None:
+                phases = self._per_ip.setdefault(ip_address or "(own IP)", {})
+                phases[name] = phases.get(name, 0.0) + seconds
+
+    def summary(self):
+        """
+        Summarizes the recorded phases.
+
+        Returns:
+            dict: "phases" maps each phase to its count, total, mean, p50, p99, max (in milliseconds)
+                  and histogram; "per_ip" maps each address to its milliseconds per phase.
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            per_ip = {ip: dict(phases) for ip, phases in self._per_ip.items()}
+
+        phases = {}
+        for name, values in samples.items():
+            total = sum(values)
+            phases[name] = {
+                "count": len(values),
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "histogram": histogram(values),
+            }
+        per_ip = {
+            ip: {name: round(seconds * 1000, 3) for name, seconds in ip_phases.items()}
+            for ip, ip_phases in per_ip.items()
+        }
+        return {"phases": phases, "per_ip": per_ip}
+
+    def print_summary(self, output_format="table", slowest=5):
+        """
+        Prints the summary to stderr.
+
+        Args:
+            output_format (str, optional): "table" or "json". Defaults to "table".
+            slowest (int, optional): How many of the slowest addresses the table lists. Defaults to 5.
+        """
+        summary = self.summary()
+        if output_format == "json":
+            sys.stderr.write(json.dumps(summary, indent=4) + "\n")
+            return
+
+        from rich.console import Console
+        from rich.table import Table
+
+        console = Console(stderr=True)
+        table = Table(title="Timings", title_justify="left")
+        table.add_column("Phase", style="bold")
+        for header in ("Count", "Total ms", "Mean ms", "p50 ms", "p99 ms", "Max ms"):
+            table.add_column(header, justify="right")
+        for name, stats in summary["phases"].items():
+            table.add_row(
+                name, str(stats["count"]), f"{stats['total_ms']:.1f}", f"{stats['mean_ms']:.2f}",
+                f"{stats['p50_ms']:.2f}", f"{stats['p99_ms']:.2f}", f"{stats['max_ms']:.2f}"
+            )
+        console.print(table)
+
+        if summary["per_ip"]:
+            ranked = sorted(summary["per_ip"].items(), key=lambda item: sum(item[1].values()), reverse=True)
+            ip_table = Table(title="Slowest addresses", title_justify="left")
+            ip_table.add_column("IP", style="bold")
+            ip_table.add_column("Total ms", justify="right")
+            ip_table.add_column("Phases")
+            for ip_address, phases in ranked[:slowest]:
+                details = ", ".join(f"{name} {milliseconds:.1f}" for name, milliseconds in phases.items())
+                ip_table.add_row(ip_address, f"{sum(phases.values()):.1f}", details)
+            console.print(ip_table)
+
+# Shared by providers and runs that don't collect timings.
+NULL_TIMINGS = Timings(enabled=False)
@@ -0,0 +1,296 @@
+import csv
+import json
+import os
+
+from projection import ProjectionPlan
+
+class OutputWriter:
+    """Base class for writers that output records one at a time as they arrive."""
+
+    def __init__(self, stream, config, fields_to_show, flush=False):
+        """
+        Initializes the OutputWriter class.
+
+        Args:
+            stream (file): The file object to write to.
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+            flush (bool, optional): Flush the stream after every record. Defaults to False.
+        """
+        self.stream = stream
+        self.config = config
+        self.plan = ProjectionPlan.of(config, fields_to_show)
+        self.fields = self.plan.display_fields
+        self.flush = flush
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        """
+        Writes one IP information dictionary.
+
+        Args:
+            data (dict): The IP information dictionary.
+        """
+        self._write_record(data)
+        self.count += 1
+        if self.flush:
+            self.stream.flush()
+
+    def _write_record(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        """Finishes the output. The stream itself is closed by its owner."""
+        self.stream.flush()
+
+class JsonWriter(OutputWriter):
+    """Writes records as a JSON array, or as a single object when there is only one record."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._first = None
+
+    def _dump(self, data):
+        """Returns a record as indented JSON nested one level inside the array."""
+        return "    " + json.dumps(self.plan.project(data), indent=4).replace("\n", "\n    ")
+
+    def _write_record(self, data):
+        if self.count == 0:
+            # Held back until we know whether the output is a single object or an array.
+            self._first = data
+            return
+        if self.count == 1:
+            self.stream.write("[\n")
+            self.stream.write(self._dump(self._first))
+            self._first = None
+        self.stream.write(",\n")
+        self.stream.write(self._dump(data))
+
+    def close(self):
+        if self.count == 0:
+            self.stream.write("[]")
+        elif self.count == 1:
+            json.dump(self.plan.project(self._first), self.stream, indent=4)
+        else:
+            self.stream.write("\n]")
+        super().close()
+
+class NdjsonWriter(OutputWriter):
+    """Writes each record as one line of JSON."""
+
+    def _write_record(self, data):
+        if data.get("status") == "fail":
+            record = {k: v for k, v in data.items() if k != 'display_ip'}
+        else:
+            record = self.plan.project(data)
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write("\n")
+
+    def write_patch(self, ip_address, patch):
+        """
+        Writes deferred fields that arrived after their record, as a record with status 'patch'.
+
+        Args:
+            ip_address (str): The address of the record the fields belong to, as shown for it.
+            patch (dict): The deferred fields.
+        """
+        self.stream.write(json.dumps(dict({"status": "patch", "query": ip_address}, **patch), ensure_ascii=False))
+        self.stream.write("\n")
+        if self.flush:
+            self.stream.flush()
+
+class MarkdownWriter(OutputWriter):
+    """Writes each record as a Markdown section, grouped by category."""
+
+    def _write_record(self, data):
+        from display import MarkdownDisplay
+
+        if self.count > 0:
+            self.stream.write("---\n\n")
+        self.stream.write(MarkdownDisplay(None, self.config, data, self.plan).generate_markdown_string())
+
+class TextWriter(OutputWriter):
+    """Writes each record as a block of 'Field: value' lines."""
+
+    def _write_record(self, data):
+        fields = self.fields if self.fields is not None else [key for key in data if key != "status"]
+        lines = [f"--- IP Information for {data.get('display_ip', 'N/A')} ---\n"]
+        lines.extend(f"{field.capitalize()}: {data[field]}\n" for field in fields if field in data)
+        lines.append("\n")
+        self.stream.write("".join(lines))
+
+class CsvWriter(OutputWriter):
+    """Writes records as rows of a delimited table with a fixed header."""
+
+    def __init__(self, stream, config, fields_to_show, flush=False, delimiter=","):
+        super().__init__(stream, config, fields_to_show, flush)
+        self.fields = self.plan.table_fields
+        self._writer = csv.writer(stream, delimiter=delimiter, lineterminator="\n")
+        self._writer.writerow(self.fields)
+
+    def _write_record(self, data):
+        self._writer.writerow([data.get(field, "") for field in self.fields])
+
+WRITERS = {
+    ".json": JsonWriter,
+    ".ndjson": NdjsonWriter,
+    ".jsonl": NdjsonWriter,
+    ".md": MarkdownWriter,
+    ".csv": CsvWriter,
+    ".tsv": CsvWriter,
+}
+
+def create_writer(filename, stream, config, fields_to_show):
+    """
+    Creates the writer for a file, choosing the format from its extension.
+
+    Args:
+        filename (str): The name of the file; its extension selects the format.
+        stream (file): The opened file object to write to.
+        config (dict): The configuration dictionary.
+        fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+
+    Returns:
+        OutputWriter: The writer. Unknown extensions are written as text.
+    """
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext == ".tsv":
+        return CsvWriter(stream, config, fields_to_show, delimiter="\t")
+    return WRITERS.get(ext, TextWriter)(stream, config, fields_to_show)
+
+def write_summary(filename, stream, summary):
+    """
+    Writes a --summary report, choosing the format from the file's extension.
+
+    Args:
+        filename (str): The name of the file; '.json', '.csv' and '.tsv' are written as such,
+                        anything else as text.
+        stream (file): The opened file object to write to.
+        summary (dict): The summary, as returned by Aggregator.summarize.
+    """
+    from aggregate import FLAG_FIELDS
+
+    ext = os.path.splitext(filename)[1].lower()
+    by = summary["by"]
+    columns = [by, "count", "percent"] + list(FLAG_FIELDS)
+    if ext == ".json":
+        json.dump(summary, stream, indent=4, ensure_ascii=False)
+    elif ext in (".csv", ".tsv"):
+        writer = csv.writer(stream, delimiter="\t" if ext == ".tsv" else ",", lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([row[column] for column in columns] for row in summary["rows"])
+    else:
+        stream.write(f"--- Summary by {by.capitalize()} ---\n")
+        stream.write(f"Total: {summary['total']}, groups: {summary['groups']}, failed: {summary['failed']}\n\n")
+        for row in summary["rows"]:
+            flags = ", ".join(f"{flag} {row[flag]}%" for flag in FLAG_FIELDS)
+            stream.write(f"{row[by]}: {row['count']} ({row['percent']}%), {flags}\n")
+    stream.flush()
+
+def write_clusters(filename, stream, clusters):
+    """
+    Writes the clusters of 'whatsip near --cluster', choosing the format from the file's extension.
+
+    Args:
+        filename (str): The name of the file; '.json', '.csv' and '.tsv' are written as such,
+                        anything else as text.
+        stream (file): The opened file object to write to.
+        clusters (list): The clusters, as returned by GeoIndex.clusters.
+    """
+    from spatial import CLUSTER_FIELDS
+
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".json":
+        json.dump(clusters, stream, indent=4, ensure_ascii=False)
+    elif ext in (".csv", ".tsv"):
+        writer = csv.writer(stream, delimiter="\t" if ext == ".tsv" else ",", lineterminator="\n")
+        writer.writerow(CLUSTER_FIELDS)
+        writer.writerows([cluster[field] for field in CLUSTER_FIELDS[:-1]] + [" ".join(cluster["ips"])] for cluster in clusters)
+    else:
+        for cluster in clusters:
+            stream.write(f"--- Cluster {cluster['cluster']}: {cluster['size']} IPs near {cluster['city']}, {cluster['country']} ---\n")
+            stream.write(f"Centre: {cluster['lat']}, {cluster['lon']} (radius {cluster['radius_km']} km, {cluster['locations']} locations)\n")
+            stream.write(" ".join(cluster["ips"]) + "\n\n")
+    stream.flush()
+
+def open_output(filename):
+    """
+    Opens an output file for a writer.
+
+    Args:
+        filename (str): The name of the file.
+
+    Returns:
+        file: The opened file object.
+    """
+    newline = "" if os.path.splitext(filename)[1].lower() in (".csv", ".tsv") else None
+    return open(filename, 'w', encoding='utf-8', newline=newline)
+
+class OutputFile:
+    """
+    A -o file that is only created when the first record is written to it, so a run that saves nothing
+    leaves an existing file alone.
+    """
+
+    def __init__(self, filename, config, fields_to_show):
+        """
+        Initializes the OutputFile class.
+
+        Args:
+            filename (str): The name of the file; its extension selects the format.
+            config (dict): The configuration dictionary.
+            fields_to_show (list or ProjectionPlan): A list of fields to show in the output, or the run's plan.
+        """
+        self.filename = filename
+        self.config = config
+        self.fields_to_show = fields_to_show
+        self.stream = None
+        self.writer = None
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        """
+        Writes one IP information dictionary, creating the file first if this is the first one.
+
+        Args:
+            data (dict): The IP information dictionary.
+
+        Raises:
+            OSError: If the file can't be created or written.
+        """
+        if self.writer is None:
+            self.stream = open_output(self.filename)
+            self.writer = create_writer(self.filename, self.stream, self.config, self.fields_to_show)
+        self.writer.write(data)
+        self.count += 1
+
+    def close(self):
+        """
+        Finishes the format (e.g. the closing ']' of a JSON array) and closes the file, if it was created.
+        Closing twice does nothing.
+
+        Raises:
+            OSError: If the end of the file can't be written.
+        """
+        stream, writer = self.stream, self.writer
+        self.stream = self.writer = None
+        if stream is None:
+            return
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            stream.close()